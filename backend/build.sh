@@ -1,7 +1,7 @@
 #!/usr/bin/env bash
 set -o errexit
 
-pip install -r requirements.txt
+pip install -r requirements-numpy.txt
 
 python manage.py collectstatic --no-input
 
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_asgi_application()
+
+# Load the truck-stop index and road graph before serving: the async views
+# build plan keys (plan_cache.plan_config) on the event loop, where a first
+# load would block every in-flight request
+from trips.services.plan_cache import plan_config  # noqa: E402
+
+plan_config()
@@ -36,6 +36,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files for production
+    'trips.middleware.CompressionMiddleware',  # brotli/gzip for large API bodies
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -115,15 +116,146 @@ if not DEBUG:
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework settings
+# FAST_JSON_ENABLED swaps in orjson-backed renderer/parser classes
+FAST_JSON_ENABLED = os.getenv('FAST_JSON_ENABLED', 'False').lower() == 'true'
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'trips.renderers.ORJSONRenderer' if FAST_JSON_ENABLED
+        else 'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'trips.parsers.ORJSONParser' if FAST_JSON_ENABLED
+        else 'rest_framework.parsers.JSONParser',
     ],
 }
 
+# Intermediate stops allowed between pickup and dropoff on one trip
+TRIP_MAX_STOPS = int(os.getenv('TRIP_MAX_STOPS', '50'))
+
+# Batch trip planning
+# Worker processes each web worker's batch pool may start (unset or 0 = the
+# CPU cores divided among the WEB_CONCURRENCY web workers, at least one)
+TRIP_BATCH_WORKERS = int(os.getenv('TRIP_BATCH_WORKERS', '0')) or None
+# Web worker processes per host; gunicorn reads the same variable
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+TRIP_BATCH_MAX_SIZE = int(os.getenv('TRIP_BATCH_MAX_SIZE', '500'))
+# Start times x cycle values one /api/plan-trip/sweep may plan (same pool)
+TRIP_SWEEP_MAX_VARIANTS = int(os.getenv('TRIP_SWEEP_MAX_VARIANTS', '100'))
+
+# Async plan executor (/api/async/*): worker threads and how many more
+# requests may wait for one before new requests get a 503
+PLAN_EXECUTOR_WORKERS = int(os.getenv('PLAN_EXECUTOR_WORKERS', '4'))
+PLAN_EXECUTOR_QUEUE_DEPTH = int(os.getenv('PLAN_EXECUTOR_QUEUE_DEPTH', '16'))
+
+# Distance matrix: maximum origins x destinations per request
+DISTANCE_MATRIX_MAX_CELLS = int(os.getenv('DISTANCE_MATRIX_MAX_CELLS', '250000'))
+
+# Caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Whole-plan results. LocMemCache evicts least-recently-used entries
+    # beyond MAX_ENTRIES; set PLAN_CACHE_BACKEND/LOCATION to a shared backend
+    # (e.g. django.core.cache.backends.redis.RedisCache) to share across workers.
+    'plans': {
+        'BACKEND': os.getenv('PLAN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PLAN_CACHE_LOCATION', 'plans'),
+        'TIMEOUT': int(os.getenv('PLAN_CACHE_TTL', '3600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('PLAN_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+    # Route-leg distances, shared tier behind each worker's in-process LRU
+    'routes': {
+        'BACKEND': os.getenv('LEG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('LEG_CACHE_LOCATION', 'routes'),
+        'TIMEOUT': int(os.getenv('LEG_CACHE_TTL', '86400')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('LEG_CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+    # Per-worker metric snapshots; a shared backend lets /api/metrics sum
+    # every worker, LocMemCache only sees the worker that answers
+    'metrics': {
+        'BACKEND': os.getenv('METRICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('METRICS_CACHE_LOCATION', 'metrics'),
+    },
+}
+
+# Plan result cache
+PLAN_CACHE_ENABLED = os.getenv('PLAN_CACHE_ENABLED', 'True').lower() == 'true'
+PLAN_CACHE_ALIAS = 'plans'
+# Decimal places kept when keying on coordinates (4 = ~11 m)
+PLAN_CACHE_PRECISION = int(os.getenv('PLAN_CACHE_PRECISION', '4'))
+# Coalesce concurrent misses for the same plan into one computation
+PLAN_COALESCE_ENABLED = os.getenv('PLAN_COALESCE_ENABLED', 'True').lower() == 'true'
+# Seconds a request waits for another's computation before running its own
+PLAN_COALESCE_TIMEOUT = float(os.getenv('PLAN_COALESCE_TIMEOUT', '10'))
+# Seconds the cross-worker lock outlives a worker that died holding it
+PLAN_COALESCE_LOCK_TTL = int(os.getenv('PLAN_COALESCE_LOCK_TTL', '30'))
+PLAN_COALESCE_POLL_INTERVAL = float(os.getenv('PLAN_COALESCE_POLL_INTERVAL', '0.02'))
+
+# Persistent plan store (trips.models.Plan), checked after the cache
+PLAN_STORE_ENABLED = os.getenv('PLAN_STORE_ENABLED', 'True').lower() == 'true'
+# Page size limit for GET /api/plans
+PLAN_LIST_MAX_LIMIT = int(os.getenv('PLAN_LIST_MAX_LIMIT', '100'))
+
+# Routing: 'haversine' (road-factored straight line) or 'graph' (A* over the
+# memory-mapped road graph in ROAD_GRAPH_PATH, built by build_road_graph)
+ROUTING_BACKEND = os.getenv('ROUTING_BACKEND', 'haversine')
+ROAD_GRAPH_PATH = os.getenv('ROAD_GRAPH_PATH', str(BASE_DIR / 'road_graph'))
+# Furthest a leg endpoint may be from the nearest graph node
+ROAD_GRAPH_SNAP_MILES = float(os.getenv('ROAD_GRAPH_SNAP_MILES', '10'))
+
+# Route-leg cache. A haversine leg is cheaper to compute than to look up,
+# so by default legs are only cached when routing on the road graph
+LEG_CACHE_ENABLED = os.getenv(
+    'LEG_CACHE_ENABLED', str(ROUTING_BACKEND == 'graph')
+).lower() == 'true'
+LEG_CACHE_ALIAS = 'routes'
+LEG_CACHE_PRECISION = int(os.getenv('LEG_CACHE_PRECISION', '4'))
+# Legs kept in each worker's in-process LRU tier
+LEG_CACHE_LOCAL_SIZE = int(os.getenv('LEG_CACHE_LOCAL_SIZE', '1024'))
+
+# Truck-stop POIs (CSV: name,lat,lng[,fuel,parking]) that rest, break, fuel
+# and restart stops snap to; empty leaves stops on the route
+TRUCK_STOPS_FILE = os.getenv('TRUCK_STOPS_FILE', '')
+# Road miles a stop may move off the route to reach a truck stop
+TRUCK_STOP_DETOUR_MILES = float(os.getenv('TRUCK_STOP_DETOUR_MILES', '10'))
+
+# Per-stage timing of /api/plan-trip (Server-Timing header + 'trips.timing' log)
+PLAN_TIMING_ENABLED = os.getenv('PLAN_TIMING_ENABLED', 'False').lower() == 'true'
+
+# Metrics registry (GET /api/metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_CACHE_ALIAS = 'metrics'
+# Seconds between a worker's snapshot publishes, and how long a snapshot
+# outlives a worker that stops publishing
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '10'))
+METRICS_WORKER_TTL = int(os.getenv('METRICS_WORKER_TTL', '300'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'trips': {
+            'handlers': ['console'],
+            'level': os.getenv('TRIPS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+# Response compression (trips.middleware.CompressionMiddleware)
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.getenv(
     'CORS_ALLOWED_ORIGINS',
@@ -0,0 +1,35 @@
+"""
+API-only settings profile for the ELD Trip Planner backend.
+
+Same configuration and environment variables as config.settings, minus
+what a JSON-only deployment never uses: the admin, auth, sessions,
+messages, static files and templates, with the middleware that serves
+them. Select it with DJANGO_SETTINGS_MODULE=config.settings_api
+(`python manage.py bench_startup` compares the two profiles).
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+INSTALLED_APPS = [
+    'corsheaders',
+    'trips',
+]
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'trips.middleware.CompressionMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls_api'
+
+TEMPLATES = []
+
+# No auth: requests are anonymous and django.contrib.auth is not loaded
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+}
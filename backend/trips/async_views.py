@@ -0,0 +1,97 @@
+"""
+Native async trip planning views for the ASGI stack.
+
+Parsing, validation and cache I/O run on the event loop; like
+PlanTripView, a cache miss is looked up in the plan store (database I/O
+through sync_to_async) before the CPU-bound calculate_trip goes to the
+bounded plan executor. When the executor is saturated the request fails
+fast with 503 instead of queueing a thread. Plan keys are built on the
+loop too; config.asgi loads the truck stops and road graph they hash
+before the first request.
+"""
+
+import asyncio
+import json
+import logging
+from functools import partial
+from time import perf_counter
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .services import metrics, plan_cache, plan_store
+from .services.compact import encode_plan
+from .services.executor import ExecutorFull, get_plan_executor
+from .services.hos_engine import calculate_trip
+from .validators import validate_plan_trip
+
+
+logger = logging.getLogger(__name__)
+
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def _json(data, status: int = 200) -> JsonResponse:
+    return JsonResponse(data, status=status, json_dumps_params=JSON_DUMPS_PARAMS)
+
+
+async def _calculate_off_loop(data):
+    return await asyncio.wrap_future(get_plan_executor().submit(calculate_trip, data))
+
+
+@csrf_exempt
+@require_POST
+async def plan_trip(request):
+    """
+    POST /api/async/plan-trip
+
+    Async equivalent of PlanTripView, with the same cache, plan store and
+    metrics.
+    """
+    started = perf_counter()
+    response = await _plan_trip(request)
+    metrics.observe('planTripLatency', perf_counter() - started)
+    metrics.increment('requests', f"async-plan-trip:{response.status_code}")
+    return response
+
+
+async def _plan_trip(request):
+    version = request.GET.get('version', '1')
+    if version not in ('1', '2'):
+        return _json({"detail": "Invalid version in query parameter."}, status=404)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError as e:
+        return _json({"detail": f"JSON parse error - {e}"}, status=400)
+
+    validated, errors = validate_plan_trip(payload)
+    if errors is not None:
+        return _json({"errors": errors}, status=400)
+
+    try:
+        # Cache first, then the plan store, then the engine
+        calculate = partial(plan_store.aget_or_calculate, calculate=_calculate_off_loop)
+        result = await plan_cache.aget_or_calculate(validated, calculate)
+        return _json(encode_plan(result) if version == '2' else result)
+
+    except ExecutorFull:
+        response = _json({"error": "Planner is busy, retry shortly."}, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    except Exception as e:
+        metrics.record_error('async-plan-trip', e)
+        logger.exception('async-plan-trip failed')
+        return _json({"error": str(e)}, status=500)
+
+
+@require_GET
+async def health(request):
+    """
+    GET /api/async/health
+
+    Async equivalent of HealthCheckView.
+    """
+    return _json({"status": "ok"})
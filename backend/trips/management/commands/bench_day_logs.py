@@ -0,0 +1,73 @@
+"""
+Benchmark daily log generation against trip length.
+
+Usage:
+    python manage.py bench_day_logs
+    python manage.py bench_day_logs --miles 1000 10000 50000 --repeat 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from trips.services.hos_engine import HOSEngine
+
+
+FROM_LOC = {'label': 'West', 'lat': 34.05, 'lng': -118.24}
+TO_LOC = {'label': 'East', 'lat': 40.71, 'lng': -74.01}
+
+
+def _rescan_logs(engine: HOSEngine, day_nums):
+    """Previous approach: filter and sort the full activity list per day."""
+    for day_num in day_nums:
+        day_activities = [a for a in engine.activities if a.day == day_num]
+        day_activities.sort(key=lambda x: x.start)
+        engine._generate_day_log_from_activities(day_num, day_activities)
+
+
+def _bucketed_logs(engine: HOSEngine, day_nums):
+    """Current approach: each day's log comes from its own bucket."""
+    for day_num in day_nums:
+        engine._generate_day_log_from_activities(
+            day_num, engine.activities_by_day.get(day_num, [])
+        )
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Time daily log generation for increasingly long trips.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--miles', type=int, nargs='+',
+            default=[500, 2500, 10000, 50000, 200000],
+            help='Trip lengths to schedule (single leg, in miles).'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'miles':>8} {'days':>6} {'activities':>10} "
+            f"{'rescan ms':>10} {'bucket ms':>10} {'us/day':>8}"
+        )
+        for miles in options['miles']:
+            engine = HOSEngine()
+            list(engine._iter_driving(miles, FROM_LOC, TO_LOC))
+            day_nums = sorted(engine.activities_by_day)
+
+            rescan = _best_of(lambda: _rescan_logs(engine, day_nums), options['repeat'])
+            bucketed = _best_of(lambda: _bucketed_logs(engine, day_nums), options['repeat'])
+
+            self.stdout.write(
+                f"{miles:>8} {len(day_nums):>6} {len(engine.activities):>10} "
+                f"{rescan * 1e3:>10.2f} {bucketed * 1e3:>10.2f} "
+                f"{bucketed / len(day_nums) * 1e6:>8.1f}"
+            )
@@ -0,0 +1,138 @@
+"""
+Cold-start benchmark for the settings profiles.
+
+Starts a fresh interpreter per run and profile, and reports the median of:
+
+- setup: get_wsgi_application(), i.e. django.setup() plus loading the
+  middleware chain;
+- first request: the first POST /api/plan-trip through the WSGI handler,
+  which also imports the URLconf and views on demand;
+- second request: a different trip in the same process, for comparison;
+- process: wall time of the whole child process, interpreter start-up
+  included;
+- modules and peak RSS of the child at the end.
+
+The plan store is switched off in the children so no database is needed.
+
+Usage:
+    python manage.py bench_startup
+    python manage.py bench_startup --runs 9 --profile config.settings_api
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+PROFILES = ('config.settings', 'config.settings_api')
+
+# Runs in each child process; prints one JSON line of timings
+CHILD = r'''
+import io, json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+
+def post(trip):
+    body = json.dumps(trip).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api/plan-trip', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    response = application(environ, lambda status, headers: statuses.append(status))
+    b''.join(response)
+    return statuses[0]
+
+trip = {
+    'current_location': {'label': 'Chicago, IL', 'lat': 41.8781, 'lng': -87.6298},
+    'pickup_location': {'label': 'Indianapolis, IN', 'lat': 39.7684, 'lng': -86.1581},
+    'dropoff_location': {'label': 'Nashville, TN', 'lat': 36.1627, 'lng': -86.7816},
+    'cycle_hours_used': 20,
+}
+first_status = post(trip)
+first = time.perf_counter()
+trip['cycle_hours_used'] = 21
+post(trip)
+second = time.perf_counter()
+print(json.dumps({
+    'status': first_status,
+    'setup': ready - started,
+    'firstRequest': first - ready,
+    'secondRequest': second - first,
+    'modules': len(sys.modules),
+    'maxRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+METRICS = ('setup', 'firstRequest', 'secondRequest', 'process')
+
+
+def run_child(profile: str) -> dict:
+    """One cold start of `profile`, with the child's wall time as 'process'."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile, PLAN_STORE_ENABLED='False')
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise CommandError(f"{profile} failed to start:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if not result['status'].startswith('200'):
+        raise CommandError(f"{profile}: first request returned {result['status']}")
+    result['process'] = elapsed
+    return result
+
+
+def run_profiles(profiles, runs: int) -> dict:
+    """Median timings (ms), module count and peak RSS per profile."""
+    report = {}
+    for profile in profiles:
+        samples = [run_child(profile) for _ in range(runs)]
+        report[profile] = {
+            **{f'{metric}Ms': round(statistics.median(s[metric] for s in samples) * 1000, 1) for metric in METRICS},
+            'modules': samples[-1]['modules'],
+            'maxRssMb': round(statistics.median(s['maxRssMb'] for s in samples), 1),
+        }
+    return report
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start (setup and first request) of each settings profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts per profile (median is reported).')
+        parser.add_argument(
+            '--profile', action='append', choices=PROFILES,
+            help='Profile to measure (repeatable; default: all).'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+        report = run_profiles(options['profile'] or PROFILES, options['runs'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'profile':<22}{'setup':>9}{'first req':>11}{'second req':>12}{'process':>10}{'modules':>9}{'RSS MB':>8}"
+        )
+        for profile, row in report.items():
+            self.stdout.write(
+                f"{profile:<22}{row['setupMs']:>9.1f}{row['firstRequestMs']:>11.1f}"
+                f"{row['secondRequestMs']:>12.1f}{row['processMs']:>10.1f}{row['modules']:>9}{row['maxRssMb']:>8.1f}"
+            )
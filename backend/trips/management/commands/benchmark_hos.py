@@ -0,0 +1,207 @@
+"""
+HOS engine benchmark suite with regression baselines.
+
+Times each planning stage over a fixed corpus of trips and records the
+memory it allocates. Results are written as JSON; pass a previous run as
+--baseline to fail when any stage gets slower (or allocates more) than
+the allowed threshold.
+
+Usage:
+    python manage.py benchmark_hos --output bench.json
+    python manage.py benchmark_hos --baseline bench.json --threshold 0.25
+"""
+
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services.hos_engine import HOSEngine, build_itinerary, calculate_trip
+from trips.services.route_service import calculate_multi_stop_route
+
+
+# Bumped whenever the stages change; baselines of another version are refused
+BENCHMARK_VERSION = 2
+
+CORPUS = {
+    'short_local': {
+        'current_location': {'label': 'Newark, NJ', 'lat': 40.7357, 'lng': -74.1724},
+        'pickup_location': {'label': 'Jersey City, NJ', 'lat': 40.7178, 'lng': -74.0431},
+        'dropoff_location': {'label': 'Paterson, NJ', 'lat': 40.9168, 'lng': -74.1718},
+        'cycle_hours_used': 0,
+    },
+    'regional': {
+        'current_location': {'label': 'Chicago, IL', 'lat': 41.8781, 'lng': -87.6298},
+        'pickup_location': {'label': 'Indianapolis, IN', 'lat': 39.7684, 'lng': -86.1581},
+        'dropoff_location': {'label': 'Nashville, TN', 'lat': 36.1627, 'lng': -86.7816},
+        'cycle_hours_used': 20,
+    },
+    'cross_country': {
+        'current_location': {'label': 'Miami, FL', 'lat': 25.7617, 'lng': -80.1918},
+        'pickup_location': {'label': 'Seattle, WA', 'lat': 47.6062, 'lng': -122.3321},
+        'dropoff_location': {'label': 'Boston, MA', 'lat': 42.3601, 'lng': -71.0589},
+        'cycle_hours_used': 0,
+    },
+    'max_cycle': {
+        'current_location': {'label': 'Dallas, TX', 'lat': 32.7767, 'lng': -96.7970},
+        'pickup_location': {'label': 'Denver, CO', 'lat': 39.7392, 'lng': -104.9903},
+        'dropoff_location': {'label': 'Los Angeles, CA', 'lat': 34.0522, 'lng': -118.2437},
+        'cycle_hours_used': 70,
+    },
+    # LTL run: 20 drops strung between Atlanta and Richmond
+    'multi_drop_20': {
+        'current_location': {'label': 'Atlanta, GA', 'lat': 33.7490, 'lng': -84.3880},
+        'pickup_location': {'label': 'Atlanta Terminal', 'lat': 33.6407, 'lng': -84.4277},
+        'dropoff_location': {'label': 'Richmond, VA', 'lat': 37.5407, 'lng': -77.4360},
+        'stops': [
+            {
+                'label': f'Drop {i + 1}',
+                'lat': 33.6407 + (37.5407 - 33.6407) * (i + 1) / 21,
+                'lng': -84.4277 + (-77.4360 + 84.4277) * (i + 1) / 21 + (0.3 if i % 2 else -0.3),
+                'duration': 0.5,
+            }
+            for i in range(20)
+        ],
+        'cycle_hours_used': 10,
+    },
+}
+
+STAGES = ('calculate_route', 'schedule_stops', 'build_days', 'calculate_trip')
+
+
+def _stage_functions(trip):
+    """
+    Zero-argument callables for each stage of planning `trip`, through
+    the same engine methods as the request path.
+    """
+    current = trip['current_location']
+    itinerary = build_itinerary(trip)
+    locations = [current] + [location for _, location, _ in itinerary]
+    cycle = trip['cycle_hours_used']
+    route = calculate_multi_stop_route(locations)
+
+    def schedule_stops():
+        engine = HOSEngine(cycle)
+        for _ in engine._iter_stops(current, itinerary, route):
+            pass
+
+    # Grouping works on a finished schedule, built once up front and
+    # replayed from day 1 as if its stops were streaming in
+    scheduled = HOSEngine(cycle)
+    stops = list(scheduled._iter_stops(current, itinerary, route))
+    scheduled.current_day = 1
+
+    def build_days():
+        for _ in scheduled._iter_days(iter(stops)):
+            pass
+
+    return {
+        'calculate_route': lambda: calculate_multi_stop_route(locations),
+        'schedule_stops': schedule_stops,
+        'build_days': build_days,
+        'calculate_trip': lambda: calculate_trip(trip),
+    }
+
+
+def _time(func, repeat: int) -> float:
+    """Best per-call time in seconds over `repeat` auto-ranged runs."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _allocated(func) -> int:
+    """Peak bytes allocated by a single call."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_suite(repeat: int = 5):
+    """Benchmark every stage of every corpus trip."""
+    cases = {}
+    for name, trip in CORPUS.items():
+        functions = _stage_functions(trip)
+        cases[name] = {
+            stage: {
+                'seconds': _time(functions[stage], repeat),
+                'allocated_bytes': _allocated(functions[stage]),
+            }
+            for stage in STAGES
+        }
+    return {
+        'version': BENCHMARK_VERSION,
+        'python': sys.version.split()[0],
+        'machine': platform.machine(),
+        'cases': cases,
+    }
+
+
+def find_regressions(results, baseline, threshold: float):
+    """List (case, stage, metric, baseline, current) entries past the threshold."""
+    regressions = []
+    for name, stages in results['cases'].items():
+        for stage, metrics in stages.items():
+            previous = baseline.get('cases', {}).get(name, {}).get(stage)
+            if not previous:
+                continue
+            for metric in ('seconds', 'allocated_bytes'):
+                if previous[metric] and metrics[metric] > previous[metric] * (1 + threshold):
+                    regressions.append((name, stage, metric, previous[metric], metrics[metric]))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark HOS planning stages and compare against a stored baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+        parser.add_argument('--baseline', help='JSON results of a previous run to compare against.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed slowdown or allocation growth as a fraction (default: 0.2).'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = run_suite(options['repeat'])
+
+        self.stdout.write(f"{'case':<15} {'stage':<20} {'us':>10} {'KiB':>9}")
+        for name, stages in results['cases'].items():
+            for stage, metrics in stages.items():
+                self.stdout.write(
+                    f"{name:<15} {stage:<20} {metrics['seconds'] * 1e6:>10.1f} "
+                    f"{metrics['allocated_bytes'] / 1024:>9.1f}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline.get('version') != BENCHMARK_VERSION:
+                raise CommandError(
+                    f"Baseline is from benchmark version {baseline.get('version')}, "
+                    f"this is version {BENCHMARK_VERSION}; record a new baseline."
+                )
+            regressions = find_regressions(results, baseline, options['threshold'])
+            if regressions:
+                lines = [
+                    f"  {name}/{stage} {metric}: {before:.6g} -> {after:.6g}"
+                    for name, stage, metric, before, after in regressions
+                ]
+                raise CommandError(
+                    f"{len(regressions)} regression(s) beyond {options['threshold']:.0%}:\n"
+                    + "\n".join(lines)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
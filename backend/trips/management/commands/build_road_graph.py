@@ -0,0 +1,127 @@
+"""
+Build the memory-mapped road graph used by ROUTING_BACKEND = 'graph'.
+
+Reads a node CSV (id,lat,lng) and an edge CSV (from,to,miles[,mph][,oneway])
+and writes the CSR arrays described in trips/services/road_graph.py.
+Nodes are renumbered in grid-cell order so the nodes of a cell are
+contiguous, and edges are stored both ways unless oneway is 1.
+
+Usage:
+    python manage.py build_road_graph --nodes nodes.csv --edges edges.csv --output road_graph
+"""
+
+import csv
+import json
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services.road_graph import ARRAYS, GRAPH_FORMAT_VERSION, cell_id, graph_checksum
+from trips.services.route_service import EARTH_RADIUS_MILES, AVG_SPEED_MPH
+
+
+def _great_circle_miles(lat1, lng1, lat2, lng2):
+    """Elementwise haversine over arrays."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class Command(BaseCommand):
+    help = 'Build a memory-mapped CSR road graph from node and edge CSVs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', required=True, help='CSV with columns id,lat,lng.')
+        parser.add_argument('--edges', required=True, help='CSV with columns from,to,miles[,mph][,oneway].')
+        parser.add_argument('--output', required=True, help='Directory to write the graph to.')
+        parser.add_argument(
+            '--cell-degrees', type=float, default=0.05,
+            help='Grid cell size used to find the node nearest a location.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cell_degrees = options['cell_degrees']
+
+        with open(options['nodes'], newline='') as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise CommandError('No nodes.')
+        ids = [row['id'] for row in rows]
+        lat = np.array([float(row['lat']) for row in rows])
+        lng = np.array([float(row['lng']) for row in rows])
+
+        # Renumber nodes in cell order
+        cells_of = np.array([cell_id(a, b, cell_degrees) for a, b in zip(lat, lng)], dtype=np.int64)
+        order = np.argsort(cells_of, kind='stable')
+        new_index = np.empty(len(order), dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+        index_of = {node_id: int(new_index[i]) for i, node_id in enumerate(ids)}
+        lat, lng, cells_of = lat[order], lng[order], cells_of[order]
+
+        sources, targets, miles, mph = [], [], [], []
+        with open(options['edges'], newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    u, v = index_of[row['from']], index_of[row['to']]
+                except KeyError as e:
+                    raise CommandError(f"Edge refers to unknown node {e}")
+                length = float(row['miles'])
+                speed = float(row.get('mph') or AVG_SPEED_MPH)
+                oneway = (row.get('oneway') or '0').strip() in ('1', 'true', 'True')
+                for a, b in ((u, v),) if oneway else ((u, v), (v, u)):
+                    sources.append(a)
+                    targets.append(b)
+                    miles.append(length)
+                    mph.append(speed)
+        if not sources:
+            raise CommandError('No edges.')
+
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        mph = np.array(mph)
+        # Never shorter than the straight line: keeps the A* bound admissible
+        miles = np.maximum(
+            np.array(miles), _great_circle_miles(lat[sources], lng[sources], lat[targets], lng[targets])
+        )
+
+        by_source = np.argsort(sources, kind='stable')
+        indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(lat)), out=indptr[1:])
+        cells, cell_first = np.unique(cells_of, return_index=True)
+
+        arrays = {
+            'lat': lat,
+            'lng': lng,
+            'xyz': np.stack([
+                np.cos(np.radians(lat)) * np.cos(np.radians(lng)),
+                np.cos(np.radians(lat)) * np.sin(np.radians(lng)),
+                np.sin(np.radians(lat)),
+            ], axis=1),
+            'indptr': indptr,
+            'targets': targets[by_source].astype(np.int32),
+            'miles': miles[by_source].astype(np.float32),
+            'hours': (miles / mph)[by_source].astype(np.float32),
+            'cells': cells,
+            'cell_start': np.append(cell_first, len(lat)).astype(np.int64),
+        }
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(output, f'{name}.npy'), arrays[name])
+        with open(os.path.join(output, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': GRAPH_FORMAT_VERSION,
+                'cell_degrees': cell_degrees,
+                # float32 hours round down by at most an ulp; pad the bound
+                'max_mph': float(mph.max()) * (1 + 1e-6),
+                'checksum': graph_checksum(arrays),
+            }, f)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(lat)} nodes, {len(sources)} edges written to {output} "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,112 @@
+"""
+Fleet-wide HOS simulation over random chained loads.
+
+Generates loads for a synthetic fleet, runs them through the vectorized
+simulator and prints fleet totals. --verify re-runs a sample of drivers
+through HOSEngine and fails if any report differs.
+
+Usage:
+    python manage.py simulate_fleet --drivers 2000 --days 30
+    python manage.py simulate_fleet --verify 50 --output fleet.json
+"""
+
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services.fleet_sim import simulate, simulate_driver_scalar
+
+
+# Report keys that must match the scalar engine exactly; the rest are
+# sums taken in a different order and are compared with a tolerance
+EXACT_KEYS = ('loadsCompleted', 'restStops', 'fuelStops', 'cycleViolations', 'cycleHours', 'day', 'time')
+
+
+def random_loads(drivers: int, loads: int, seed: int):
+    """Deadhead and loaded leg miles, plus starting cycle hours."""
+    rng = np.random.default_rng(seed)
+    distances = np.round(np.stack([
+        rng.uniform(0, 150, (drivers, loads)),
+        rng.uniform(50, 1500, (drivers, loads)),
+    ], axis=-1), 1)
+    cycle_hours = rng.integers(0, 71, drivers).astype(np.float64)
+    return distances, cycle_hours
+
+
+def compare_driver(report, index, reference):
+    """Keys where driver `index` of a simulate() report differs from `reference`."""
+    mismatches = []
+    for key, expected in reference.items():
+        actual = report[key][index]
+        if key in EXACT_KEYS:
+            same = actual == expected
+        else:
+            same = abs(actual - expected) <= 1e-6 * max(1.0, abs(expected))
+        if not same:
+            mismatches.append(key)
+    return mismatches
+
+
+class Command(BaseCommand):
+    help = 'Simulate chained loads for a fleet with the vectorized HOS engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument(
+            '--loads', type=int, default=40,
+            help='Loads generated per driver; only those starting within --days run.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--verify', type=int, default=0,
+            help='Check this many sampled drivers against HOSEngine.'
+        )
+        parser.add_argument('--output', help='Write per-driver results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        distances, cycle_hours = random_loads(options['drivers'], options['loads'], options['seed'])
+
+        started = time.perf_counter()
+        report = simulate(distances, cycle_hours=cycle_hours, days=days)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{options['drivers']} drivers, {days} days: "
+            f"{int(report['loadsCompleted'].sum())} loads in {elapsed:.3f}s"
+        )
+        self.stdout.write(f"  miles/driver        {report['miles'].mean():10.1f}")
+        self.stdout.write(f"  utilization         {report['utilization'].mean():10.1%}")
+        self.stdout.write(
+            f"  cycle violations    {int(report['cycleViolations'].sum()):10d} "
+            f"({int((report['cycleViolations'] > 0).sum())} drivers, "
+            f"{report['excessHours'].sum():.1f} h over)"
+        )
+
+        if options['verify']:
+            rng = np.random.default_rng(options['seed'] + 1)
+            sample = rng.choice(options['drivers'], size=min(options['verify'], options['drivers']), replace=False)
+            started = time.perf_counter()
+            failures = []
+            for index in sample:
+                reference = simulate_driver_scalar(distances[index], cycle_hours=cycle_hours[index], days=days)
+                mismatches = compare_driver(report, index, reference)
+                if mismatches:
+                    failures.append(f"  driver {index}: {', '.join(mismatches)}")
+            elapsed = time.perf_counter() - started
+            if failures:
+                raise CommandError(
+                    f"{len(failures)} of {len(sample)} sampled drivers differ from HOSEngine:\n"
+                    + "\n".join(failures)
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(sample)} sampled drivers match HOSEngine ({elapsed:.3f}s scalar)."
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({key: values.tolist() for key, values in report.items()}, f)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Plan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_hash', models.CharField(max_length=40, unique=True)),
+                ('inputs', models.JSONField()),
+                ('name', models.CharField(max_length=450)),
+                ('total_miles', models.IntegerField()),
+                ('total_days', models.IntegerField()),
+                ('total_driving_hours', models.FloatField()),
+                ('total_on_duty_hours', models.FloatField()),
+                ('cycle_hours_actual', models.FloatField()),
+                ('restarts', models.IntegerField(default=0)),
+                ('summary', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='plan_created_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlanDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.IntegerField()),
+                ('log', models.JSONField()),
+                ('plan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='days', to='trips.plan')),
+            ],
+            options={
+                'ordering': ['plan', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'day'), name='plan_day_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlanStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('day', models.IntegerField()),
+                ('type', models.CharField(max_length=20)),
+                ('location', models.CharField(max_length=200)),
+                ('time', models.CharField(max_length=5)),
+                ('duration', models.FloatField()),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('mileage', models.IntegerField()),
+                ('plan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='trips.plan')),
+            ],
+            options={
+                'ordering': ['plan', 'sequence'],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'sequence'), name='plan_stop_unique')],
+            },
+        ),
+    ]
@@ -1,3 +1,71 @@
+"""
+Stored trip plans.
+
+A Plan row holds one computed plan, keyed by the hash of its canonical
+input and the engine configuration (plan_store.store_key), with the
+summary totals as columns. Its days
+and stops live in PlanDay and PlanStop rows, written with bulk inserts.
+"""
+
 from django.db import models
 
-# Create your models here.
+
+class Plan(models.Model):
+    """One computed plan and its summary."""
+    input_hash = models.CharField(max_length=40, unique=True)
+    inputs = models.JSONField()
+    name = models.CharField(max_length=450)
+    total_miles = models.IntegerField()
+    total_days = models.IntegerField()
+    total_driving_hours = models.FloatField()
+    total_on_duty_hours = models.FloatField()
+    cycle_hours_actual = models.FloatField()
+    restarts = models.IntegerField(default=0)
+    # The rest of the response (locations, route, warning), in response order
+    summary = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Keyset pagination of the plan history
+            models.Index(fields=['-created_at', '-id'], name='plan_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class PlanDay(models.Model):
+    """One day of a plan: its day number and duty log."""
+    # Indexed by the (plan, ...) unique constraint below
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='days', db_index=False)
+    day = models.IntegerField()
+    log = models.JSONField()
+
+    class Meta:
+        ordering = ['plan', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'day'], name='plan_day_unique'),
+        ]
+
+
+class PlanStop(models.Model):
+    """One scheduled stop of a plan, in plan order."""
+    # Indexed by the (plan, ...) unique constraint below
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='stops', db_index=False)
+    sequence = models.IntegerField()
+    day = models.IntegerField()
+    type = models.CharField(max_length=20)
+    location = models.CharField(max_length=200)
+    time = models.CharField(max_length=5)
+    duration = models.FloatField()
+    lat = models.FloatField()
+    lng = models.FloatField()
+    mileage = models.IntegerField()
+
+    class Meta:
+        ordering = ['plan', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'sequence'], name='plan_stop_unique'),
+        ]
@@ -0,0 +1,26 @@
+"""
+orjson-backed renderer.
+
+Drop-in replacement for DRF's JSONRenderer (enabled by FAST_JSON_ENABLED).
+Output is compact UTF-8 JSON, the same shape the stock renderer produces
+with its default COMPACT_JSON and UNICODE_JSON settings.
+"""
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    # Types orjson does not know natively (Decimal, lazy strings, ...)
+    # go through DRF's own encoder
+    _default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self._default, option=orjson.OPT_NON_STR_KEYS)
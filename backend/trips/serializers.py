@@ -2,6 +2,7 @@
 Location and Trip serializers with validation.
 """
 
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -12,9 +13,198 @@ class LocationSerializer(serializers.Serializer):
     lng = serializers.FloatField(min_value=-180, max_value=180)
 
 
+class DutyLocationSerializer(LocationSerializer):
+    """A location with on-duty time; duration (hours) defaults to 1 hour."""
+    duration = serializers.FloatField(min_value=0, max_value=24, required=False)
+
+
+class StopSerializer(DutyLocationSerializer):
+    """An intermediate pickup or drop; type defaults to dropoff."""
+    type = serializers.ChoiceField(choices=('pickup', 'dropoff'), required=False)
+
+
 class PlanTripRequestSerializer(serializers.Serializer):
-    """Validates the plan-trip request payload."""
+    """
+    Validates the plan-trip request payload.
+
+    The route runs current -> pickup -> stops, in order -> dropoff.
+
+    cycle_history is the optional 8-day recap: on-duty hours per day,
+    oldest first, ending with today. When given it replaces
+    cycle_hours_used in the rolling 70-hour/8-day cycle, so its hours
+    must add up to cycle_hours_used.
+    """
     current_location = LocationSerializer()
-    pickup_location = LocationSerializer()
-    dropoff_location = LocationSerializer()
+    pickup_location = DutyLocationSerializer()
+    dropoff_location = DutyLocationSerializer()
+    stops = StopSerializer(many=True, required=False, max_length=settings.TRIP_MAX_STOPS)
     cycle_hours_used = serializers.IntegerField(min_value=0, max_value=70)
+    cycle_history = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=24),
+        required=False,
+        max_length=8,
+    )
+    
+    def validate(self, attrs):
+        history = attrs.get('cycle_history')
+        if history is not None and round(sum(history)) != attrs['cycle_hours_used']:
+            raise serializers.ValidationError({
+                'cycle_history': f"Hours must add up to cycle_hours_used ({attrs['cycle_hours_used']})."
+            })
+        return attrs
+
+
+# Last day a trip can reach: each of its legs at most half way round the
+# Earth (about 16,000 road miles, under 40 days of driving, rests and
+# restarts, on-duty stop included)
+MAX_TRIP_DAYS = 40 * (settings.TRIP_MAX_STOPS + 2)
+
+
+class CheckpointActivitySerializer(serializers.Serializer):
+    """One duty-status interval of the checkpoint's current day."""
+    type = serializers.ChoiceField(choices=('offDuty', 'sleeperBerth', 'driving', 'onDuty'))
+    start = serializers.FloatField(min_value=0, max_value=24)
+    end = serializers.FloatField(min_value=0, max_value=24)
+
+
+class CheckpointSerializer(serializers.Serializer):
+    """
+    Engine state returned by /api/replan, sent back on the next report.
+
+    Field names follow the response (camelCase) so a checkpoint can be
+    echoed back unchanged.
+    """
+    version = serializers.IntegerField()
+    startDate = serializers.DateField()
+    day = serializers.IntegerField(min_value=1, max_value=MAX_TRIP_DAYS)
+    time = serializers.FloatField(min_value=0, max_value=24)
+    mileage = serializers.FloatField(min_value=0)
+    dayDriving = serializers.FloatField(min_value=0)
+    dayDuty = serializers.FloatField(min_value=0)
+    drivingSinceBreak = serializers.FloatField(min_value=0)
+    cycleHours = serializers.FloatField(min_value=0)
+    cycleWindow = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=24),
+        min_length=8,
+        max_length=8,
+    )
+    restarts = serializers.IntegerField(min_value=0)
+    nextStop = serializers.IntegerField(min_value=0)
+    position = LocationSerializer()
+    activities = CheckpointActivitySerializer(many=True)
+
+    def validate_time(self, value):
+        # The engine's clock is in minutes and rolls over at 24:00
+        if round(value * 60) >= 24 * 60:
+            raise serializers.ValidationError("Must be before 24:00.")
+        return value
+    
+    def validate(self, attrs):
+        # The day's log is rebuilt from these: they must run back to back
+        # from 00:00 to the checkpoint's time
+        clock = 0
+        for activity in attrs['activities']:
+            start, end = round(activity['start'] * 60), round(activity['end'] * 60)
+            if start != clock or end <= start:
+                raise serializers.ValidationError({
+                    'activities': "Must run back to back from 00:00, each ending after it starts."
+                })
+            clock = end
+        if clock != round(attrs['time'] * 60):
+            raise serializers.ValidationError({'activities': "Must end at the checkpoint's time."})
+        return attrs
+
+
+class ReplanRequestSerializer(PlanTripRequestSerializer):
+    """
+    Validates the replan request: the original trip plus the driver's
+    position, the itinerary index now being driven to (next_stop:
+    0 = pickup, then each stop, then dropoff) and the last checkpoint.
+    """
+    position = LocationSerializer()
+    next_stop = serializers.IntegerField(min_value=0, required=False)
+    checkpoint = CheckpointSerializer(required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        itinerary_length = len(attrs.get('stops') or ()) + 2
+        first_stop = attrs['checkpoint']['nextStop'] if 'checkpoint' in attrs else 0
+        next_stop = attrs.get('next_stop', first_stop)
+        if not first_stop <= next_stop <= itinerary_length:
+            raise serializers.ValidationError({
+                'next_stop': f"Must be between {first_stop} and {itinerary_length}."
+            })
+        return attrs
+
+
+class PlanTripBatchRequestSerializer(serializers.Serializer):
+    """
+    Validates the batch envelope only.
+
+    Items are validated one by one with PlanTripRequestSerializer so that
+    a bad item is reported in place instead of failing the whole batch.
+    """
+    trips = serializers.ListField(
+        allow_empty=False,
+        max_length=settings.TRIP_BATCH_MAX_SIZE,
+    )
+
+
+class SweepRequestSerializer(serializers.Serializer):
+    """
+    Validates the sweep request: one trip (without cycle hours) plus the
+    grid of departure times (hours since midnight on day 1) and cycle
+    hours used to plan it for.
+    """
+    current_location = LocationSerializer()
+    pickup_location = DutyLocationSerializer()
+    dropoff_location = DutyLocationSerializer()
+    stops = StopSerializer(many=True, required=False, max_length=settings.TRIP_MAX_STOPS)
+    start_times = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=24),
+        allow_empty=False,
+    )
+    cycle_hours = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=70),
+        allow_empty=False,
+    )
+    include_plans = serializers.BooleanField(default=False)
+    
+    def validate(self, attrs):
+        if any(round(start * 60) >= 24 * 60 for start in attrs['start_times']):
+            raise serializers.ValidationError({'start_times': "Start times must be before 24:00."})
+        variants = len(attrs['start_times']) * len(attrs['cycle_hours'])
+        if variants > settings.TRIP_SWEEP_MAX_VARIANTS:
+            raise serializers.ValidationError(
+                f"Sweep of {variants} variants exceeds the limit of "
+                f"{settings.TRIP_SWEEP_MAX_VARIANTS}."
+            )
+        return attrs
+
+
+class CoordinateSerializer(serializers.Serializer):
+    """Validates a bare coordinate pair; a label is optional."""
+    label = serializers.CharField(max_length=200, required=False)
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+
+
+class DistanceMatrixRequestSerializer(serializers.Serializer):
+    """
+    Validates the distance-matrix request payload.
+
+    Each list is capped at DISTANCE_MATRIX_MAX_CELLS before its items are
+    validated, so an oversized body is turned away without checking every
+    coordinate; validate() then caps the product.
+    """
+    origins = CoordinateSerializer(many=True, allow_empty=False, max_length=settings.DISTANCE_MATRIX_MAX_CELLS)
+    destinations = CoordinateSerializer(many=True, allow_empty=False, max_length=settings.DISTANCE_MATRIX_MAX_CELLS)
+    
+    def validate(self, attrs):
+        cells = len(attrs['origins']) * len(attrs['destinations'])
+        if cells > settings.DISTANCE_MATRIX_MAX_CELLS:
+            raise serializers.ValidationError(
+                f"Matrix of {cells} cells exceeds the limit of "
+                f"{settings.DISTANCE_MATRIX_MAX_CELLS}."
+            )
+        return attrs
@@ -0,0 +1,129 @@
+"""
+Batch trip planning service.
+Spreads HOS calculations for many trips across a process pool.
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Iterator
+
+from django.conf import settings
+
+from . import metrics
+from .hos_engine import calculate_trip
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_pool_size() -> int:
+    """
+    Number of worker processes: TRIP_BATCH_WORKERS, or this web worker's
+    share of the cores, so N web workers do not start N pools of one
+    process per core.
+    """
+    configured = getattr(settings, 'TRIP_BATCH_WORKERS', None)
+    if configured:
+        return configured
+    return max(1, (os.cpu_count() or 1) // max(settings.WEB_CONCURRENCY, 1))
+
+
+def _init_worker():
+    """Configure Django in freshly spawned worker processes."""
+    if os.getenv('DJANGO_SETTINGS_MODULE'):
+        import django
+        django.setup()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawn rather than fork: the web server may be multi-threaded.
+            _executor = ProcessPoolExecutor(
+                max_workers=get_pool_size(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drop a broken pool so the next batch starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _plan_one(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan a single trip, capturing any failure as a per-item error."""
+    try:
+        return {'result': calculate_trip(data)}
+    except Exception as e:
+        metrics.record_error('plan-trip-batch', e)
+        return {'error': str(e)}
+
+
+def _plan_chunk(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Worker entry point: plan a contiguous slice of the batch."""
+    return [_plan_one(data) for data in items]
+
+
+def _chunk(items: List[Any], count: int) -> List[List[Any]]:
+    """Split items into at most `count` contiguous, evenly sized chunks."""
+    size = -(-len(items) // count)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def plan_trips(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Plan a list of validated trip payloads.
+
+    Returns one outcome per item, in input order. Each outcome is either
+    {'result': plan} or {'error': message}; a failing item never affects
+    the others.
+    """
+    return list(iter_plan_trips(items))
+
+
+def iter_plan_trips(items: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming form of plan_trips.
+
+    Yields outcomes in input order as soon as each chunk of the batch
+    finishes, so callers can start writing before the whole batch is done.
+    """
+    if not items:
+        return
+
+    workers = get_pool_size()
+    if len(items) == 1 or workers == 1:
+        # Not worth the inter-process round trip
+        for data in items:
+            yield _plan_one(data)
+        return
+
+    executor = get_executor()
+    futures = [
+        executor.submit(_plan_chunk, chunk)
+        for chunk in _chunk(items, workers)
+    ]
+
+    done = 0
+    try:
+        for future in futures:
+            outcomes = future.result()
+            done += len(outcomes)
+            yield from outcomes
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        # A worker died mid-batch; finish the remainder in-process
+        for data in items[done:]:
+            yield _plan_one(data)
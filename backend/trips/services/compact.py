@@ -0,0 +1,162 @@
+"""
+Compact (version 2) plan response encoding.
+
+Version 1 (the default) spells every location out as a {label, lat, lng}
+dict wherever it appears and every time as an HH:MM string. Version 2
+carries the same plan in a fraction of the bytes:
+
+- every distinct location appears once in a `locations` table of
+  [lat, lng, label] rows (coordinates to 5 decimals, about a metre), and
+  origin, pickup, dropoff, position, intermediate stops and scheduled
+  stops refer to it by index;
+- route waypoints and geometry are encoded polylines (the Google
+  polyline algorithm, precision 5);
+- times are integer minutes: a stop's time counts from midnight of day 1
+  (so its day is minute // 1440), log intervals count from the day's
+  midnight, and durations and log totals are minutes as well;
+- a scheduled stop is an array [type, location, minute, duration, mileage];
+- a day's log lists each status as a flat [start, end, start, end, ...]
+  array, and the day's date is implied by `startDate`.
+
+Plans are cached and stored in version 1; encode_plan converts one on
+the way out.
+"""
+
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+COMPACT_VERSION = 2
+COORDINATE_PRECISION = 5
+MINUTES_PER_DAY = 1440
+
+LOG_STATUSES = ('offDuty', 'sleeperBerth', 'driving', 'onDuty')
+
+
+def encode_polyline(points: Sequence[Sequence[float]], precision: int = COORDINATE_PRECISION) -> str:
+    """Encode [lat, lng] points with the Google polyline algorithm."""
+    factor = 10 ** precision
+    chunks = []
+    previous_lat = previous_lng = 0
+    for lat, lng in points:
+        lat = round(lat * factor)
+        lng = round(lng * factor)
+        for delta in (lat - previous_lat, lng - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lng = lat, lng
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = COORDINATE_PRECISION) -> List[List[float]]:
+    """Inverse of encode_polyline."""
+    factor = 10 ** precision
+    points = []
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    lat = lng = 0
+    for index in range(0, len(values) - 1, 2):
+        lat += values[index]
+        lng += values[index + 1]
+        points.append([lat / factor, lng / factor])
+    return points
+
+
+def _minutes(hours: float) -> int:
+    return round(hours * 60)
+
+
+class LocationTable:
+    """Distinct [lat, lng, label] rows, handing out one index per location."""
+
+    def __init__(self):
+        self.rows: List[List[Any]] = []
+        self._index: Dict[tuple, int] = {}
+
+    def add(self, label: Optional[str], lat: float, lng: float) -> int:
+        row = (round(lat, COORDINATE_PRECISION), round(lng, COORDINATE_PRECISION), label)
+        index = self._index.get(row)
+        if index is None:
+            index = self._index[row] = len(self.rows)
+            self.rows.append(list(row))
+        return index
+
+    def add_location(self, location: Dict[str, Any]) -> int:
+        return self.add(location.get('label'), location['lat'], location['lng'])
+
+
+def _start_date(days: List[Dict[str, Any]]) -> Optional[str]:
+    """Date of day 1, from the first day that has a date."""
+    for day in days:
+        if day.get('date'):
+            return (date.fromisoformat(day['date']) - timedelta(days=day['day'] - 1)).isoformat()
+    return None
+
+
+def _encode_stop(stop: Dict[str, Any], locations: LocationTable) -> List[Any]:
+    hours, minutes = stop['time'].split(':')
+    return [
+        stop['type'],
+        locations.add(stop['location'], stop['lat'], stop['lng']),
+        (stop['day'] - 1) * MINUTES_PER_DAY + int(hours) * 60 + int(minutes),
+        _minutes(stop['duration']),
+        stop['mileage'],
+    ]
+
+
+def _encode_log(log: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = {
+        status: [_minutes(value) for entry in log[status] for value in (entry['start'], entry['end'])]
+        for status in LOG_STATUSES
+    }
+    encoded['totals'] = {status: _minutes(log['totals'][status]) for status in LOG_STATUSES}
+    return encoded
+
+
+def encode_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode a version 1 plan (or replan) response as version 2."""
+    locations = LocationTable()
+    encoded = {'version': COMPACT_VERSION}
+
+    for key, value in plan.items():
+        if key in ('origin', 'pickup', 'dropoff', 'position'):
+            encoded[key] = locations.add_location(value)
+        elif key == 'stops':
+            encoded[key] = [
+                {
+                    **{k: v for k, v in stop.items() if k not in ('label', 'lat', 'lng')},
+                    'location': locations.add_location(stop),
+                }
+                for stop in value
+            ]
+        elif key == 'route':
+            encoded[key] = {
+                name: encode_polyline(
+                    [[point['lat'], point['lng']] for point in points] if name == 'waypoints' else points
+                )
+                for name, points in value.items()
+            }
+        elif key == 'days':
+            encoded['startDate'] = _start_date(value)
+            encoded[key] = [
+                {
+                    'day': day['day'],
+                    'stops': [_encode_stop(stop, locations) for stop in day['stops']],
+                    'log': _encode_log(day['log']),
+                }
+                for day in value
+            ]
+        else:
+            encoded[key] = value
+
+    encoded['locations'] = locations.rows
+    return encoded
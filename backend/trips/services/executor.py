@@ -0,0 +1,64 @@
+"""
+Bounded executor for CPU-bound planning work.
+
+Async views hand calculate_trip to this executor instead of Django's
+default sync adapter. Work beyond the configured workers plus queue depth
+is refused immediately, so bursts turn into fast 503s rather than an
+ever-growing backlog of threads.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Any
+
+from django.conf import settings
+
+
+class ExecutorFull(Exception):
+    """Raised when the executor has no free worker or queue slot."""
+
+
+class BoundedExecutor:
+    """
+    ThreadPoolExecutor with a hard cap on running plus queued work.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='plan-worker',
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """Schedule fn(*args), raising ExecutorFull if every slot is taken."""
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorFull()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+_plan_executor = None
+_plan_executor_lock = threading.Lock()
+
+
+def get_plan_executor() -> BoundedExecutor:
+    """Return the shared plan executor, creating it from settings on first use."""
+    global _plan_executor
+    with _plan_executor_lock:
+        if _plan_executor is None:
+            _plan_executor = BoundedExecutor(
+                max_workers=settings.PLAN_EXECUTOR_WORKERS,
+                max_queue=settings.PLAN_EXECUTOR_QUEUE_DEPTH,
+            )
+        return _plan_executor
@@ -0,0 +1,375 @@
+"""
+Vectorized fleet-wide HOS simulation.
+
+Runs chained loads for many drivers at once. Each driver's state (clock,
+day, 11h/14h/8h counters, the 8-day cycle window, mileage) lives in NumPy
+arrays, and
+every pass advances all drivers by one scheduling event, applying the same
+rules as hos_engine's driving loop: times in whole minutes (int64),
+miles in the same floating-point order.
+
+A load is a fixed number of legs, each followed by an on-duty stop (for a
+plain trip: deadhead to pickup, pickup, loaded leg, dropoff). Every load
+is planned as a fresh HOSEngine would plan it, starting at 06:00 on the
+day after the previous load ended, with the previous load's 8-day recap
+carried over as its cycle history. Loads start while their start day is within the horizon;
+a load in progress at the horizon is run to completion.
+"""
+
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from .hos_engine import (
+    HOSEngine,
+    MAX_DRIVING_MINUTES,
+    MAX_DUTY_MINUTES,
+    BREAK_REQUIRED_MINUTES,
+    OFF_DUTY_RESET_MINUTES,
+    MAX_CYCLE_HOURS,
+    MAX_CYCLE_MINUTES,
+    CYCLE_DAYS,
+    RESTART_MINUTES,
+    FUEL_INTERVAL_MILES,
+    FUEL_STOP_MINUTES,
+    AVG_SPEED_MPH,
+    PICKUP_DURATION,
+    DROPOFF_DURATION,
+    MINUTES_PER_HOUR,
+    MINUTES_PER_DAY,
+    START_MINUTE,
+)
+
+
+LOAD_START_TIME = START_MINUTE / MINUTES_PER_HOUR
+
+
+def _minutes(hours: np.ndarray) -> np.ndarray:
+    # hos_engine.to_minutes: round half to even, like round()
+    return np.rint(hours * MINUTES_PER_HOUR).astype(np.int64)
+
+
+def default_durations(distances: np.ndarray) -> np.ndarray:
+    """On-duty hours after each leg: 1 hour at every pickup and drop."""
+    durations = np.full(distances.shape, DROPOFF_DURATION)
+    durations[..., 0] = PICKUP_DURATION
+    return durations
+
+
+def simulate(
+    distances: Any,
+    durations: Optional[Any] = None,
+    cycle_hours: Optional[Any] = None,
+    days: int = 30,
+    loads_per_driver: Optional[Any] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Simulate chained loads for a fleet.
+
+    Args:
+        distances: (drivers, loads, legs) leg miles, as calculate_route
+            reports them.
+        durations: on-duty hours at the stop ending each leg, same shape
+            (default: default_durations()).
+        cycle_hours: (drivers,) cycle hours used before the first load
+            (default 0).
+        days: horizon; no load starts after this day.
+        loads_per_driver: (drivers,) number of loads to use from each row
+            (default: all).
+
+    Returns per-driver arrays: loadsCompleted, drivingHours, onDutyHours,
+    miles, restStops, fuelStops, restarts (34-hour restarts), utilization
+    (driving plus on-duty hours over the horizon), cycleViolations (loads
+    that end past the 70-hour cycle, as calculate_trip would warn),
+    excessHours (duty hours worked beyond 70), cycleHours (in the window
+    at the end) and the final day and time.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    n_drivers, n_loads, n_legs = distances.shape
+    durations = default_durations(distances) if durations is None else np.asarray(durations, dtype=np.float64)
+    if loads_per_driver is None:
+        loads_per_driver = np.full(n_drivers, n_loads)
+    loads_per_driver = np.minimum(np.asarray(loads_per_driver), n_loads)
+    drivers = np.arange(n_drivers)
+    # hos_engine.driving_minutes: each leg takes a whole number of minutes
+    leg_minutes = np.rint(distances * MINUTES_PER_HOUR / AVG_SPEED_MPH).astype(np.int64)
+    stop_minutes = _minutes(durations)
+
+    # Scheduling state, one entry per driver; times in minutes
+    time = np.full(n_drivers, START_MINUTE, dtype=np.int64)
+    day = np.ones(n_drivers, dtype=np.int64)
+    day_driving = np.zeros(n_drivers, dtype=np.int64)
+    day_duty = np.zeros(n_drivers, dtype=np.int64)
+    since_break = np.zeros(n_drivers, dtype=np.int64)
+    cycle = np.zeros(n_drivers, dtype=np.int64)
+    window = np.zeros((n_drivers, CYCLE_DAYS), dtype=np.int64)
+    window[:, 1 % CYCLE_DAYS] = 0 if cycle_hours is None else _minutes(np.asarray(cycle_hours, dtype=np.float64))
+    window_day = day.copy()
+    mileage = np.zeros(n_drivers)
+    load = np.zeros(n_drivers, dtype=np.int64)
+    leg = np.zeros(n_drivers, dtype=np.int64)
+    remaining = distances[:, 0, 0].copy()
+    remaining_minutes = leg_minutes[:, 0, 0].copy()
+    done = (loads_per_driver == 0) | (days < 1)
+
+    # Report accumulators
+    driving_minutes = np.zeros(n_drivers, dtype=np.int64)
+    on_duty_minutes = np.zeros(n_drivers, dtype=np.int64)
+    miles = np.zeros(n_drivers)
+    rest_stops = np.zeros(n_drivers, dtype=np.int64)
+    fuel_stops = np.zeros(n_drivers, dtype=np.int64)
+    restarts = np.zeros(n_drivers, dtype=np.int64)
+    loads_completed = np.zeros(n_drivers, dtype=np.int64)
+    violations = np.zeros(n_drivers, dtype=np.int64)
+    excess_minutes = np.zeros(n_drivers, dtype=np.int64)
+
+    def sum_window(mask):
+        # HOSEngine._init_cycle: the recap summed oldest first
+        cycle[mask] = 0
+        for offset in range(CYCLE_DAYS):
+            slot = (day[mask] - CYCLE_DAYS + 1 + offset) % CYCLE_DAYS
+            cycle[mask] += window[drivers[mask], slot]
+
+    def roll_window(mask, to_day):
+        # HOSEngine._roll_window: a full window's gap clears it at once,
+        # shorter gaps drop one day at a time
+        cleared = mask & (to_day - window_day >= CYCLE_DAYS)
+        window[cleared] = 0
+        cycle[cleared] = 0
+        window_day[cleared] = to_day[cleared]
+        behind = mask & (window_day < to_day)
+        while behind.any():
+            window_day[behind] += 1
+            rows = drivers[behind]
+            slot = window_day[behind] % CYCLE_DAYS
+            cycle[behind] -= window[rows, slot]
+            window[rows, slot] = 0
+            behind = mask & (window_day < to_day)
+
+    def count_cycle(mask, minutes):
+        # HOSEngine._add_cycle_minutes: split at midnight
+        count_day = day.copy()
+        count_time = time.copy()
+        left = np.where(mask, minutes, 0)
+        counting = left > 0
+        while counting.any():
+            segment = np.minimum(left, MINUTES_PER_DAY - count_time)
+            roll_window(counting, count_day)
+            rows = drivers[counting]
+            window[rows, count_day[counting] % CYCLE_DAYS] += segment[counting]
+            cycle[counting] += segment[counting]
+            left[counting] -= segment[counting]
+            count_day[counting] += 1
+            count_time[counting] = 0
+            counting = left > 0
+
+    def advance(mask, minutes):
+        # HOSEngine._advance_clock: whole days carried over by divmod
+        time[mask] += minutes[mask] if np.ndim(minutes) else minutes
+        day[mask] += time[mask] // MINUTES_PER_DAY
+        time[mask] %= MINUTES_PER_DAY
+        roll_window(mask, day)
+
+    def drive(mask, minutes, distance):
+        count_cycle(mask, minutes)
+        day_driving[mask] += minutes[mask]
+        day_duty[mask] += minutes[mask]
+        since_break[mask] += minutes[mask]
+        mileage[mask] += distance[mask]
+        driving_minutes[mask] += minutes[mask]
+        miles[mask] += distance[mask]
+        advance(mask, minutes)
+
+    def on_duty(mask, minutes):
+        count_cycle(mask, minutes)
+        day_duty[mask] += minutes[mask]
+        on_duty_minutes[mask] += minutes[mask]
+        advance(mask, minutes)
+
+    def restart(mask):
+        # HOSEngine._add_restart: every limit, the cycle included, resets
+        day_driving[mask] = 0
+        day_duty[mask] = 0
+        since_break[mask] = 0
+        advance(mask, RESTART_MINUTES)
+        window[mask] = 0
+        cycle[mask] = 0
+        restarts[mask] += 1
+
+    sum_window(drivers >= 0)
+    load_start_cycle = cycle.copy()
+    end_cycle = cycle.copy()
+
+    while not done.all():
+        on_leg = ~done & (remaining_minutes > 0)
+        at_stop = ~done & ~on_leg
+
+        # Driving: restart, rest, fuel stop or a plain segment, as in
+        # _iter_driving (the 8-hour limit is part of the minimum, so it
+        # triggers the rest)
+        available = np.minimum(
+            np.minimum(MAX_DRIVING_MINUTES - day_driving, MAX_DUTY_MINUTES - day_duty),
+            np.minimum(BREAK_REQUIRED_MINUTES - since_break, MAX_CYCLE_MINUTES - cycle)
+        )
+        cycle_used = on_leg & (cycle >= MAX_CYCLE_MINUTES)
+        rest = on_leg & ~cycle_used & (available <= 0)
+        go = on_leg & ~cycle_used & ~rest
+
+        drive_minutes = np.minimum(available, remaining_minutes)
+        drive_distance = np.where(
+            drive_minutes == remaining_minutes, remaining, drive_minutes * AVG_SPEED_MPH / MINUTES_PER_HOUR
+        )
+        next_fuel = (mileage // FUEL_INTERVAL_MILES + 1) * FUEL_INTERVAL_MILES
+        miles_to_fuel = next_fuel - mileage
+        fuel = (go & (mileage + drive_distance > next_fuel)
+                & (miles_to_fuel < drive_distance) & (miles_to_fuel > 0))
+        fuel_minutes = np.minimum(
+            np.rint(miles_to_fuel * MINUTES_PER_HOUR / AVG_SPEED_MPH).astype(np.int64), drive_minutes
+        )
+
+        minutes = np.where(fuel, fuel_minutes, drive_minutes)
+        distance = np.where(fuel, miles_to_fuel, drive_distance)
+        drive(go, minutes, distance)
+        remaining_minutes[go] -= minutes[go]
+        remaining[go] -= distance[go]
+
+        # _iter_cycle_check: restart first when the stop would run past
+        # the cycle
+        restart(fuel & (cycle + FUEL_STOP_MINUTES > MAX_CYCLE_MINUTES))
+        on_duty(fuel, np.full(n_drivers, FUEL_STOP_MINUTES))
+        fuel_stops[fuel] += 1
+
+        day_driving[rest] = 0
+        day_duty[rest] = 0
+        since_break[rest] = 0
+        rest_stops[rest] += 1
+        advance(rest, OFF_DUTY_RESET_MINUTES)
+
+        restart(cycle_used)
+
+        # End of a leg: miles left under half a minute of driving count
+        # without clock time, then on-duty at the stop, then the next leg
+        # or load
+        if not at_stop.any():
+            continue
+        tail = at_stop & (remaining > 0)
+        mileage[tail] += remaining[tail]
+        miles[tail] += remaining[tail]
+        stopped = drivers[at_stop]
+        on_duty_at_stop = np.zeros(n_drivers, dtype=np.int64)
+        on_duty_at_stop[stopped] = stop_minutes[stopped, load[stopped], leg[stopped]]
+        restart(at_stop & (cycle + on_duty_at_stop > MAX_CYCLE_MINUTES))
+        on_duty(at_stop, on_duty_at_stop)
+        leg[at_stop] += 1
+
+        finished = at_stop & (leg == n_legs)
+        if finished.any():
+            over = finished & (cycle > MAX_CYCLE_MINUTES)
+            violations[over] += 1
+            excess_minutes[over] += np.maximum(cycle - np.maximum(load_start_cycle, MAX_CYCLE_MINUTES), 0)[over]
+            loads_completed[finished] += 1
+            end_cycle[finished] = cycle[finished]
+
+            # The next load is a fresh engine at 06:00 the next day,
+            # seeded with the recap as of that day
+            day[finished] += 1
+            roll_window(finished, day)
+            time[finished] = START_MINUTE
+            day_driving[finished] = 0
+            day_duty[finished] = 0
+            since_break[finished] = 0
+            mileage[finished] = 0
+            load[finished] += 1
+            leg[finished] = 0
+            sum_window(finished)
+            load_start_cycle[finished] = cycle[finished]
+            done |= finished & ((load >= loads_per_driver) | (day > days))
+
+        next_leg = drivers[at_stop & ~done]
+        remaining[next_leg] = distances[next_leg, load[next_leg], leg[next_leg]]
+        remaining_minutes[next_leg] = leg_minutes[next_leg, load[next_leg], leg[next_leg]]
+
+    driving_hours = driving_minutes / MINUTES_PER_HOUR
+    on_duty_hours = on_duty_minutes / MINUTES_PER_HOUR
+    return {
+        'loadsCompleted': loads_completed,
+        'drivingHours': driving_hours,
+        'onDutyHours': on_duty_hours,
+        'miles': miles,
+        'restStops': rest_stops,
+        'fuelStops': fuel_stops,
+        'restarts': restarts,
+        'utilization': (driving_hours + on_duty_hours) / (days * 24),
+        'cycleViolations': violations,
+        'excessHours': excess_minutes / MINUTES_PER_HOUR,
+        'cycleHours': end_cycle / MINUTES_PER_HOUR,
+        'day': day,
+        'time': time / MINUTES_PER_HOUR,
+    }
+
+
+def simulate_driver_scalar(
+    distances: Any,
+    durations: Optional[Any] = None,
+    cycle_hours: float = 0,
+    days: int = 30,
+    loads: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Reference run of one driver's loads through HOSEngine itself.
+
+    Takes one driver's (loads, legs) slice of simulate()'s inputs and
+    returns the same report keys as plain numbers.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    durations = default_durations(distances) if durations is None else np.asarray(durations, dtype=np.float64)
+    loads = len(distances) if loads is None else min(loads, len(distances))
+    nowhere = {'label': '', 'lat': 0.0, 'lng': 0.0}
+
+    report = {
+        'loadsCompleted': 0, 'drivingHours': 0.0, 'onDutyHours': 0.0, 'miles': 0.0,
+        'restStops': 0, 'fuelStops': 0, 'restarts': 0, 'cycleViolations': 0,
+        'excessHours': 0.0, 'cycleHours': float(cycle_hours), 'day': 1,
+        'time': LOAD_START_TIME,
+    }
+    driving_minutes = on_duty_minutes = 0
+    # Each load is its own engine, starting on its day 1
+    day = 1
+    history = [float(cycle_hours)]
+    for index in range(loads if days >= 1 else 0):
+        engine = HOSEngine(cycle_history=history)
+        start_cycle = engine.cycle_hours_used
+        itinerary = [('stop', nowhere, float(hours)) for hours in durations[index]]
+        legs = [{'distance': float(miles)} for miles in distances[index]]
+
+        for stop in engine._iter_itinerary(nowhere, itinerary, legs):
+            if stop.type == 'rest':
+                report['restStops'] += 1
+            elif stop.type == 'fuel':
+                report['fuelStops'] += 1
+            elif stop.type == 'restart':
+                report['restarts'] += 1
+
+        for activity in engine.activities:
+            if activity.type == 'driving':
+                driving_minutes += activity.end - activity.start
+            elif activity.type == 'onDuty':
+                on_duty_minutes += activity.end - activity.start
+
+        report['loadsCompleted'] += 1
+        report['miles'] += engine.current_mileage
+        if engine.cycle_hours_used > MAX_CYCLE_HOURS:
+            report['cycleViolations'] += 1
+            report['excessHours'] += max(engine.cycle_hours_used - max(start_cycle, MAX_CYCLE_HOURS), 0)
+        report['cycleHours'] = engine.cycle_hours_used
+
+        day += engine.current_day
+        report['day'] = day
+        history = engine.cycle_recap()[1:] + [0.0]
+        if day > days:
+            break
+
+    report['drivingHours'] = driving_minutes / MINUTES_PER_HOUR
+    report['onDutyHours'] = on_duty_minutes / MINUTES_PER_HOUR
+    report['utilization'] = (report['drivingHours'] + report['onDutyHours']) / (days * 24)
+    return report
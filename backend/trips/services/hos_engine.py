@@ -6,12 +6,16 @@ Implements FMCSA rules for property-carrying drivers:
 - 14-hour duty window
 - 30-minute break after 8 hours driving
 - 10 consecutive hours off-duty reset
-- 70 hours / 8 days cycle
+- 70 hours / 8 days cycle, tracked as a rolling window, with a 34-hour
+  restart inserted when it runs out
 """
 
-from typing import Dict, List, Any
-from datetime import datetime, timedelta
-from .route_service import calculate_route
+from typing import Dict, List, Any, Generator, Iterator, Optional, Tuple
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from . import metrics
+from .route_service import calculate_multi_stop_route, route_summary
+from .truck_stops import detour_budget, find_truck_stop
 
 
 # HOS Constants (FMCSA regulations)
@@ -21,222 +25,825 @@ BREAK_REQUIRED_AFTER = 8.0
 BREAK_DURATION = 0.5  # 30 minutes
 OFF_DUTY_RESET = 10.0
 MAX_CYCLE_HOURS = 70.0
+CYCLE_DAYS = 8
+RESTART_DURATION = 34.0  # 34-hour restart resets the cycle
 FUEL_INTERVAL_MILES = 1000
+FUEL_STOP_DURATION = 0.5
 PICKUP_DURATION = 1.0  # 1 hour on-duty
 DROPOFF_DURATION = 1.0  # 1 hour on-duty
 AVG_SPEED_MPH = 55
 
+# Bumped whenever the checkpoint layout changes
+CHECKPOINT_VERSION = 2
+# Bumped whenever a rule change alters the plans the engine produces, so
+# cached and stored plans of an older engine are not served
+# (plan_cache.plan_config)
+ENGINE_VERSION = 1
+
+# The engine keeps its clock, counters and activities in whole minutes, so
+# merging, totals and day rollover are exact integer arithmetic. Hours
+# come in (cycle hours, stop durations) and go out (logs, checkpoints) at
+# the edges.
+MINUTES_PER_HOUR = 60
+MINUTES_PER_DAY = 24 * MINUTES_PER_HOUR
+
+
+def to_minutes(hours: float) -> int:
+    """Hours as whole minutes, to the nearest minute."""
+    return round(hours * MINUTES_PER_HOUR)
+
+
+def driving_minutes(miles: float) -> int:
+    """Minutes to drive `miles` at AVG_SPEED_MPH, to the nearest minute."""
+    return round(miles * MINUTES_PER_HOUR / AVG_SPEED_MPH)
+
+
+MAX_DRIVING_MINUTES = to_minutes(MAX_DRIVING_HOURS)
+MAX_DUTY_MINUTES = to_minutes(MAX_DUTY_WINDOW)
+BREAK_REQUIRED_MINUTES = to_minutes(BREAK_REQUIRED_AFTER)
+BREAK_MINUTES = to_minutes(BREAK_DURATION)
+OFF_DUTY_RESET_MINUTES = to_minutes(OFF_DUTY_RESET)
+MAX_CYCLE_MINUTES = to_minutes(MAX_CYCLE_HOURS)
+RESTART_MINUTES = to_minutes(RESTART_DURATION)
+FUEL_STOP_MINUTES = to_minutes(FUEL_STOP_DURATION)
+START_MINUTE = 6 * MINUTES_PER_HOUR  # Plans start at 6:00 AM
+
+
+def format_minutes(minutes: int) -> str:
+    """Format minutes since midnight as HH:MM."""
+    h, m = divmod(minutes, MINUTES_PER_HOUR)
+    return f"{h % 24:02d}:{m:02d}"
+
+
+def format_time(hours: float) -> str:
+    """Format time as HH:MM."""
+    return format_minutes(to_minutes(hours))
+
+
+def _log_hours(minutes: int) -> float:
+    """Minutes as hours for the daily log."""
+    return round(minutes / MINUTES_PER_HOUR, 2)
+
+
+class Activity:
+    """One duty-status interval within a single day, in minutes since its midnight."""
+    
+    __slots__ = ('day', 'start', 'end', 'type')
+    
+    def __init__(self, day: int, start: int, end: int, activity_type: str):
+        self.day = day
+        self.start = start
+        self.end = end
+        self.type = activity_type
+    
+    def __eq__(self, other):
+        if not isinstance(other, Activity):
+            return NotImplemented
+        return (self.day, self.start, self.end, self.type) == (other.day, other.start, other.end, other.type)
+    
+    def __repr__(self):
+        return f"Activity(day={self.day}, start={self.start}, end={self.end}, type={self.type!r})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'day': self.day, 'start': self.start, 'end': self.end, 'type': self.type}
+
+
+class Stop:
+    """
+    A scheduled stop.
+    
+    Holds a reference to its location and the raw clock values (minute of
+    the day; duration in hours, as given); the JSON-shaped dict (label,
+    HH:MM time, rounded mileage) is only built by to_dict() when the plan
+    is assembled for the response.
+    """
+    
+    __slots__ = ('type', 'location', 'minute', 'duration', 'mileage', 'day')
+    
+    def __init__(self, stop_type: str, location: Dict, minute: int, duration: float, mileage: float, day: int):
+        self.type = stop_type
+        self.location = location
+        self.minute = minute
+        self.duration = duration
+        self.mileage = mileage
+        self.day = day
+    
+    def to_dict(self) -> Dict[str, Any]:
+        location = self.location
+        return {
+            'type': self.type,
+            'location': location['label'],
+            'time': format_minutes(self.minute),
+            'duration': self.duration,
+            'lat': location['lat'],
+            'lng': location['lng'],
+            'mileage': round(self.mileage),
+            'day': self.day,
+        }
+
+
+def build_itinerary(data: Dict[str, Any]) -> List[Tuple[str, Dict, float]]:
+    """
+    Ordered on-duty stops of a trip as (stop_type, location, duration).
+    
+    Pickup first, then any intermediate stops, then dropoff. A location
+    without its own duration gets the default pickup/dropoff time.
+    """
+    pickup_loc = data['pickup_location']
+    dropoff_loc = data['dropoff_location']
+    
+    itinerary = [('pickup', pickup_loc, pickup_loc.get('duration', PICKUP_DURATION))]
+    for stop in data.get('stops') or ():
+        stop_type = stop.get('type', 'dropoff')
+        default = PICKUP_DURATION if stop_type == 'pickup' else DROPOFF_DURATION
+        itinerary.append((stop_type, stop, stop.get('duration', default)))
+    itinerary.append(('dropoff', dropoff_loc, dropoff_loc.get('duration', DROPOFF_DURATION)))
+    return itinerary
+
+
+class CheckpointError(ValueError):
+    """A checkpoint the engine cannot resume from."""
+
 
 class HOSEngine:
     """
     Calculates HOS-compliant trip schedules.
     """
     
-    def __init__(self, cycle_hours_used: float = 0):
-        self.cycle_hours_used = cycle_hours_used
-        self.current_day_driving = 0
-        self.current_day_duty = 0
-        self.driving_since_break = 0
-        self.current_time = 6.0  # Start at 6:00 AM
+    def __init__(
+        self,
+        cycle_hours_used: float = 0,
+        timings: Optional[Dict[str, float]] = None,
+        cycle_history: Optional[List[float]] = None,
+        start_time: Optional[float] = None
+    ):
+        # Clock on day 1 when the trip starts, in hours (default 06:00)
+        start_minute = START_MINUTE if start_time is None else to_minutes(start_time)
+        if not 0 <= start_minute < MINUTES_PER_DAY:
+            raise ValueError(f"start_time must be within the day, got {start_time}")
+        # When a dict is given, stage durations (seconds) are recorded into
+        # it under 'route', 'schedule' and 'grouping'; None skips all timing
+        self.timings = timings
+        # Clock and counters, in minutes; read them in hours through the
+        # current_time, current_day_driving, ... properties
+        self._time = start_minute
+        self._day_driving = 0
+        self._day_duty = 0
+        self._since_break = 0
         self.current_day = 1
         self.current_mileage = 0
-        # Track all activities: [(day, start_time, end_time, type), ...]
+        # Track all activities as Activity records, in recording order
         self.activities = []
+        # Same activities bucketed by day, each bucket in start-time order
+        self.activities_by_day = {}
+        # Date of day 1 (today unless resumed from a checkpoint)
+        self.start_date = None
+        # Itinerary index being driven to, and the last known position
+        # (None until the engine is checkpointed mid-trip)
+        self.next_stop = 0
+        self.position = None
+        self.restarts = 0
+        self._init_cycle(cycle_hours_used, cycle_history)
+    
+    @property
+    def current_time(self) -> float:
+        """Clock, in hours since the current day's midnight."""
+        return self._time / MINUTES_PER_HOUR
+    
+    @property
+    def current_day_driving(self) -> float:
+        return self._day_driving / MINUTES_PER_HOUR
+    
+    @property
+    def current_day_duty(self) -> float:
+        return self._day_duty / MINUTES_PER_HOUR
+    
+    @property
+    def driving_since_break(self) -> float:
+        return self._since_break / MINUTES_PER_HOUR
+    
+    @property
+    def cycle_hours_used(self) -> float:
+        """On-duty hours in the rolling 8-day window."""
+        return self._cycle / MINUTES_PER_HOUR
+    
+    def _init_cycle(self, cycle_hours_used: float, cycle_history: Optional[List[float]] = None):
+        """
+        Seed the rolling 70-hour/8-day window.
+        
+        cycle_history is the 8-day recap, oldest first, ending with the
+        current day (on-duty hours today so far). Without it, all of
+        cycle_hours_used is counted on the current day, so none of it is
+        recovered before the window has moved a full 8 days.
         
-    def calculate_trip(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        The window is a ring buffer of daily on-duty minutes indexed by
+        day % CYCLE_DAYS; _cycle is its running total.
+        """
+        if cycle_history is None:
+            cycle_history = [cycle_hours_used]
+        history = [0] * (CYCLE_DAYS - len(cycle_history)) + [to_minutes(hours) for hours in cycle_history[-CYCLE_DAYS:]]
+        
+        self.cycle_window = [0] * CYCLE_DAYS
+        self.window_day = self.current_day
+        self._cycle = 0
+        for offset, minutes in enumerate(history):
+            self.cycle_window[(self.current_day - CYCLE_DAYS + 1 + offset) % CYCLE_DAYS] = minutes
+            self._cycle += minutes
+    
+    def cycle_recap(self) -> List[float]:
+        """On-duty hours of the last 8 days, oldest first, ending today."""
+        self._roll_window(self.current_day)
+        return [
+            self.cycle_window[day % CYCLE_DAYS] / MINUTES_PER_HOUR
+            for day in range(self.current_day - CYCLE_DAYS + 1, self.current_day + 1)
+        ]
+    
+    def _roll_window(self, day: int):
+        """Move the window forward to `day`, recovering minutes that drop out."""
+        if day <= self.window_day:
+            return
+        if day - self.window_day >= CYCLE_DAYS:
+            self.cycle_window = [0] * CYCLE_DAYS
+            self._cycle = 0
+        else:
+            window = self.cycle_window
+            for new_day in range(self.window_day + 1, day + 1):
+                slot = new_day % CYCLE_DAYS
+                self._cycle -= window[slot]
+                window[slot] = 0
+        self.window_day = day
+    
+    def _add_cycle_minutes(self, minutes: int):
+        """Count on-duty minutes into the window, split at midnight. O(1)."""
+        day = self.current_day
+        time = self._time
+        remaining = minutes
+        while remaining > 0:
+            segment = min(remaining, MINUTES_PER_DAY - time)
+            self._roll_window(day)
+            self.cycle_window[day % CYCLE_DAYS] += segment
+            self._cycle += segment
+            remaining -= segment
+            day += 1
+            time = 0
+    
+    def _advance_clock(self, minutes: int):
+        """Move the clock forward, rolling the window at each midnight."""
+        days, self._time = divmod(self._time + minutes, MINUTES_PER_DAY)
+        self.current_day += days
+        self._roll_window(self.current_day)
+    
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """
+        Snapshot of the scheduling state as JSON-compatible data.
+        
+        Includes the current day's activities so a plan resumed from the
+        checkpoint can still log that day in full. Times are in hours;
+        from_checkpoint() rounds them back to the minute.
+        """
+        return {
+            'version': CHECKPOINT_VERSION,
+            'startDate': (self.start_date or date.today()).isoformat(),
+            'day': self.current_day,
+            'time': self.current_time,
+            'mileage': self.current_mileage,
+            'dayDriving': self.current_day_driving,
+            'dayDuty': self.current_day_duty,
+            'drivingSinceBreak': self.driving_since_break,
+            'cycleHours': self.cycle_hours_used,
+            'cycleWindow': self.cycle_recap(),
+            'restarts': self.restarts,
+            'nextStop': self.next_stop,
+            'position': self.position,
+            'activities': [
+                {
+                    'type': activity.type,
+                    'start': activity.start / MINUTES_PER_HOUR,
+                    'end': activity.end / MINUTES_PER_HOUR,
+                }
+                for activity in self.activities_by_day.get(self.current_day, [])
+            ],
+        }
+    
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Dict[str, Any], **kwargs) -> 'HOSEngine':
+        """Build an engine in the state captured by to_checkpoint()."""
+        if checkpoint['version'] != CHECKPOINT_VERSION:
+            raise CheckpointError(f"Unsupported checkpoint version {checkpoint['version']}")
+        if not 0 <= to_minutes(checkpoint['time']) < MINUTES_PER_DAY:
+            raise CheckpointError(f"Checkpoint time must be before 24:00, got {checkpoint['time']}")
+        # The current day's activities run back to back from 00:00 to time
+        clock = 0
+        for activity in checkpoint['activities']:
+            if to_minutes(activity['start']) != clock or to_minutes(activity['end']) <= clock:
+                raise CheckpointError("Checkpoint activities must run back to back from 00:00")
+            clock = to_minutes(activity['end'])
+        if clock != to_minutes(checkpoint['time']):
+            raise CheckpointError("Checkpoint activities must end at the checkpoint's time")
+        
+        engine = cls(**kwargs)
+        start_date = checkpoint['startDate']
+        engine.start_date = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+        engine.current_day = checkpoint['day']
+        # In whole minutes the window's days sum to cycleHours exactly
+        engine._init_cycle(0, checkpoint['cycleWindow'])
+        engine.restarts = checkpoint['restarts']
+        engine._time = to_minutes(checkpoint['time'])
+        engine.current_mileage = checkpoint['mileage']
+        engine._day_driving = to_minutes(checkpoint['dayDriving'])
+        engine._day_duty = to_minutes(checkpoint['dayDuty'])
+        engine._since_break = to_minutes(checkpoint['drivingSinceBreak'])
+        engine.next_stop = checkpoint['nextStop']
+        engine.position = checkpoint['position']
+        for activity in checkpoint['activities']:
+            engine._append_activity(
+                engine.current_day, to_minutes(activity['start']), to_minutes(activity['end']), activity['type']
+            )
+        return engine
+    
+    def calculate_trip(self, data: Dict[str, Any], route: Optional[Dict] = None) -> Dict[str, Any]:
         """
         Main entry point: calculate full trip schedule.
         """
+        return self._collect(self.iter_trip(data, route))
+    
+    def replan_trip(
+        self,
+        data: Dict[str, Any],
+        position: Dict[str, Any],
+        next_stop: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Collected form of iter_replan."""
+        return self._collect(self.iter_replan(data, position, next_stop))
+    
+    def _collect(self, items: Iterator[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Assemble streamed days and summary into a single result."""
+        started = perf_counter()
+        days = []
+        for kind, item in items:
+            if kind == 'day':
+                days.append(item)
+            else:
+                summary = item
+        metrics.observe_plan(
+            perf_counter() - started,
+            len(days),
+            sum(len(day['stops']) for day in days),
+            len(self.activities)
+        )
+        
+        # Same key order as the summary, with the days before the route
+        result = {}
+        for key, value in summary.items():
+            if key == 'route':
+                result['days'] = days
+            result[key] = value
+        return result
+    
+    def iter_trip(
+        self,
+        data: Dict[str, Any],
+        route: Optional[Dict] = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming form of calculate_trip.
+        
+        Yields ('day', day) as soon as the schedule moves past each midnight,
+        then ('summary', summary) where summary is the calculate_trip result
+        without 'days'. `route` is the trip's calculate_multi_stop_route
+        result when the caller already has it (see sweep_service).
+        """
         current_loc = data['current_location']
         pickup_loc = data['pickup_location']
         dropoff_loc = data['dropoff_location']
-        self.cycle_hours_used = data['cycle_hours_used']
+        itinerary = build_itinerary(data)
+        self._init_cycle(data['cycle_hours_used'], data.get('cycle_history'))
         
-        # Calculate route
-        route = calculate_route(current_loc, pickup_loc, dropoff_loc)
+        timings = self.timings
+        if timings is not None:
+            started = perf_counter()
         
-        # Build schedule
-        days = self._build_schedule(
-            current_loc, pickup_loc, dropoff_loc, route
-        )
+        # Calculate route: one leg into each itinerary stop
+        if route is None:
+            route = calculate_multi_stop_route(
+                [current_loc] + [location for _, location, _ in itinerary]
+            )
         
-        # Calculate totals
-        total_driving = sum(
-            day['log']['totals']['driving'] for day in days
-        )
-        total_on_duty = sum(
-            day['log']['totals']['onDuty'] for day in days
-        )
-        total_duty_hours = total_driving + total_on_duty
-        
-        # Calculate final cycle hours and check for warning
-        final_cycle = data['cycle_hours_used'] + total_duty_hours
-        cycle_warning = None
-        
-        if final_cycle > MAX_CYCLE_HOURS:
-            excess = round(final_cycle - MAX_CYCLE_HOURS, 1)
-            cycle_warning = {
-                'type': 'cycle_exceeded',
-                'message': f'This trip exceeds the 70-hour cycle limit by {excess} hours. Consider taking a 34-hour restart before starting.',
-                'excessHours': excess,
-                'recommendation': '34-hour restart required'
-            }
-        
-        result = {
+        if timings is not None:
+            scheduling_started = perf_counter()
+            timings['route'] = scheduling_started - started
+            timings['grouping'] = 0.0
+        
+        # Build schedule, accumulating totals as days are emitted
+        totals = {'days': 0, 'driving': 0, 'onDuty': 0}
+        yield from self._iter_totalled(self._iter_schedule(current_loc, itinerary, route), totals)
+        
+        if timings is not None:
+            # Grouping runs interleaved with scheduling; report them apart
+            timings['schedule'] = perf_counter() - scheduling_started - timings['grouping']
+        
+        day_count = totals['days']
+        total_driving = totals['driving']
+        total_on_duty = totals['onDuty']
+        
+        # Hours in the rolling window at the end, after any restarts
+        final_cycle = self.cycle_hours_used
+        cycle_warning = self._cycle_warning(final_cycle)
+        
+        summary = {
             'name': f"{current_loc['label']} → {dropoff_loc['label']}",
             'origin': current_loc,
             'pickup': pickup_loc,
             'dropoff': dropoff_loc,
+            'stops': data.get('stops') or [],
             'cycleHoursUsed': min(round(final_cycle), 70),
             'cycleHoursActual': round(final_cycle, 1),
             'totalMiles': round(route['total_distance']),
-            'totalDays': len(days),
-            'totalDrivingHours': round(total_driving, 1),
-            'totalOnDutyHours': round(total_on_duty, 1),
-            'days': days,
-            'route': {'waypoints': route['waypoints']},
+            'totalDays': day_count,
+            'totalDrivingHours': round(total_driving / MINUTES_PER_HOUR, 1),
+            'totalOnDutyHours': round(total_on_duty / MINUTES_PER_HOUR, 1),
+            'restarts': self.restarts,
+            'route': route_summary(route),
         }
         
         if cycle_warning:
-            result['warning'] = cycle_warning
+            summary['warning'] = cycle_warning
         
-        return result
+        yield 'summary', summary
+    
+    def iter_replan(
+        self,
+        data: Dict[str, Any],
+        position: Dict[str, Any],
+        next_stop: Optional[int] = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Replan the rest of a trip from the driver's reported position.
+        
+        The engine is either fresh (the trip starts at current_location) or
+        built with from_checkpoint(), in which case it resumes from the
+        checkpoint's position and day. next_stop is the itinerary index the
+        driver is now heading to (default: unchanged); stops passed since
+        the checkpoint are scheduled as driven, then the engine drives to
+        `position` and takes a new checkpoint there. Only the legs from
+        there on are planned forward, and only days from the checkpoint's
+        day onward are built.
+        
+        Yields ('day', day) and ('summary', summary) like iter_trip; the
+        summary carries the new checkpoint.
+        """
+        itinerary = build_itinerary(data)
+        resumed = self.position is not None
+        if self.timings is not None:
+            self.timings['grouping'] = 0.0
+        first_stop = self.next_stop
+        if next_stop is None:
+            next_stop = first_stop
+        if not first_stop <= next_stop <= len(itinerary):
+            raise ValueError(
+                f"next_stop must be between {first_stop} and {len(itinerary)}, got {next_stop}"
+            )
+        if not resumed:
+            self._init_cycle(data['cycle_hours_used'], data.get('cycle_history'))
+        
+        start_loc = self.position if resumed else data['current_location']
+        passed = itinerary[first_stop:next_stop]
+        remaining = itinerary[next_stop:]
+        route = calculate_multi_stop_route(
+            [start_loc]
+            + [location for _, location, _ in passed]
+            + [position]
+            + [location for _, location, _ in remaining]
+        )
+        legs = route['legs']
+        
+        def iter_stops() -> Iterator[Stop]:
+            if not resumed:
+                if self._time > 0:
+                    self._append_activity(self.current_day, 0, self._time, 'offDuty')
+                yield self._create_stop('start', start_loc, self._time, 0)
+            
+            # Already behind the driver: stops passed, then the stretch to position
+            yield from self._iter_itinerary(start_loc, passed, legs)
+            from_loc = passed[-1][1] if passed else start_loc
+            yield from self._iter_driving(legs[len(passed)]['distance'], from_loc, position)
+            self.position = position
+            self.next_stop = next_stop
+            checkpoint.update(self.to_checkpoint())
+            
+            yield from self._iter_itinerary(position, remaining, legs[len(passed) + 1:])
+            yield from self._iter_end(remaining[-1][1] if remaining else position)
+        
+        checkpoint = {}
+        totals = {'days': 0, 'driving': 0, 'onDuty': 0}
+        yield from self._iter_totalled(self._iter_days(iter_stops()), totals)
+        
+        final_cycle = self.cycle_hours_used
+        cycle_warning = self._cycle_warning(final_cycle)
+        remaining_miles = sum(leg['distance'] for leg in legs[len(passed) + 1:])
+        
+        summary = {
+            'name': f"{position['label']} → {data['dropoff_location']['label']}",
+            'position': position,
+            'dropoff': data['dropoff_location'],
+            'nextStop': next_stop,
+            'checkpoint': checkpoint,
+            'cycleHoursUsed': min(round(final_cycle), 70),
+            'cycleHoursActual': round(final_cycle, 1),
+            'totalMiles': round(remaining_miles),
+            'totalDays': totals['days'],
+            'totalDrivingHours': round(totals['driving'] / MINUTES_PER_HOUR, 1),
+            'totalOnDutyHours': round(totals['onDuty'] / MINUTES_PER_HOUR, 1),
+            'restarts': self.restarts,
+            'route': route_summary(route, len(passed) + 1),
+        }
+        
+        if cycle_warning:
+            summary['warning'] = cycle_warning
+        
+        yield 'summary', summary
+    
+    def _iter_totalled(
+        self,
+        days: Iterator[Dict],
+        totals: Dict[str, int]
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ('day', day) items, adding each day's minutes into `totals`."""
+        for day in days:
+            totals['days'] += 1
+            for activity in self.activities_by_day.get(day['day'], ()):
+                if activity.type in totals:
+                    totals[activity.type] += activity.end - activity.start
+            yield 'day', day
+    
+    def _cycle_warning(self, final_cycle: float) -> Optional[Dict[str, Any]]:
+        """Warning entry when a plan ends beyond the 70-hour cycle."""
+        if final_cycle <= MAX_CYCLE_HOURS:
+            return None
+        excess = round(final_cycle - MAX_CYCLE_HOURS, 1)
+        return {
+            'type': 'cycle_exceeded',
+            'message': f'This trip ends {excess} hours over the 70-hour cycle limit. Take a 34-hour restart before driving again.',
+            'excessHours': excess,
+            'recommendation': '34-hour restart required'
+        }
     
-    def _build_schedule(
+    def _iter_schedule(
         self,
         current_loc: Dict,
-        pickup_loc: Dict,
-        dropoff_loc: Dict,
+        itinerary: List[Tuple[str, Dict, float]],
         route: Dict
-    ) -> List[Dict]:
-        """Build day-by-day schedule with stops."""
-        days = []
-        stops = []
+    ) -> Iterator[Dict]:
+        """Schedule the trip and group its stops into days, yielding each day."""
+        return self._iter_days(self._iter_stops(current_loc, itinerary, route))
+    
+    def _iter_days(self, stops: Iterator[Stop]) -> Iterator[Dict]:
+        """
+        Group scheduled stops into days, starting from the current day.
+        
+        A day is complete once the clock has moved past it: no later stop
+        or activity can land on it, so it is grouped and yielded right away.
+        """
+        stops_by_day = {}
+        base_date = self.start_date or date.today()
+        next_day = self.current_day
+        
+        timings = self.timings
+        
+        def completed_days(through_day: int) -> Iterator[Dict]:
+            nonlocal next_day
+            while next_day <= through_day:
+                if timings is not None:
+                    started = perf_counter()
+                day = self._build_day(
+                    next_day,
+                    stops_by_day.pop(next_day, []),
+                    self.activities_by_day.get(next_day, []),
+                    base_date
+                )
+                if timings is not None:
+                    timings['grouping'] += perf_counter() - started
+                yield day
+                next_day += 1
         
+        for stop in stops:
+            stops_by_day.setdefault(stop.day, []).append(stop)
+            yield from completed_days(self.current_day - 1)
+        
+        yield from completed_days(max(self.current_day, max(self.activities_by_day)))
+    
+    def _iter_stops(
+        self,
+        current_loc: Dict,
+        itinerary: List[Tuple[str, Dict, float]],
+        route: Dict
+    ) -> Iterator[Stop]:
+        """
+        Schedule the whole trip, yielding every stop in order.
+        
+        A single pass over the itinerary: drive each leg, then spend the
+        stop's on-duty time. Each stop is yielded before its own on-duty
+        or rest time is recorded, so the clock still reads the stop's
+        start when the caller sees it.
+        """
         # Record off-duty time before start (00:00 to 06:00)
-        if self.current_time > 0:
-            self.activities.append({
-                'day': self.current_day,
-                'start': 0,
-                'end': self.current_time,
-                'type': 'offDuty'
-            })
+        if self._time > 0:
+            self._append_activity(self.current_day, 0, self._time, 'offDuty')
         
         # Start
-        stops.append(self._create_stop('start', current_loc, self.current_time, 0))
-        
-        # Drive to pickup
-        leg1 = route['legs'][0]
-        stops.extend(self._schedule_driving(
-            leg1['distance'],
-            current_loc,
-            pickup_loc
-        ))
-        
-        # Pickup (1 hour on-duty)
-        stops.append(self._create_stop('pickup', pickup_loc, self.current_time, PICKUP_DURATION))
-        self._add_on_duty(PICKUP_DURATION)
-        
-        # Drive to dropoff
-        leg2 = route['legs'][1]
-        stops.extend(self._schedule_driving(
-            leg2['distance'],
-            pickup_loc,
-            dropoff_loc
-        ))
-        
-        # Dropoff (1 hour on-duty)
-        stops.append(self._create_stop('dropoff', dropoff_loc, self.current_time, DROPOFF_DURATION))
-        self._add_on_duty(DROPOFF_DURATION)
-        
-        # End - record off-duty for rest of day
-        stops.append(self._create_stop('end', dropoff_loc, self.current_time, 0))
-        if self.current_time < 24:
-            self.activities.append({
-                'day': self.current_day,
-                'start': self.current_time,
-                'end': 24,
-                'type': 'offDuty'
-            })
-        
-        # Group stops by day, using activities for log generation
-        days = self._group_stops_by_day(stops, self.activities)
-        
-        return days
-    
-    def _schedule_driving(
+        yield self._create_stop('start', current_loc, self._time, 0)
+        
+        yield from self._iter_itinerary(current_loc, itinerary, route['legs'])
+        yield from self._iter_end(itinerary[-1][1])
+    
+    def _iter_itinerary(
+        self,
+        from_loc: Dict,
+        itinerary: List[Tuple[str, Dict, float]],
+        legs: List[Dict]
+    ) -> Iterator[Stop]:
+        """Drive each leg, then spend the stop's on-duty time, in one pass."""
+        for (stop_type, location, duration), leg in zip(itinerary, legs):
+            yield from self._iter_driving(leg['distance'], from_loc, location)
+            
+            # Pickup or drop (on-duty, 1 hour unless the stop says otherwise)
+            yield from self._iter_cycle_check(to_minutes(duration), location)
+            yield self._create_stop(stop_type, location, self._time, duration)
+            self._add_on_duty(to_minutes(duration))
+            from_loc = location
+    
+    def _iter_end(self, location: Dict) -> Iterator[Stop]:
+        """End of the trip: off-duty for the rest of the day."""
+        yield self._create_stop('end', location, self._time, 0)
+        self._append_activity(self.current_day, self._time, MINUTES_PER_DAY, 'offDuty')
+    
+    def _iter_driving(
         self,
         distance: float,
         from_loc: Dict,
         to_loc: Dict
-    ) -> List[Dict]:
-        """Schedule a driving segment with required breaks and rests."""
-        stops = []
+    ) -> Iterator[Stop]:
+        """
+        Schedule a driving segment, yielding each stop as it is scheduled.
+        
+        Each pass drives straight to the next binding boundary: the
+        11h/14h/8h limits, the minutes left in the 70-hour window, the next
+        fuel multiple or the end of the leg. Reaching the 8-hour limit
+        brings a rest, like the 11 and 14-hour ones.
+        
+        With truck stops configured, a stretch that ends at a limit looks
+        for one the driver can still reach: the rest or restart moves there
+        if the drive off the route fits before the limit. Fuel stops move
+        when the detour there and back fits. Detours are recorded as
+        driving, there and back, and add to the mileage.
+        """
+        # The leg takes a whole number of minutes; segments short of its end
+        # cover AVG_SPEED_MPH per hour and the last one the miles left
+        minutes_left = driving_minutes(distance)
         remaining_distance = distance
-        
-        while remaining_distance > 0:
-            # Check if we can drive
-            available_driving = min(
-                MAX_DRIVING_HOURS - self.current_day_driving,
-                MAX_DUTY_WINDOW - self.current_day_duty,
-                BREAK_REQUIRED_AFTER - self.driving_since_break
+        reserve_minutes = driving_minutes(detour_budget())
+        
+        while minutes_left > 0:
+            minutes_to_limit = min(
+                MAX_DRIVING_MINUTES - self._day_driving,
+                MAX_DUTY_MINUTES - self._day_duty,
+                BREAK_REQUIRED_MINUTES - self._since_break,
+                MAX_CYCLE_MINUTES - self._cycle
             )
             
-            # Need rest?
-            if available_driving <= 0:
-                # 10-hour rest
-                rest_loc = self._interpolate_location(
-                    from_loc, to_loc, 
-                    1 - (remaining_distance / distance) if distance > 0 else 0
-                )
-                stops.append(self._create_stop('rest', rest_loc, self.current_time, OFF_DUTY_RESET))
-                self._add_rest()
+            # Cycle used up: 34-hour restart
+            if self._cycle >= MAX_CYCLE_MINUTES:
+                restart_loc = self._interpolate_location(from_loc, to_loc, 1 - (remaining_distance / distance))
+                yield self._create_stop('restart', restart_loc, self._time, RESTART_DURATION)
+                self._add_restart()
                 continue
             
-            # Need break?
-            if self.driving_since_break >= BREAK_REQUIRED_AFTER:
-                break_loc = self._interpolate_location(
-                    from_loc, to_loc,
-                    1 - (remaining_distance / distance) if distance > 0 else 0
-                )
-                stops.append(self._create_stop('break', break_loc, self.current_time, BREAK_DURATION))
-                self._add_break()
+            # Limit reached: 10-hour rest
+            if minutes_to_limit <= 0:
+                rest_loc = self._interpolate_location(from_loc, to_loc, 1 - (remaining_distance / distance))
+                yield self._create_stop('rest', rest_loc, self._time, OFF_DUTY_RESET)
+                self._add_rest()
                 continue
             
-            # Calculate drive segment
-            max_drive_time = min(available_driving, remaining_distance / AVG_SPEED_MPH)
-            drive_distance = max_drive_time * AVG_SPEED_MPH
+            # Drive to whichever comes first: the limit or the end of the leg
+            drive_minutes = min(minutes_to_limit, minutes_left)
+            drive_distance = (
+                remaining_distance if drive_minutes == minutes_left
+                else drive_minutes * AVG_SPEED_MPH / MINUTES_PER_HOUR
+            )
             
-            # Check for fuel stop
-            if self.current_mileage + drive_distance > (
-                (self.current_mileage // FUEL_INTERVAL_MILES + 1) * FUEL_INTERVAL_MILES
-            ):
-                miles_to_fuel = (
-                    (self.current_mileage // FUEL_INTERVAL_MILES + 1) * FUEL_INTERVAL_MILES
-                ) - self.current_mileage
+            # ...unless the next fuel multiple falls inside that stretch
+            next_fuel = (self.current_mileage // FUEL_INTERVAL_MILES + 1) * FUEL_INTERVAL_MILES
+            miles_to_fuel = next_fuel - self.current_mileage
+            if (self.current_mileage + drive_distance > next_fuel
+                    and 0 < miles_to_fuel < drive_distance):
+                fuel_minutes = min(driving_minutes(miles_to_fuel), drive_minutes)
+                fuel_loc = self._interpolate_location(
+                    from_loc, to_loc, 1 - ((remaining_distance - miles_to_fuel) / distance)
+                )
+                self._add_driving(fuel_minutes, miles_to_fuel)
+                minutes_left -= fuel_minutes
+                remaining_distance -= miles_to_fuel
                 
-                if miles_to_fuel < drive_distance and miles_to_fuel > 0:
-                    # Drive to fuel stop first
-                    fuel_time = miles_to_fuel / AVG_SPEED_MPH
-                    fuel_loc = self._interpolate_location(
-                        from_loc, to_loc,
-                        1 - ((remaining_distance - miles_to_fuel) / distance) if distance > 0 else 0
-                    )
-                    
-                    # Add driving segment to fuel
-                    self._add_driving(fuel_time, miles_to_fuel)
-                    remaining_distance -= miles_to_fuel
-                    
-                    # Fuel stop
-                    stops.append(self._create_stop('fuel', fuel_loc, self.current_time, 0.5))
-                    self._add_on_duty(0.5)
+                # Off the route and back, both before the next limit
+                detour = None
+                if reserve_minutes:
+                    allowance = min(
+                        MAX_DRIVING_MINUTES - self._day_driving,
+                        MAX_DUTY_MINUTES - self._day_duty - FUEL_STOP_MINUTES,
+                        BREAK_REQUIRED_MINUTES - self._since_break,
+                        MAX_CYCLE_MINUTES - self._cycle - FUEL_STOP_MINUTES
+                    ) // 2
+                    detour = find_truck_stop('fuel', fuel_loc, allowance * AVG_SPEED_MPH / MINUTES_PER_HOUR)
+                if detour:
+                    fuel_loc, detour_miles = detour
+                    self._add_driving(driving_minutes(detour_miles), detour_miles)
+                yield from self._iter_cycle_check(FUEL_STOP_MINUTES, fuel_loc)
+                yield self._create_stop('fuel', fuel_loc, self._time, FUEL_STOP_DURATION)
+                self._add_on_duty(FUEL_STOP_MINUTES)
+                if detour:
+                    self._add_driving(driving_minutes(detour_miles), detour_miles)
+                continue
+            
+            # ...or the stretch ends at a limit and a truck stop is within
+            # reach of its last reserve_minutes
+            if reserve_minutes and drive_minutes == minutes_to_limit < minutes_left:
+                stop = yield from self._iter_truck_stop(
+                    from_loc, to_loc, distance, remaining_distance, drive_minutes,
+                    min(reserve_minutes, drive_minutes), next_fuel
+                )
+                if stop is not None:
+                    minutes_left -= stop[0]
+                    remaining_distance -= stop[1]
                     continue
             
-            # Normal driving segment
-            self._add_driving(max_drive_time, drive_distance)
+            self._add_driving(drive_minutes, drive_distance)
+            minutes_left -= drive_minutes
             remaining_distance -= drive_distance
         
-        return stops
+        # Under half a minute of driving left (a short hop or the tail
+        # after a fuel stop): the miles count, the clock does not move
+        if remaining_distance > 0:
+            self.current_mileage += remaining_distance
+    
+    def _iter_truck_stop(
+        self,
+        from_loc: Dict,
+        to_loc: Dict,
+        distance: float,
+        remaining_distance: float,
+        drive_minutes: int,
+        reserve_minutes: int,
+        next_fuel: float
+    ) -> Generator[Stop, None, Optional[Tuple[int, float]]]:
+        """
+        Rest or restart at a truck stop before the limit `drive_minutes`
+        away: drive on along the route to reserve_minutes short of the
+        limit, off the route to the nearest suitable stop reachable in
+        those minutes, take the stop and drive back. Returns the route
+        minutes and miles covered, or None when no stop is in reach (the
+        stop then stays on the route, at the limit).
+        """
+        stop_type = 'restart' if drive_minutes == MAX_CYCLE_MINUTES - self._cycle else 'rest'
+        approach_minutes = drive_minutes - reserve_minutes
+        approach_miles = approach_minutes * AVG_SPEED_MPH / MINUTES_PER_HOUR
+        point = self._interpolate_location(
+            from_loc, to_loc, 1 - ((remaining_distance - approach_miles) / distance)
+        )
+        found = find_truck_stop(stop_type, point, reserve_minutes * AVG_SPEED_MPH / MINUTES_PER_HOUR)
+        if found is None:
+            return None
+        location, detour_miles = found
+        detour_minutes = driving_minutes(detour_miles)
+        
+        # The way back follows a rest, so it needs room in the cycle, and
+        # neither way may carry the mileage past the next fuel stop
+        if (detour_minutes > reserve_minutes
+                or self.current_mileage + approach_miles + 2 * detour_miles >= next_fuel
+                or (stop_type == 'rest'
+                    and self._cycle + approach_minutes + 2 * detour_minutes > MAX_CYCLE_MINUTES)):
+            return None
+        
+        self._add_driving(approach_minutes, approach_miles)
+        self._add_driving(detour_minutes, detour_miles)
+        if stop_type == 'restart':
+            yield self._create_stop('restart', location, self._time, RESTART_DURATION)
+            self._add_restart()
+        else:
+            yield self._create_stop('rest', location, self._time, OFF_DUTY_RESET)
+            self._add_rest()
+        self._add_driving(detour_minutes, detour_miles)
+        return approach_minutes, approach_miles
+    
+    def _iter_cycle_check(self, minutes: int, location: Dict) -> Iterator[Stop]:
+        """
+        34-hour restart at `location` when `minutes` of on-duty time would
+        run past the 70-hour cycle. The driving loop checks the cycle
+        itself; this covers pickups, drop-offs and fuel stops.
+        """
+        if self._cycle + minutes > MAX_CYCLE_MINUTES:
+            yield self._create_stop('restart', location, self._time, RESTART_DURATION)
+            self._add_restart()
     
     def _interpolate_location(
         self,
@@ -255,146 +862,103 @@ class HOSEngine:
         self,
         stop_type: str,
         location: Dict,
-        time: float,
+        minute: int,
         duration: float
-    ) -> Dict:
+    ) -> Stop:
         """Create a stop entry."""
-        return {
-            'type': stop_type,
-            'location': location['label'],
-            'time': self._format_time(time),
-            'duration': duration,
-            'lat': location['lat'],
-            'lng': location['lng'],
-            'mileage': round(self.current_mileage),
-            'day': self.current_day,
-        }
+        return Stop(stop_type, location, minute, duration, self.current_mileage, self.current_day)
     
     def _format_time(self, hours: float) -> str:
         """Format time as HH:MM."""
-        h = int(hours) % 24
-        m = int((hours % 1) * 60)
-        return f"{h:02d}:{m:02d}"
+        return format_time(hours)
     
-    def _record_activity(self, activity_type: str, duration: float):
-        """Record an activity, handling day crossings."""
-        start_day = self.current_day
-        start_time = self.current_time
-        
+    def _append_activity(self, day: int, start: int, end: int, activity_type: str):
+        """Store an activity in the flat list and its day bucket."""
+        activity = Activity(day, start, end, activity_type)
+        self.activities.append(activity)
+        
+        # The clock only moves forward, so appending keeps buckets sorted
+        bucket = self.activities_by_day.get(day)
+        if bucket is None:
+            bucket = self.activities_by_day[day] = []
+        bucket.append(activity)
+    
+    def _record_activity(self, activity_type: str, duration: int):
+        """Record an activity of `duration` minutes, handling day crossings."""
+        current_day = self.current_day
+        current_time = self._time
         remaining = duration
-        current_day = start_day
-        current_time = start_time
         
         while remaining > 0:
-            time_until_midnight = 24 - current_time
-            segment_duration = min(remaining, time_until_midnight)
-            
-            end_time = current_time + segment_duration
-            self.activities.append({
-                'day': current_day,
-                'start': current_time,
-                'end': end_time if end_time < 24 else 24,
-                'type': activity_type
-            })
+            end_time = min(current_time + remaining, MINUTES_PER_DAY)
+            self._append_activity(current_day, current_time, end_time, activity_type)
             
-            remaining -= segment_duration
-            if remaining > 0:
-                current_day += 1
-                current_time = 0
-            else:
-                current_time = end_time
+            remaining -= end_time - current_time
+            current_day += 1
+            current_time = 0
     
-    def _add_driving(self, hours: float, miles: float):
+    def _add_driving(self, minutes: int, miles: float):
         """Record driving time."""
-        self._record_activity('driving', hours)
+        self._record_activity('driving', minutes)
+        self._add_cycle_minutes(minutes)
         
-        self.current_day_driving += hours
-        self.current_day_duty += hours
-        self.driving_since_break += hours
-        self.current_time += hours
+        self._day_driving += minutes
+        self._day_duty += minutes
+        self._since_break += minutes
         self.current_mileage += miles
-        self.cycle_hours_used += hours
-        
-        # Check for day rollover
-        while self.current_time >= 24:
-            self.current_time -= 24
-            self.current_day += 1
+        self._advance_clock(minutes)
     
-    def _add_on_duty(self, hours: float):
+    def _add_on_duty(self, minutes: int):
         """Record on-duty (not driving) time."""
-        self._record_activity('onDuty', hours)
-        
-        self.current_day_duty += hours
-        self.current_time += hours
-        self.cycle_hours_used += hours
-        
-        while self.current_time >= 24:
-            self.current_time -= 24
-            self.current_day += 1
-    
-    def _add_break(self):
-        """Process 30-minute break."""
-        self._record_activity('onDuty', BREAK_DURATION)
-        
-        self.current_time += BREAK_DURATION
-        self.driving_since_break = 0
+        self._record_activity('onDuty', minutes)
+        self._add_cycle_minutes(minutes)
         
-        while self.current_time >= 24:
-            self.current_time -= 24
-            self.current_day += 1
+        self._day_duty += minutes
+        self._advance_clock(minutes)
     
     def _add_rest(self):
         """Process 10-hour rest period."""
-        self._record_activity('sleeperBerth', OFF_DUTY_RESET)
+        self._record_activity('sleeperBerth', OFF_DUTY_RESET_MINUTES)
         
-        self.current_time += OFF_DUTY_RESET
-        self.current_day_driving = 0
-        self.current_day_duty = 0
-        self.driving_since_break = 0
-        
-        while self.current_time >= 24:
-            self.current_time -= 24
-            self.current_day += 1
+        self._day_driving = 0
+        self._day_duty = 0
+        self._since_break = 0
+        self._advance_clock(OFF_DUTY_RESET_MINUTES)
     
-    def _group_stops_by_day(self, stops: List[Dict], activities: List[Dict]) -> List[Dict]:
-        """Group stops by day and generate log data from activities."""
-        from datetime import date, timedelta
-        
-        # Group stops by day
-        days_dict = {}
-        base_date = date.today()
-        
-        for stop in stops:
-            day_num = stop['day']
-            if day_num not in days_dict:
-                days_dict[day_num] = {
-                    'day': day_num,
-                    'date': (base_date + timedelta(days=day_num - 1)).isoformat(),
-                    'stops': [],
-                }
-            days_dict[day_num]['stops'].append(stop)
-        
-        # Create day entries for any days that only have activities (no stops)
-        for activity in activities:
-            day_num = activity['day']
-            if day_num not in days_dict:
-                days_dict[day_num] = {
-                    'day': day_num,
-                    'date': (base_date + timedelta(days=day_num - 1)).isoformat(),
-                    'stops': [],
-                }
-        
-        # Generate log data for each day from activities
-        days = []
-        for day_num in sorted(days_dict.keys()):
-            day_data = days_dict[day_num]
-            day_data['log'] = self._generate_day_log_from_activities(day_num, activities)
-            days.append(day_data)
-        
-        return days
+    def _add_restart(self):
+        """Process a 34-hour restart: every limit, the cycle included, resets."""
+        self._record_activity('offDuty', RESTART_MINUTES)
+        
+        self._day_driving = 0
+        self._day_duty = 0
+        self._since_break = 0
+        self._advance_clock(RESTART_MINUTES)
+        self.cycle_window = [0] * CYCLE_DAYS
+        self._cycle = 0
+        self.restarts += 1
+    
+    def _build_day(
+        self,
+        day_num: int,
+        stops: List[Stop],
+        day_activities: List[Activity],
+        base_date: date
+    ) -> Dict:
+        """Build one day's entry: date, stops and log from its own activities."""
+        return {
+            'day': day_num,
+            'date': (base_date + timedelta(days=day_num - 1)).isoformat(),
+            'stops': [stop.to_dict() for stop in stops],
+            'log': self._generate_day_log_from_activities(day_num, day_activities),
+        }
     
-    def _generate_day_log_from_activities(self, day_num: int, activities: List[Dict]) -> Dict:
-        """Generate 24-hour log data from explicit activities."""
+    def _generate_day_log_from_activities(self, day_num: int, day_activities: List[Activity]) -> Dict:
+        """
+        Generate 24-hour log data from one day's activities.
+        
+        Expects the day's bucket from activities_by_day, already in
+        start-time order.
+        """
         log = {
             'offDuty': [],
             'sleeperBerth': [],
@@ -403,77 +967,42 @@ class HOSEngine:
             'totals': {'offDuty': 0, 'sleeperBerth': 0, 'driving': 0, 'onDuty': 0}
         }
         
-        # Filter activities for this day and sort by start time
-        day_activities = [a for a in activities if a['day'] == day_num]
-        day_activities.sort(key=lambda x: x['start'])
-        
         if not day_activities:
             # No activities this day - all off-duty
             log['offDuty'].append({'start': 0, 'end': 24})
             log['totals']['offDuty'] = 24
             return log
         
-        # Merge adjacent activities of the same type
+        # Merge adjacent activities of the same type into [type, start, end]
         merged = []
         for activity in day_activities:
-            if merged and merged[-1]['type'] == activity['type'] and abs(merged[-1]['end'] - activity['start']) < 0.01:
-                merged[-1]['end'] = activity['end']
+            if merged and merged[-1][0] == activity.type and merged[-1][2] == activity.start:
+                merged[-1][2] = activity.end
             else:
-                merged.append(dict(activity))
-        
-        # Add activities to log
-        for activity in merged:
-            start = round(activity['start'], 2)
-            end = round(activity['end'], 2)
-            duration = end - start
-            
-            if duration <= 0:
-                continue
-            
-            if activity['type'] == 'offDuty':
-                log['offDuty'].append({'start': start, 'end': end})
-                log['totals']['offDuty'] += duration
-            elif activity['type'] == 'sleeperBerth':
-                log['sleeperBerth'].append({'start': start, 'end': end})
-                log['totals']['sleeperBerth'] += duration
-            elif activity['type'] == 'driving':
-                log['driving'].append({'start': start, 'end': end})
-                log['totals']['driving'] += duration
-            elif activity['type'] == 'onDuty':
-                log['onDuty'].append({'start': start, 'end': end})
-                log['totals']['onDuty'] += duration
-        
-        # Check if we need to fill gaps (should be rare with explicit tracking)
-        total = sum(log['totals'].values())
-        if abs(total - 24) > 0.1:
-            # Find gaps and fill with off-duty
-            covered = [(a['start'], a['end']) for a in merged]
-            covered.sort()
-            
-            current = 0
-            for start, end in covered:
-                if start > current + 0.01:
-                    gap = start - current
-                    log['offDuty'].append({'start': round(current, 2), 'end': round(start, 2)})
-                    log['totals']['offDuty'] += gap
-                current = max(current, end)
-            
-            if current < 23.99:
-                gap = 24 - current
-                log['offDuty'].append({'start': round(current, 2), 'end': 24})
-                log['totals']['offDuty'] += gap
+                merged.append([activity.type, activity.start, activity.end])
         
-        # Round totals
-        for key in log['totals']:
-            log['totals'][key] = round(log['totals'][key], 1)
+        # Activities tile the day from 00:00 to 24:00, so the minute totals
+        # add up to 1440 exactly and no gap needs filling
+        minutes = dict.fromkeys(log['totals'], 0)
+        for activity_type, start, end in merged:
+            log[activity_type].append({'start': _log_hours(start), 'end': _log_hours(end)})
+            minutes[activity_type] += end - start
         
+        log['totals'] = {key: round(value / MINUTES_PER_HOUR, 1) for key, value in minutes.items()}
         return log
 
 
-def calculate_trip(data: Dict[str, Any]) -> Dict[str, Any]:
+def calculate_trip(
+    data: Dict[str, Any],
+    timings: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
     """
     Main entry point for trip calculation.
     """
-    engine = HOSEngine(data['cycle_hours_used'])
+    engine = HOSEngine(
+        data['cycle_hours_used'],
+        timings=timings,
+        cycle_history=data.get('cycle_history')
+    )
     return engine.calculate_trip(data)
 
@@ -0,0 +1,254 @@
+"""
+Operational metrics: latency and engine histograms, plan-size
+distributions and error counts.
+
+Recording is in-process and cheap: a bisect to find the bucket and a few
+integer updates under a lock. Each process also publishes its cumulative
+snapshot to the METRICS_CACHE_ALIAS cache at most every
+METRICS_PUBLISH_INTERVAL seconds, under a per-process key listed in a
+shared index. collect() sums every published snapshot, so with a shared
+backend (e.g. Redis) GET /api/metrics reports all web and batch-pool
+workers; with the default LocMemCache it only sees its own process. A
+process that stops publishing drops out after METRICS_WORKER_TTL seconds.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Histogram name -> upper bucket bounds (one more bucket counts the rest)
+HISTOGRAMS = {
+    # Seconds from the start of a /api/plan-trip request to its rendered body
+    'planTripLatency': LATENCY_BUCKETS,
+    # Seconds the engine spent on a plan or replan, routing included
+    'engineTime': LATENCY_BUCKETS,
+    'planStops': (2, 5, 10, 20, 50, 100, 200, 500),
+    'planDays': (1, 2, 3, 5, 7, 10, 14, 21, 30, 60),
+    'planActivities': (10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+INDEX_KEY = 'metrics:workers'
+
+
+class Histogram:
+    """Counts per bucket, plus the total count and sum of observations."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+
+_lock = threading.Lock()
+_histograms = {name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()}
+# Counter name -> {label: count}
+_counters: Dict[str, Dict[str, int]] = {}
+
+_worker_pid = None
+_worker_key = None
+_published_at = 0.0
+
+
+def _cache():
+    return caches[settings.METRICS_CACHE_ALIAS]
+
+
+def _worker() -> str:
+    """This process's snapshot key; a forked child gets its own."""
+    global _worker_pid, _worker_key
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_key = f"metrics:worker:{uuid.uuid4().hex}"
+    return _worker_key
+
+
+def observe(name: str, value: float):
+    """Record one observation into histogram `name`."""
+    if not settings.METRICS_ENABLED:
+        return
+    histogram = _histograms[name]
+    with _lock:
+        histogram.observe(value)
+    _maybe_publish()
+
+
+def increment(name: str, label: str, amount: int = 1):
+    """Add `amount` to counter `name` under `label`."""
+    if not settings.METRICS_ENABLED:
+        return
+    with _lock:
+        counter = _counters.setdefault(name, {})
+        counter[label] = counter.get(label, 0) + amount
+    _maybe_publish()
+
+
+def record_error(endpoint: str, error: BaseException):
+    """Count an exception by endpoint and type."""
+    increment('errors', f"{endpoint}:{type(error).__name__}")
+
+
+def observe_plan(seconds: float, days: int, stops: int, activities: int):
+    """Record one engine run and the size of the plan it produced."""
+    if not settings.METRICS_ENABLED:
+        return
+    with _lock:
+        _histograms['engineTime'].observe(seconds)
+        _histograms['planDays'].observe(days)
+        _histograms['planStops'].observe(stops)
+        _histograms['planActivities'].observe(activities)
+    _maybe_publish()
+
+
+def snapshot() -> Dict[str, Any]:
+    """This process's raw histograms and counters."""
+    with _lock:
+        return {
+            'histograms': {name: histogram.to_dict() for name, histogram in _histograms.items()},
+            'counters': {name: dict(counter) for name, counter in _counters.items()},
+        }
+
+
+def _maybe_publish():
+    global _published_at
+    now = time.monotonic()
+    if now - _published_at < settings.METRICS_PUBLISH_INTERVAL:
+        return
+    _published_at = now
+    publish()
+
+
+def publish():
+    """Write this process's snapshot to the shared cache."""
+    key = _worker()
+    try:
+        cache = _cache()
+        cache.set(key, snapshot(), settings.METRICS_WORKER_TTL)
+        # The index is read-modify-write: a concurrent update can drop a
+        # key, which its worker puts back on its next publish
+        workers = cache.get(INDEX_KEY) or []
+        if key not in workers:
+            cache.set(INDEX_KEY, workers + [key], None)
+    except Exception:
+        # Metrics must never fail a request
+        logger.warning('Could not publish metrics', exc_info=True)
+
+
+def _quantile(bounds: Sequence[float], counts: List[int], count: int, q: float) -> Optional[float]:
+    """Estimate a quantile by linear interpolation within its bucket."""
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    for index, bucket_count in enumerate(counts):
+        if seen + bucket_count >= rank and bucket_count:
+            if index == len(bounds):
+                # Beyond the last bound: all that is known is the bound
+                return bounds[-1]
+            lower = bounds[index - 1] if index else 0
+            return lower + (bounds[index] - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return bounds[-1]
+
+
+def _summarize(name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    bounds = HISTOGRAMS[name]
+    counts = data['counts']
+    count = data['count']
+    summary = {
+        'buckets': {**{str(bound): n for bound, n in zip(bounds, counts)}, '+Inf': counts[-1]},
+        'count': count,
+        'sum': round(data['sum'], 6),
+        'mean': round(data['sum'] / count, 6) if count else None,
+    }
+    for q in QUANTILES:
+        value = _quantile(bounds, counts, count, q)
+        summary[f"p{round(q * 100)}"] = None if value is None else round(value, 6)
+    return summary
+
+
+def _merge(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    histograms = {
+        name: {'counts': [0] * (len(bounds) + 1), 'count': 0, 'sum': 0.0}
+        for name, bounds in HISTOGRAMS.items()
+    }
+    counters: Dict[str, Dict[str, int]] = {}
+    for worker in snapshots:
+        for name, data in worker['histograms'].items():
+            merged = histograms.get(name)
+            # Skip histograms whose buckets changed since the worker started
+            if merged is None or len(data['counts']) != len(merged['counts']):
+                continue
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], data['counts'])]
+            merged['count'] += data['count']
+            merged['sum'] += data['sum']
+        for name, counter in worker['counters'].items():
+            merged_counter = counters.setdefault(name, {})
+            for label, count in counter.items():
+                merged_counter[label] = merged_counter.get(label, 0) + count
+    return {
+        'histograms': {name: _summarize(name, data) for name, data in histograms.items()},
+        'counters': counters,
+    }
+
+
+def collect(all_workers: bool = True) -> Dict[str, Any]:
+    """
+    Summed metrics of every worker that has published recently, or of
+    this process only. Histograms come with bucket counts, mean and
+    estimated p50/p90/p99.
+    """
+    if not all_workers:
+        return {'workers': 1, **_merge([snapshot()])}
+
+    publish()
+    try:
+        cache = _cache()
+        workers = cache.get(INDEX_KEY) or []
+        published = cache.get_many(workers)
+        if len(published) < len(workers):
+            # Drop workers whose snapshots have expired
+            cache.set(INDEX_KEY, [key for key in workers if key in published], None)
+    except Exception:
+        logger.warning('Could not read published metrics', exc_info=True)
+        published = {_worker(): snapshot()}
+    snapshots = list(published.values()) or [snapshot()]
+    return {'workers': len(snapshots), **_merge(snapshots)}
+
+
+def reset():
+    """Zero this process's metrics and forget what it published."""
+    global _published_at
+    with _lock:
+        for name, bounds in HISTOGRAMS.items():
+            _histograms[name] = Histogram(bounds)
+        _counters.clear()
+    _published_at = 0.0
+    try:
+        _cache().delete_many([INDEX_KEY, _worker()])
+    except Exception:
+        pass
@@ -0,0 +1,278 @@
+"""
+Whole-plan result cache.
+
+Sits in front of hos_engine.calculate_trip and stores finished plans in a
+Django cache backend (settings.PLAN_CACHE_ALIAS). The default LocMemCache
+alias is bounded by MAX_ENTRIES, evicts least-recently-used entries and
+expires them after TIMEOUT seconds; pointing the alias at a shared backend
+such as Redis lets every worker reuse the same plans.
+
+Misses are coalesced (PLAN_COALESCE_ENABLED): concurrent requests for the
+same plan wait for one computation instead of each running the engine.
+Within a process they share one in-flight call (services.single_flight);
+across workers the first one takes a lock key in the cache with add(),
+and the others poll for its plan. A waiter gives up after
+PLAN_COALESCE_TIMEOUT seconds and computes the plan itself, and the lock
+expires after PLAN_COALESCE_LOCK_TTL seconds so a crashed worker cannot
+hold it.
+
+Keys combine the payload's hash with plan_config() (engine version,
+routing and truck-stop configuration), so a shared cache does not serve
+plans made under a previous deploy's rules or data.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Any, List
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .hos_engine import ENGINE_VERSION, calculate_trip
+from .single_flight import AsyncFlightGroup, FlightGroup
+from .truck_stops import get_truck_stop_index
+
+
+_stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+_stats_lock = threading.Lock()
+
+_flights = FlightGroup()
+_async_flights = AsyncFlightGroup()
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _cache():
+    return caches[settings.PLAN_CACHE_ALIAS]
+
+
+def plan_hash(data: Dict[str, Any]) -> str:
+    """
+    Hash the canonical form of a validated plan-trip payload.
+
+    Coordinates are rounded to PLAN_CACHE_PRECISION decimal places, so
+    requests for the same lane share a plan. Labels are part of the key
+    because they are echoed into the plan name and stops; intermediate
+    stops, on-duty durations and the cycle recap because they change the
+    schedule.
+    """
+    precision = settings.PLAN_CACHE_PRECISION
+    
+    def canonical_location(location):
+        return [
+            location['label'].strip(),
+            round(location['lat'], precision),
+            round(location['lng'], precision),
+            location.get('type'),
+            location.get('duration'),
+        ]
+    
+    canonical = [data['cycle_hours_used']]
+    for field in ('current_location', 'pickup_location', 'dropoff_location'):
+        canonical.append(canonical_location(data[field]))
+    canonical.append([canonical_location(stop) for stop in data.get('stops') or ()])
+    canonical.append(data.get('cycle_history'))
+
+    return hashlib.sha1(
+        json.dumps(canonical, separators=(',', ':')).encode()
+    ).hexdigest()
+
+
+def plan_config() -> List[Any]:
+    """
+    What besides the payload shapes a plan: the engine version, the
+    routing backend (with its leg rounding and road graph) and the truck
+    stops. Part of the cache and store keys, so a deploy that changes any
+    of them stops older plans from being served.
+    """
+    config = [ENGINE_VERSION, settings.ROUTING_BACKEND]
+    if settings.LEG_CACHE_ENABLED:
+        config.append(settings.LEG_CACHE_PRECISION)
+    if settings.ROUTING_BACKEND == 'graph':
+        # Imported on first use, like in route_service: road_graph loads numpy
+        from .road_graph import get_road_graph
+        config += [get_road_graph().checksum, settings.ROAD_GRAPH_SNAP_MILES]
+    index = get_truck_stop_index()
+    if index is not None:
+        config += [index.checksum, settings.TRUCK_STOP_DETOUR_MILES]
+    return config
+
+
+def versioned_hash(data: Dict[str, Any]) -> str:
+    """plan_hash of a validated plan-trip payload, combined with plan_config()."""
+    return hashlib.sha1(f"{plan_hash(data)}:{plan_config()!r}".encode()).hexdigest()
+
+
+def make_key(data: Dict[str, Any]) -> str:
+    """Build the cache key for a validated plan-trip payload."""
+    return f"plan:{versioned_hash(data)}"
+
+
+def rebase_dates(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Recompute day dates relative to today for a plan served from cache."""
+    base_date = date.today()
+    for day in plan['days']:
+        day['date'] = (base_date + timedelta(days=day['day'] - 1)).isoformat()
+    return plan
+
+
+def _calculate_once(cache, key: str, data: Dict[str, Any], calculate) -> Dict[str, Any]:
+    """
+    Compute and cache the plan for `key`, unless another worker holding
+    the lock stores it first.
+    """
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + settings.PLAN_COALESCE_TIMEOUT
+    while True:
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, settings.PLAN_COALESCE_LOCK_TTL):
+            try:
+                plan = calculate(data)
+                cache.set(key, plan)
+                return plan
+            finally:
+                # Not atomic, but a lock that expired mid-computation and
+                # was taken over is only deleted early, never kept
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        while time.monotonic() < deadline:
+            time.sleep(settings.PLAN_COALESCE_POLL_INTERVAL)
+            found = cache.get_many([key, lock_key])
+            if key in found:
+                _count('coalesced')
+                return rebase_dates(found[key])
+            if lock_key not in found:
+                break  # Released without a plan: the leader failed
+        else:
+            plan = calculate(data)
+            cache.set(key, plan)
+            return plan
+
+
+def get_or_calculate(
+    data: Dict[str, Any],
+    calculate: Callable[[Dict[str, Any]], Dict[str, Any]] = calculate_trip
+) -> Dict[str, Any]:
+    """
+    Return the cached plan for `data`, computing and storing it on a miss.
+    Concurrent misses for the same plan are coalesced.
+    """
+    if not settings.PLAN_CACHE_ENABLED:
+        return calculate(data)
+
+    cache = _cache()
+    key = make_key(data)
+
+    plan = cache.get(key)
+    if plan is not None:
+        _count('hits')
+        return rebase_dates(plan)
+
+    _count('misses')
+    if not settings.PLAN_COALESCE_ENABLED:
+        plan = calculate(data)
+        cache.set(key, plan)
+        return plan
+
+    plan, shared = _flights.do(
+        key, lambda: _calculate_once(cache, key, data, calculate), settings.PLAN_COALESCE_TIMEOUT
+    )
+    if shared:
+        _count('coalesced')
+    return plan
+
+
+async def aget_or_calculate(
+    data: Dict[str, Any],
+    calculate: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Async form of get_or_calculate.
+
+    Cache I/O uses the backend's async API; `calculate` is awaited on a
+    miss and is expected to push the work off the event loop.
+    """
+    if not settings.PLAN_CACHE_ENABLED:
+        return await calculate(data)
+
+    cache = _cache()
+    key = make_key(data)
+
+    plan = await cache.aget(key)
+    if plan is not None:
+        _count('hits')
+        return rebase_dates(plan)
+
+    _count('misses')
+    if not settings.PLAN_COALESCE_ENABLED:
+        plan = await calculate(data)
+        await cache.aset(key, plan)
+        return plan
+
+    plan, shared = await _async_flights.do(
+        key, lambda: _acalculate_once(cache, key, data, calculate), settings.PLAN_COALESCE_TIMEOUT
+    )
+    if shared:
+        _count('coalesced')
+    return plan
+
+
+async def _acalculate_once(cache, key: str, data: Dict[str, Any], calculate) -> Dict[str, Any]:
+    """Async form of _calculate_once."""
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + settings.PLAN_COALESCE_TIMEOUT
+    while True:
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key, token, settings.PLAN_COALESCE_LOCK_TTL):
+            try:
+                plan = await calculate(data)
+                await cache.aset(key, plan)
+                return plan
+            finally:
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.PLAN_COALESCE_POLL_INTERVAL)
+            found = await cache.aget_many([key, lock_key])
+            if key in found:
+                _count('coalesced')
+                return rebase_dates(found[key])
+            if lock_key not in found:
+                break
+        else:
+            plan = await calculate(data)
+            await cache.aset(key, plan)
+            return plan
+
+
+def stats() -> Dict[str, Any]:
+    """Hit/miss counters for this process."""
+    with _stats_lock:
+        hits = _stats['hits']
+        misses = _stats['misses']
+        coalesced = _stats['coalesced']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hitRatio': round(hits / lookups, 4) if lookups else 0.0,
+        # Misses served by another request's computation
+        'coalesced': coalesced,
+    }
+
+
+def reset_stats():
+    """Zero the hit/miss counters."""
+    with _stats_lock:
+        for outcome in _stats:
+            _stats[outcome] = 0
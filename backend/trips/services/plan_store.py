@@ -0,0 +1,237 @@
+"""
+Persistent plan store.
+
+Backs the plan cache with the database (trips.models). Before a plan is
+computed it is looked up by the hash of its canonical input, so identical
+requests from different dispatchers or workers reuse it after a cache
+eviction or restart; every computed plan is saved, its days and stops with
+bulk inserts. The key also covers the engine version and the routing and
+truck-stop configuration, so plans made under older rules or data are not
+served. A database error (e.g. tables not migrated yet) is logged and the
+plan computed as if the store were off. The plan history is listed with keyset pagination over
+(created_at, id), so a deep page costs the same as the first one.
+"""
+
+import base64
+import logging
+import threading
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+
+from ..models import Plan, PlanDay, PlanStop
+from .hos_engine import calculate_trip
+from .plan_cache import rebase_dates, versioned_hash
+
+
+# Response keys of a scheduled stop, in response order
+STOP_FIELDS = ('type', 'location', 'time', 'duration', 'lat', 'lng', 'mileage', 'day')
+
+logger = logging.getLogger(__name__)
+
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def store_key(data: Dict[str, Any]) -> str:
+    """
+    Store key of a validated plan-trip payload: its plan_hash plus what
+    else shapes the plan (plan_cache.plan_config), as in the cache key.
+    """
+    return versioned_hash(data)
+
+
+def _fail_open(operation: Callable, *args):
+    """Run a store operation; on a database error log it and return None."""
+    try:
+        return operation(*args)
+    except DatabaseError:
+        _count('errors')
+        logger.warning('Plan store %s failed', operation.__name__, exc_info=True)
+        return None
+
+
+def find_plan(input_hash: str) -> Optional[Dict[str, Any]]:
+    """Rebuild the stored plan for `input_hash`, or None if there is none."""
+    row = Plan.objects.filter(input_hash=input_hash).values('id', 'summary').first()
+    if row is None:
+        return None
+
+    stops_by_day = {}
+    for stop in PlanStop.objects.filter(plan_id=row['id']).order_by('sequence').values(*STOP_FIELDS):
+        stops_by_day.setdefault(stop['day'], []).append(stop)
+
+    plan = row['summary']
+    plan['days'] = [
+        {'day': day, 'date': None, 'stops': stops_by_day.get(day, []), 'log': log}
+        for day, log in PlanDay.objects.filter(plan_id=row['id']).order_by('day').values_list('day', 'log')
+    ]
+    return rebase_dates(plan)
+
+
+def save_plan(input_hash: str, data: Dict[str, Any], plan: Dict[str, Any]) -> bool:
+    """
+    Store a computed plan. Returns False if a plan with the same hash was
+    stored first (e.g. by another worker); the stored one is kept.
+    """
+    # Keep the response's key order; days are stored as rows
+    summary = {key: (None if key == 'days' else value) for key, value in plan.items()}
+    try:
+        with transaction.atomic():
+            row = Plan.objects.create(
+                input_hash=input_hash,
+                inputs=data,
+                name=plan['name'],
+                total_miles=plan['totalMiles'],
+                total_days=plan['totalDays'],
+                total_driving_hours=plan['totalDrivingHours'],
+                total_on_duty_hours=plan['totalOnDutyHours'],
+                cycle_hours_actual=plan['cycleHoursActual'],
+                restarts=plan.get('restarts', 0),
+                summary=summary,
+            )
+            PlanDay.objects.bulk_create([
+                PlanDay(plan=row, day=day['day'], log=day['log'])
+                for day in plan['days']
+            ])
+            PlanStop.objects.bulk_create([
+                PlanStop(plan=row, sequence=sequence, **{field: stop[field] for field in STOP_FIELDS})
+                for sequence, stop in enumerate(
+                    stop for day in plan['days'] for stop in day['stops']
+                )
+            ])
+    except IntegrityError:
+        return False
+    return True
+
+
+def get_or_calculate(
+    data: Dict[str, Any],
+    calculate: Callable[[Dict[str, Any]], Dict[str, Any]] = calculate_trip
+) -> Dict[str, Any]:
+    """Return the stored plan for `data`, computing and storing it if there is none."""
+    if not settings.PLAN_STORE_ENABLED:
+        return calculate(data)
+
+    key = store_key(data)
+    plan = _fail_open(find_plan, key)
+    if plan is not None:
+        _count('hits')
+        return plan
+
+    _count('misses')
+    plan = calculate(data)
+    _fail_open(save_plan, key, data, plan)
+    return plan
+
+
+async def aget_or_calculate(
+    data: Dict[str, Any],
+    calculate: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Async form of get_or_calculate.
+
+    Database I/O runs through sync_to_async; `calculate` is awaited on a
+    miss and is expected to push the work off the event loop.
+    """
+    if not settings.PLAN_STORE_ENABLED:
+        return await calculate(data)
+
+    key = store_key(data)
+    plan = await sync_to_async(_fail_open)(find_plan, key)
+    if plan is not None:
+        _count('hits')
+        return plan
+
+    _count('misses')
+    plan = await calculate(data)
+    await sync_to_async(_fail_open)(save_plan, key, data, plan)
+    return plan
+
+
+def encode_cursor(created_at: datetime, plan_id: int) -> str:
+    """Opaque cursor for the plan after which the next page starts."""
+    raw = f"{created_at.isoformat()}|{plan_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, plan_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(plan_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+
+
+def list_plans(cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of stored plans, newest first.
+
+    Returns (plans, next_cursor); next_cursor is None on the last page.
+    Pages are keyed on (created_at, id) rather than an offset, so the
+    query is an index range scan however deep the page is.
+    """
+    plans = Plan.objects.order_by('-created_at', '-id')
+    if cursor:
+        created_at, plan_id = decode_cursor(cursor)
+        # (created_at, id) < cursor, written as a range on the index's
+        # leading column so it is not planned as an OR of two scans
+        plans = plans.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=plan_id)
+
+    rows = list(plans.values(
+        'id', 'input_hash', 'name', 'total_miles', 'total_days', 'total_driving_hours',
+        'total_on_duty_hours', 'cycle_hours_actual', 'restarts', 'created_at'
+    )[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+    return [
+        {
+            'id': row['input_hash'],
+            'name': row['name'],
+            'totalMiles': row['total_miles'],
+            'totalDays': row['total_days'],
+            'totalDrivingHours': row['total_driving_hours'],
+            'totalOnDutyHours': row['total_on_duty_hours'],
+            'cycleHoursActual': row['cycle_hours_actual'],
+            'restarts': row['restarts'],
+            'createdAt': row['created_at'].isoformat(),
+        }
+        for row in rows
+    ], next_cursor
+
+
+def stats() -> Dict[str, Any]:
+    """Lookup hit/miss counters and database errors for this process."""
+    with _stats_lock:
+        hits = _stats['hits']
+        misses = _stats['misses']
+        errors = _stats['errors']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hitRatio': round(hits / lookups, 4) if lookups else 0.0,
+        'errors': errors,
+    }
+
+
+def reset_stats():
+    """Zero the hit/miss and error counters."""
+    with _stats_lock:
+        for outcome in _stats:
+            _stats[outcome] = 0
@@ -0,0 +1,254 @@
+"""
+Offline road-network routing over a memory-mapped graph.
+
+A graph built by `manage.py build_road_graph` is a directory of .npy
+arrays in CSR layout:
+
+    lat.npy, lng.npy   float64 (N,)  node coordinates
+    xyz.npy            float64 (N,3) node unit vectors, for the A* bound
+    indptr.npy         int64 (N+1,)  edges of node u are indptr[u]:indptr[u+1]
+    targets.npy        int32 (E,)    edge head nodes
+    miles.npy          float32 (E,)  edge length
+    hours.npy          float32 (E,)  edge travel time
+    cells.npy          int64 (C,)    sorted grid cells that hold nodes
+    cell_start.npy     int64 (C+1,)  nodes of cells[i] are cell_start[i]:cell_start[i+1]
+    meta.json                        version, cell_degrees, max_mph, checksum
+
+The arrays are opened with np.load(mmap_mode='r'), so opening a graph is
+instant whatever its size. Pages are read on demand, and every worker
+process on the host shares the same page-cache copy.
+
+Legs are routed with A* on travel time. The heuristic is the chord
+between a node and the target (never longer than the great-circle
+distance) at the graph's top speed. It never overestimates because the
+build keeps every edge at least as long as the straight line between its
+ends. Each leg endpoint is snapped to the nearest node within
+ROAD_GRAPH_SNAP_MILES, and the access distance is counted at ROAD_FACTOR.
+
+Routed legs go through route_service's two-tier leg cache, keyed by the
+graph's checksum, so a rebuilt graph never serves routes of the old one
+and workers share each other's searches.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .route_service import (
+    cached_legs, haversine_distance, leg_points, EARTH_RADIUS_MILES, ROAD_FACTOR, AVG_SPEED_MPH
+)
+
+
+GRAPH_FORMAT_VERSION = 1
+ARRAYS = ('lat', 'lng', 'xyz', 'indptr', 'targets', 'miles', 'hours', 'cells', 'cell_start')
+
+
+def graph_checksum(arrays: Dict[str, np.ndarray]) -> str:
+    """Hash of a graph's arrays, stored in meta.json by build_road_graph."""
+    digest = hashlib.sha1()
+    for name in ARRAYS:
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def cell_id(lat: float, lng: float, cell_degrees: float) -> int:
+    """Grid cell of a point, packed into one integer."""
+    row = math.floor((lat + 90) / cell_degrees)
+    col = math.floor((lng + 180) / cell_degrees)
+    return row * 100000 + col
+
+
+class RoadGraph:
+    """A memory-mapped CSR road graph."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != GRAPH_FORMAT_VERSION:
+            raise ValueError(f"Unsupported road graph version {meta.get('version')}")
+        self.cell_degrees = meta['cell_degrees']
+        self.max_mph = meta['max_mph']
+        # Identifies the graph's content in leg cache keys. Graphs built
+        # before checksums were recorded fall back to their files' sizes
+        # and modification times
+        self.checksum = meta.get('checksum') or hashlib.sha1(repr([
+            (os.stat(os.path.join(path, f'{name}.npy')).st_size,
+             os.stat(os.path.join(path, f'{name}.npy')).st_mtime_ns)
+            for name in ARRAYS
+        ]).encode()).hexdigest()
+        for name in ARRAYS:
+            # Plain ndarray views of the mapping: np.memmap's own indexing
+            # costs several times more per access
+            mapped = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            setattr(self, name, mapped.view(np.ndarray))
+
+    def __len__(self):
+        return len(self.lat)
+
+    def nearest_node(self, lat: float, lng: float, max_miles: float) -> Optional[Tuple[int, float]]:
+        """Nearest node within max_miles as (node, miles), or None."""
+        reach = max(1, math.ceil(max_miles / (69.0 * self.cell_degrees * max(math.cos(math.radians(lat)), 0.01))))
+        center = cell_id(lat, lng, self.cell_degrees)
+        best = None
+        best_miles = max_miles
+        for row in range(-reach, reach + 1):
+            low = center + row * 100000 - reach
+            first, last = np.searchsorted(self.cells, [low, low + 2 * reach + 1])
+            if first == last:
+                continue
+            start = int(self.cell_start[first])
+            end = int(self.cell_start[last])
+            lats = self.lat[start:end].tolist()
+            lngs = self.lng[start:end].tolist()
+            for offset, (node_lat, node_lng) in enumerate(zip(lats, lngs)):
+                miles = haversine_distance(lat, lng, node_lat, node_lng)
+                if miles <= best_miles:
+                    best = start + offset
+                    best_miles = miles
+        if best is None:
+            return None
+        return best, best_miles
+
+    def shortest_path(self, source: int, target: int) -> Optional[Tuple[List[int], List[int]]]:
+        """
+        Fastest path from source to target (A*) as (nodes, edges), or None
+        if target is unreachable.
+        """
+        xyz = self.xyz
+        indptr, targets, hours = self.indptr, self.targets, self.hours
+        target_x, target_y, target_z = xyz[target].tolist()
+        scale = EARTH_RADIUS_MILES / self.max_mph
+        estimates = {}
+
+        def estimate(node):
+            value = estimates.get(node)
+            if value is None:
+                x, y, z = xyz[node].tolist()
+                value = estimates[node] = scale * math.sqrt(
+                    (x - target_x) ** 2 + (y - target_y) ** 2 + (z - target_z) ** 2
+                )
+            return value
+
+        best = {source: 0.0}
+        # node -> (previous node, edge taken)
+        previous = {source: (-1, -1)}
+        done = set()
+        queue = [(estimate(source), 0.0, source)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                nodes = []
+                edges = []
+                while node != -1:
+                    nodes.append(node)
+                    node, edge = previous[node]
+                    edges.append(edge)
+                return nodes[::-1], edges[-2::-1]
+            if node in done:
+                continue
+            done.add(node)
+
+            start = int(indptr[node])
+            end = int(indptr[node + 1])
+            for edge, (neighbor, edge_hours) in enumerate(
+                zip(targets[start:end].tolist(), hours[start:end].tolist()), start
+            ):
+                new_cost = cost + edge_hours
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    previous[neighbor] = (node, edge)
+                    heapq.heappush(queue, (new_cost + estimate(neighbor), new_cost, neighbor))
+        return None
+
+    def route(self, origin: Dict[str, Any], destination: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Road distance (miles), duration (hours) and geometry ([lat, lng]
+        points) from origin to destination; None when either end is too far
+        from the graph or no path connects them.
+        """
+        snap_miles = settings.ROAD_GRAPH_SNAP_MILES
+        start = self.nearest_node(origin['lat'], origin['lng'], snap_miles)
+        end = self.nearest_node(destination['lat'], destination['lng'], snap_miles)
+        if start is None or end is None:
+            return None
+        (source, source_access), (target, target_access) = start, end
+
+        found = self.shortest_path(source, target)
+        if found is None:
+            return None
+        path, edges = found
+        miles = float(self.miles[edges].sum(dtype=np.float64))
+        hours = float(self.hours[edges].sum(dtype=np.float64))
+
+        # Origin and destination to their snapped nodes, off the network
+        access = (source_access + target_access) * ROAD_FACTOR
+        geometry = [[origin['lat'], origin['lng']]]
+        geometry.extend([float(self.lat[node]), float(self.lng[node])] for node in path)
+        geometry.append([destination['lat'], destination['lng']])
+        return {
+            'distance': miles + access,
+            'duration': hours + access / AVG_SPEED_MPH,
+            'geometry': geometry,
+        }
+
+
+_graph = None
+_graph_path = None
+_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """
+    Return this process's graph, mapping ROAD_GRAPH_PATH on first use;
+    None unless ROUTING_BACKEND is 'graph'.
+    """
+    global _graph, _graph_path
+    if settings.ROUTING_BACKEND != 'graph':
+        return None
+    path = settings.ROAD_GRAPH_PATH
+    with _graph_lock:
+        if _graph is None or _graph_path != path:
+            _graph = RoadGraph(path)
+            _graph_path = path
+        return _graph
+
+
+def reset_road_graph():
+    """Unmap the graph so the next use reopens ROAD_GRAPH_PATH."""
+    global _graph, _graph_path
+    with _graph_lock:
+        _graph = None
+        _graph_path = None
+
+
+def route_legs(pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """
+    Graph routes for each (origin, destination) pair, or None when the
+    graph backend is off. A leg the graph cannot serve is None. With
+    LEG_CACHE_ENABLED, legs go through the two-tier leg cache, keyed by
+    the graph's checksum and the snap radius and routed between the
+    rounded points like cached haversine legs.
+    """
+    graph = get_road_graph()
+    if graph is None:
+        return None
+    if not settings.LEG_CACHE_ENABLED:
+        return [graph.route(a, b) for a, b in pairs]
+
+    points = leg_points(pairs)
+    prefix = f"route:{graph.checksum}:{settings.ROAD_GRAPH_SNAP_MILES!r}:"
+
+    def route(i):
+        lat1, lng1, lat2, lng2 = points[i]
+        # Unroutable legs are cached too, as {}
+        return graph.route({'lat': lat1, 'lng': lng1}, {'lat': lat2, 'lng': lng2}) or {}
+
+    routes = cached_legs([prefix + '%r,%r:%r,%r' % point for point in points], route)
+    return [route or None for route in routes]
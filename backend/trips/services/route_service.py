@@ -1,10 +1,28 @@
 """
 Route calculation service.
 Uses Haversine formula for distance estimation.
+
+Legs go through a two-tier cache: a small in-process LRU in front of a
+Django cache backend (settings.LEG_CACHE_ALIAS). Pointing that alias at a
+shared backend lets every worker reuse legs warmed by the others. Road
+graph routes (services.road_graph) use the same tiers.
 """
 
 import math
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+EARTH_RADIUS_MILES = 3958.8
+ROAD_FACTOR = 1.3  # Roads are ~1.3x straight-line distance
+AVG_SPEED_MPH = 55
 
 
 def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
@@ -12,7 +30,7 @@ def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> fl
     Calculate the great-circle distance between two points on Earth.
     Returns distance in miles.
     """
-    R = 3958.8  # Earth's radius in miles
+    R = EARTH_RADIUS_MILES
     
     lat1_rad = math.radians(lat1)
     lat2_rad = math.radians(lat2)
@@ -26,7 +44,216 @@ def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> fl
     return R * c
 
 
-def estimate_driving_time(distance_miles: float, avg_speed_mph: float = 55) -> float:
+class LegCache:
+    """
+    In-process LRU tier of the leg cache.
+    
+    Holds up to `max_size` legs (distances or road graph routes) and
+    counts hits, misses and evictions. Lookups that miss here fall through
+    to the shared backend.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'localHits': 0, 'sharedHits': 0, 'misses': 0, 'evictions': 0}
+    
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def count(self, outcome: str, n: int = 1):
+        with self._lock:
+            self._stats[outcome] += n
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._stats)
+            size = len(self._entries)
+        hits = counts['localHits'] + counts['sharedHits']
+        lookups = hits + counts['misses']
+        return {
+            **counts,
+            'hits': hits,
+            'hitRatio': round(hits / lookups, 4) if lookups else 0.0,
+            'localSize': size,
+        }
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for outcome in self._stats:
+                self._stats[outcome] = 0
+
+
+_leg_cache = None
+_leg_cache_lock = threading.Lock()
+
+
+def get_leg_cache() -> LegCache:
+    """Return this process's leg LRU, creating it from settings on first use."""
+    global _leg_cache
+    with _leg_cache_lock:
+        if _leg_cache is None:
+            _leg_cache = LegCache(settings.LEG_CACHE_LOCAL_SIZE)
+        return _leg_cache
+
+
+def leg_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of this process's leg cache."""
+    return get_leg_cache().stats()
+
+
+def reset_leg_cache():
+    """Empty this process's LRU tier and zero its counters."""
+    get_leg_cache().clear()
+
+
+def _road_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Estimated road miles for one leg."""
+    return haversine_distance(lat1, lng1, lat2, lng2) * ROAD_FACTOR
+
+
+def leg_distances(pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[float]:
+    """
+    Road miles for each (origin, destination) pair, through the leg cache.
+    
+    Coordinates are rounded to LEG_CACHE_PRECISION decimal places and the
+    distance is computed from the rounded points, so a cached value does
+    not depend on which request warmed it. Misses in the local tier are
+    fetched from the shared backend in one get_many call.
+    """
+    if not settings.LEG_CACHE_ENABLED:
+        return [
+            _road_distance(a['lat'], a['lng'], b['lat'], b['lng']) for a, b in pairs
+        ]
+    
+    points = leg_points(pairs)
+    return cached_legs(
+        ['leg:%r,%r:%r,%r' % point for point in points],
+        lambda i: _road_distance(*points[i])
+    )
+
+
+def leg_points(pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Tuple[float, float, float, float]]:
+    """(lat, lng, lat, lng) of each pair, rounded to LEG_CACHE_PRECISION places."""
+    precision = settings.LEG_CACHE_PRECISION
+    return [
+        (round(a['lat'], precision), round(a['lng'], precision),
+         round(b['lat'], precision), round(b['lng'], precision))
+        for a, b in pairs
+    ]
+
+
+def cached_legs(keys: List[str], compute: Callable[[int], Any]) -> List[Any]:
+    """
+    The cached value of each key, through both tiers of the leg cache.
+    
+    compute(i) produces the value of keys[i] when neither tier has it;
+    values must not be None. Misses in the local tier are fetched from the
+    shared backend in one get_many call and new values stored in one
+    set_many call.
+    """
+    local = get_leg_cache()
+    values = [local.get(key) for key in keys]
+    pending = {key for key, value in zip(keys, values) if value is None}
+    local.count('localHits', len(keys) - sum(value is None for value in values))
+    if not pending:
+        return values
+    
+    shared = caches[settings.LEG_CACHE_ALIAS]
+    found = shared.get_many(pending)
+    computed = {}
+    for i, key in enumerate(keys):
+        if values[i] is not None:
+            continue
+        if key in found:
+            values[i] = found[key]
+            local.count('sharedHits')
+        elif key in computed:
+            # Repeated leg within the same route
+            values[i] = computed[key]
+            local.count('localHits')
+        else:
+            values[i] = computed[key] = compute(i)
+            local.count('misses')
+        local.put(key, values[i])
+    
+    if computed:
+        shared.set_many(computed)
+    return values
+
+
+def haversine_matrix(
+    lats1: Any,
+    lngs1: Any,
+    lats2: Any,
+    lngs2: Any
+) -> 'np.ndarray':
+    """
+    Vectorized haversine_distance.
+    Returns an N x M array of miles from each of the N points (lats1, lngs1)
+    to each of the M points (lats2, lngs2).
+    """
+    # numpy is only needed for matrices; importing it here keeps it off
+    # the plan-trip start-up path
+    import numpy as np
+    
+    lats1 = np.asarray(lats1, dtype=np.float64)[:, np.newaxis]
+    lngs1 = np.asarray(lngs1, dtype=np.float64)[:, np.newaxis]
+    lats2 = np.asarray(lats2, dtype=np.float64)[np.newaxis, :]
+    lngs2 = np.asarray(lngs2, dtype=np.float64)[np.newaxis, :]
+    
+    delta_lat = np.radians(lats2 - lats1)
+    delta_lng = np.radians(lngs2 - lngs1)
+    
+    a = (np.sin(delta_lat / 2) ** 2 +
+         np.cos(np.radians(lats1)) * np.cos(np.radians(lats2)) * np.sin(delta_lng / 2) ** 2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return EARTH_RADIUS_MILES * c
+
+
+def distance_matrix(
+    origins: List[Dict[str, Any]],
+    destinations: List[Dict[str, Any]]
+) -> Dict[str, 'np.ndarray']:
+    """
+    Road distances and driving times from every origin to every destination.
+    
+    Returns:
+        {
+            'distances': N x M array of road-factored miles,
+            'durations': N x M array of hours at AVG_SPEED_MPH,
+        }
+    """
+    miles = haversine_matrix(
+        [o['lat'] for o in origins], [o['lng'] for o in origins],
+        [d['lat'] for d in destinations], [d['lng'] for d in destinations],
+    ) * ROAD_FACTOR
+    
+    return {
+        'distances': miles,
+        'durations': miles / AVG_SPEED_MPH,
+    }
+
+
+def estimate_driving_time(distance_miles: float, avg_speed_mph: float = AVG_SPEED_MPH) -> float:
     """
     Estimate driving time in hours.
     Default average speed: 55 mph for trucks.
@@ -53,49 +280,79 @@ def calculate_route(
             'waypoints': [{'lat': ..., 'lng': ...}, ...]
         }
     """
-    # Calculate leg 1: Current -> Pickup
-    dist_to_pickup = haversine_distance(
-        current_location['lat'], current_location['lng'],
-        pickup_location['lat'], pickup_location['lng']
-    )
-    
-    # Calculate leg 2: Pickup -> Dropoff
-    dist_to_dropoff = haversine_distance(
-        pickup_location['lat'], pickup_location['lng'],
-        dropoff_location['lat'], dropoff_location['lng']
-    )
-    
-    # Apply road factor (roads are ~1.3x straight-line distance)
-    road_factor = 1.3
-    dist_to_pickup *= road_factor
-    dist_to_dropoff *= road_factor
+    return calculate_multi_stop_route([current_location, pickup_location, dropoff_location])
+
+
+def calculate_multi_stop_route(locations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Calculate a route through `locations` in order.
     
-    total_distance = dist_to_pickup + dist_to_dropoff
+    Returns the same structure as calculate_route, with one leg per
+    consecutive pair of locations. With ROUTING_BACKEND = 'graph', legs
+    come from the road graph (road miles, travel time and a 'geometry'
+    list of [lat, lng] points); a leg the graph cannot serve falls back
+    to the road-factored estimate.
+    """
+    pairs = list(zip(locations, locations[1:]))
+    routed = [None] * len(pairs)
+    if settings.ROUTING_BACKEND == 'graph':
+        # Imported on first use: road_graph builds on this module and
+        # loads numpy
+        from .road_graph import route_legs
+        routed = route_legs(pairs)
+    # Road-factored, ~1.3x straight-line distance
+    estimated = iter(leg_distances([pair for pair, route in zip(pairs, routed) if route is None]))
     
-    legs = [
-        {
-            'from': current_location,
-            'to': pickup_location,
-            'distance': round(dist_to_pickup, 1),
-            'duration': round(estimate_driving_time(dist_to_pickup), 2),
-        },
-        {
-            'from': pickup_location,
-            'to': dropoff_location,
-            'distance': round(dist_to_dropoff, 1),
-            'duration': round(estimate_driving_time(dist_to_dropoff), 2),
+    legs = []
+    distances = []
+    durations = []
+    for (from_loc, to_loc), route in zip(pairs, routed):
+        if route is None:
+            distance = next(estimated)
+            duration = estimate_driving_time(distance)
+        else:
+            distance = route['distance']
+            duration = route['duration']
+        leg = {
+            'from': from_loc,
+            'to': to_loc,
+            'distance': round(distance, 1),
+            'duration': round(duration, 2),
         }
-    ]
+        if route is not None:
+            leg['geometry'] = route['geometry']
+        legs.append(leg)
+        distances.append(distance)
+        durations.append(duration)
     
-    waypoints = [
-        {'lat': current_location['lat'], 'lng': current_location['lng']},
-        {'lat': pickup_location['lat'], 'lng': pickup_location['lng']},
-        {'lat': dropoff_location['lat'], 'lng': dropoff_location['lng']},
-    ]
+    waypoints = [{'lat': location['lat'], 'lng': location['lng']} for location in locations]
+    
+    total_distance = sum(distances)
+    total_driving_time = sum(durations) if any(routed) else estimate_driving_time(total_distance)
     
     return {
         'legs': legs,
         'total_distance': round(total_distance, 1),
-        'total_driving_time': round(estimate_driving_time(total_distance), 2),
+        'total_driving_time': round(total_driving_time, 2),
         'waypoints': waypoints,
     }
+
+
+def route_summary(route: Dict[str, Any], first_leg: int = 0) -> Dict[str, Any]:
+    """
+    The plan response's route from leg `first_leg` on: its waypoints, plus
+    one 'geometry' polyline when any of those legs was routed on the road
+    graph (other legs contribute a straight segment).
+    """
+    summary = {'waypoints': route['waypoints'][first_leg:]}
+    legs = route['legs'][first_leg:]
+    if any('geometry' in leg for leg in legs):
+        geometry = []
+        for leg in legs:
+            points = leg.get('geometry') or [
+                [leg['from']['lat'], leg['from']['lng']],
+                [leg['to']['lat'], leg['to']['lng']],
+            ]
+            geometry.extend(points[1:] if geometry else points)
+        summary['geometry'] = geometry
+    return summary
@@ -0,0 +1,110 @@
+"""
+In-process request coalescing ("single flight").
+
+Concurrent calls for the same key share one execution: the first caller
+(the leader) runs the function, later callers wait for it and receive the
+same result object, so callers must treat it as read-only. A waiter that
+times out, or whose leader raised, runs the function itself; a failed
+leader's exception is only raised to the leader.
+
+FlightGroup serves threads (WSGI workers); AsyncFlightGroup serves
+coroutines on one event loop (the ASGI views).
+"""
+
+import asyncio
+import threading
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        # Stays True unless the leader returns normally
+        self.failed = True
+
+
+class FlightGroup:
+    """Single flight for threads."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any], timeout: float) -> Tuple[Any, bool]:
+        """
+        Run func once for all concurrent callers with this key.
+
+        Returns (result, shared); shared is True when the result came from
+        another caller's execution. Waits at most `timeout` seconds.
+        """
+        deadline = monotonic() + timeout
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                try:
+                    flight.result = func()
+                    flight.failed = False
+                    return flight.result, False
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+
+            if flight.done.wait(max(deadline - monotonic(), 0)) and not flight.failed:
+                return flight.result, True
+            if monotonic() >= deadline:
+                # The leader is too slow: stop waiting and run it here
+                return func(), False
+            # The leader failed: one of the waiters leads the next attempt
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class AsyncFlightGroup:
+    """Single flight for coroutines on the running event loop."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]], timeout: float) -> Tuple[Any, bool]:
+        """Async form of FlightGroup.do; `func` returns an awaitable."""
+        loop = asyncio.get_running_loop()
+        deadline = monotonic() + timeout
+        while True:
+            flight = self._flights.get(key)
+            if flight is None or flight.get_loop() is not loop:
+                flight = self._flights[key] = loop.create_future()
+                try:
+                    result = await func()
+                except BaseException:
+                    flight.set_result(None)
+                    raise
+                else:
+                    flight.set_result((result,))
+                    return result, False
+                finally:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+
+            try:
+                outcome = await asyncio.wait_for(asyncio.shield(flight), max(deadline - monotonic(), 0))
+            except asyncio.TimeoutError:
+                return await func(), False
+            if outcome is not None:
+                return outcome[0], True
+            if monotonic() >= deadline:
+                return await func(), False
+
+    def __len__(self):
+        return len(self._flights)
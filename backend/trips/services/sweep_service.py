@@ -0,0 +1,116 @@
+"""
+What-if sweeps of one trip over start times and cycle hours.
+
+The route does not depend on when the driver leaves or how many cycle
+hours are used, so it is calculated once and every variant of the grid
+is scheduled on it. Variants are spread over the batch process pool in
+contiguous chunks, like batch plans, and each comes back as a short
+summary (and the full plan only when asked for).
+"""
+
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+from .batch_service import _chunk, _discard_executor, get_executor, get_pool_size
+from .hos_engine import (
+    HOSEngine,
+    MINUTES_PER_DAY,
+    MINUTES_PER_HOUR,
+    build_itinerary,
+    format_minutes,
+    to_minutes,
+)
+from .route_service import calculate_multi_stop_route
+
+
+def _arrival_minute(plan: Dict[str, Any]) -> int:
+    """Minutes from day 1's midnight to the arrival at the final dropoff."""
+    for day in reversed(plan['days']):
+        for stop in reversed(day['stops']):
+            if stop['type'] == 'dropoff':
+                hours, minutes = stop['time'].split(':')
+                return (stop['day'] - 1) * MINUTES_PER_DAY + int(hours) * MINUTES_PER_HOUR + int(minutes)
+    raise ValueError('Plan has no dropoff')
+
+
+def _run_variant(
+    data: Dict[str, Any],
+    route: Dict[str, Any],
+    start_time: float,
+    cycle_hours: int,
+    include_plan: bool
+) -> Dict[str, Any]:
+    """Schedule one variant on the shared route and summarize it."""
+    variant = {'startTime': format_minutes(to_minutes(start_time)), 'cycleHoursUsed': cycle_hours}
+    try:
+        engine = HOSEngine(cycle_hours, start_time=start_time)
+        plan = engine.calculate_trip(dict(data, cycle_hours_used=cycle_hours), route)
+        arrival = _arrival_minute(plan)
+    except Exception as e:
+        variant['error'] = str(e)
+        return variant
+
+    warning = plan.get('warning')
+    variant.update({
+        'totalDays': plan['totalDays'],
+        'arrival': {'day': arrival // MINUTES_PER_DAY + 1, 'time': format_minutes(arrival)},
+        'elapsedHours': round((arrival - to_minutes(start_time)) / MINUTES_PER_HOUR, 2),
+        'totalDrivingHours': plan['totalDrivingHours'],
+        'restarts': plan['restarts'],
+        'cycleExcessHours': warning['excessHours'] if warning else 0,
+    })
+    if include_plan:
+        variant['plan'] = plan
+    return variant
+
+
+def _run_chunk(
+    data: Dict[str, Any],
+    route: Dict[str, Any],
+    variants: List[Tuple[float, int]],
+    include_plans: bool
+) -> List[Dict[str, Any]]:
+    """Worker entry point: one contiguous slice of the grid."""
+    return [_run_variant(data, route, start, cycle, include_plans) for start, cycle in variants]
+
+
+def sweep_trip(
+    data: Dict[str, Any],
+    start_times: List[float],
+    cycle_hours: List[int],
+    include_plans: bool = False
+) -> Dict[str, Any]:
+    """
+    Plan `data` for every (start time, cycle hours) pair.
+
+    Variants are ordered by start time, then cycle hours, as given. A
+    variant that fails carries an 'error' instead of its summary.
+    """
+    route = calculate_multi_stop_route(
+        [data['current_location']] + [location for _, location, _ in build_itinerary(data)]
+    )
+    grid = [(start, cycle) for start in start_times for cycle in cycle_hours]
+
+    workers = get_pool_size()
+    if len(grid) == 1 or workers == 1:
+        variants = _run_chunk(data, route, grid, include_plans)
+    else:
+        executor = get_executor()
+        variants = []
+        try:
+            futures = [
+                executor.submit(_run_chunk, data, route, chunk, include_plans)
+                for chunk in _chunk(grid, workers)
+            ]
+            for future in futures:
+                variants.extend(future.result())
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            # A worker died mid-sweep; finish the remainder in-process
+            variants.extend(_run_chunk(data, route, grid[len(variants):], include_plans))
+
+    return {
+        'name': f"{data['current_location']['label']} → {data['dropoff_location']['label']}",
+        'totalMiles': round(route['total_distance']),
+        'variants': variants,
+    }
@@ -0,0 +1,182 @@
+"""
+Truck-stop lookup for placing rest, break, fuel and restart stops.
+
+settings.TRUCK_STOPS_FILE names a CSV of points of interest with columns
+name, lat, lng and optional fuel / parking flags (1/0, default 1). It is
+loaded once per process into uniform lat/lng grids of CELL_DEGREES
+cells, one per amenity. A lookup only visits the few cells that overlap
+the detour radius around the scheduled point, so it stays in the
+microseconds however large the file is.
+
+A stop is moved to the nearest POI offering what it needs (fuel for a
+fuel stop, truck parking for the rest) within TRUCK_STOP_DETOUR_MILES
+road miles; with no file configured, or nothing in range, the stop stays
+on the route. The engine drives the detour there and back like any
+other driving, so it only takes POIs the driver can reach within the
+hours left.
+"""
+
+import csv
+import hashlib
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .route_service import haversine_distance, ROAD_FACTOR
+
+
+CELL_DEGREES = 0.25
+MILES_PER_DEGREE_LAT = 69.0
+
+# What a POI must offer for each kind of scheduled stop
+STOP_NEEDS = {
+    'fuel': 'fuel',
+    'rest': 'parking',
+    'break': 'parking',
+    'restart': 'parking',
+}
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+class TruckStopIndex:
+    """Grid index of truck-stop POIs, one grid per amenity."""
+
+    def __init__(self, pois: List[Dict]):
+        # Each POI: {'label', 'lat', 'lng', 'fuel', 'parking'}; a grid cell
+        # holds (lat, lng, poi) tuples of the POIs that offer its amenity
+        self.size = len(pois)
+        # Identifies the POI set in plan store keys
+        self.checksum = hashlib.sha1(repr(pois).encode()).hexdigest()
+        self.grids: Dict[Optional[str], Dict[Tuple[int, int], List[Tuple]]] = {
+            None: {}, 'fuel': {}, 'parking': {},
+        }
+        for poi in pois:
+            entry = (poi['lat'], poi['lng'], poi)
+            cell = _cell(poi['lat'], poi['lng'])
+            for need, grid in self.grids.items():
+                if need is None or poi[need]:
+                    grid.setdefault(cell, []).append(entry)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'TruckStopIndex':
+        def flag(value):
+            return value is None or value.strip() not in ('0', 'false', 'False', '')
+
+        with open(path, newline='', encoding='utf-8') as f:
+            pois = [
+                {
+                    'label': row['name'],
+                    'lat': float(row['lat']),
+                    'lng': float(row['lng']),
+                    'fuel': flag(row.get('fuel')),
+                    'parking': flag(row.get('parking')),
+                }
+                for row in csv.DictReader(f)
+            ]
+        return cls(pois)
+
+    def __len__(self):
+        return self.size
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        max_miles: float,
+        need: Optional[str] = None
+    ) -> Optional[Tuple[Dict, float]]:
+        """
+        Nearest POI within max_miles (straight line) that offers `need`.
+
+        Candidates are ranked by equirectangular distance, which matches
+        great-circle order at detour-sized radii; only the winner gets the
+        exact haversine check. Returns (poi, miles) or None.
+        """
+        lat_reach = max_miles / MILES_PER_DEGREE_LAT
+        # Longitude degrees shrink with latitude; use the widest edge
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_reach, 89.0)))
+        lng_reach = max_miles / (MILES_PER_DEGREE_LAT * cos_lat)
+        lng_scale = math.cos(math.radians(lat))
+
+        row_min, col_min = _cell(lat - lat_reach, lng - lng_reach)
+        row_max, col_max = _cell(lat + lat_reach, lng + lng_reach)
+
+        best = None
+        best_score = lat_reach * lat_reach
+        grid = self.grids[need]
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                for poi_lat, poi_lng, poi in grid.get((row, col), ()):
+                    d_lat = poi_lat - lat
+                    d_lng = (poi_lng - lng) * lng_scale
+                    score = d_lat * d_lat + d_lng * d_lng
+                    if score <= best_score:
+                        best = poi
+                        best_score = score
+        if best is None:
+            return None
+        miles = haversine_distance(lat, lng, best['lat'], best['lng'])
+        if miles > max_miles:
+            return None
+        return best, miles
+
+
+_index = None
+_index_path = None
+_index_lock = threading.Lock()
+
+
+def get_truck_stop_index() -> Optional[TruckStopIndex]:
+    """
+    Return this process's POI index, loading TRUCK_STOPS_FILE on first
+    use; None when no file is configured.
+    """
+    global _index, _index_path
+    path = settings.TRUCK_STOPS_FILE
+    if not path:
+        return None
+    with _index_lock:
+        if _index is None or _index_path != path:
+            _index = TruckStopIndex.from_csv(path)
+            _index_path = path
+        return _index
+
+
+def reset_truck_stop_index():
+    """Drop the loaded index so the next lookup reloads the file."""
+    global _index, _index_path
+    with _index_lock:
+        _index = None
+        _index_path = None
+
+
+def detour_budget() -> float:
+    """Road miles a stop may move off the route; 0 with no POI file configured."""
+    if get_truck_stop_index() is None:
+        return 0.0
+    return settings.TRUCK_STOP_DETOUR_MILES
+
+
+def find_truck_stop(stop_type: str, location: Dict, max_miles: float) -> Optional[Tuple[Dict, float]]:
+    """
+    Nearest truck stop offering what `stop_type` needs within max_miles
+    road miles (and never beyond TRUCK_STOP_DETOUR_MILES) of `location`,
+    as (location, road miles), or None.
+    """
+    index = get_truck_stop_index()
+    max_miles = min(max_miles, settings.TRUCK_STOP_DETOUR_MILES)
+    if index is None or max_miles <= 0:
+        return None
+
+    found = index.nearest(
+        location['lat'], location['lng'], max_miles / ROAD_FACTOR, STOP_NEEDS.get(stop_type)
+    )
+    if found is None:
+        return None
+    poi, miles = found
+    return {'label': poi['label'], 'lat': poi['lat'], 'lng': poi['lng']}, miles * ROAD_FACTOR
@@ -3,11 +3,44 @@ Unit tests for the ELD Trip Planner backend.
 Covers HOS Engine logic and API endpoints.
 """
 
-from django.test import TestCase, Client
-from django.urls import reverse
+import asyncio
+import gzip
+import io
 import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+import brotli
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.test import TestCase, Client, AsyncClient, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
 
-from .services.hos_engine import HOSEngine, calculate_trip
+from .services.hos_engine import CheckpointError, HOSEngine, calculate_trip
+from .services.batch_service import get_pool_size, plan_trips
+from .services.sweep_service import sweep_trip
+from .services import metrics, plan_cache, plan_store, route_service
+from .services.fleet_sim import simulate, simulate_driver_scalar
+from .services.executor import BoundedExecutor, ExecutorFull
+from .services import truck_stops, road_graph
+from .services.compact import encode_polyline, decode_polyline
+from .services.route_service import (
+    haversine_distance, distance_matrix, ROAD_FACTOR,
+    calculate_route, calculate_multi_stop_route, leg_distances, leg_cache_stats, reset_leg_cache,
+)
+from .models import Plan
+from .serializers import CoordinateSerializer, DistanceMatrixRequestSerializer, PlanTripRequestSerializer
+from .validators import validate_plan_trip
+from .renderers import ORJSONRenderer
+from .parsers import ORJSONParser
 
 
 class HOSEngineUnitTests(TestCase):
@@ -28,7 +61,7 @@ class HOSEngineUnitTests(TestCase):
         engine = HOSEngine(cycle_hours_used=0)
         
         # Add 11 hours of driving
-        engine._add_driving(11, 605)  # 11h at 55mph = 605 miles
+        engine._add_driving(11 * 60, 605)  # 11h (in minutes) at 55mph = 605 miles
         
         self.assertEqual(engine.current_day_driving, 11)
         self.assertEqual(engine.driving_since_break, 11)
@@ -38,7 +71,7 @@ class HOSEngineUnitTests(TestCase):
         engine = HOSEngine(cycle_hours_used=0)
         
         # Add some driving
-        engine._add_driving(8, 440)
+        engine._add_driving(8 * 60, 440)
         self.assertEqual(engine.current_day_driving, 8)
         
         # Take rest
@@ -49,27 +82,12 @@ class HOSEngineUnitTests(TestCase):
         self.assertEqual(engine.current_day_duty, 0)
         self.assertEqual(engine.driving_since_break, 0)
 
-    def test_break_resets_driving_since_break(self):
-        """Test that 30-minute break resets driving_since_break."""
-        engine = HOSEngine(cycle_hours_used=0)
-        
-        # Add 8 hours of driving
-        engine._add_driving(8, 440)
-        self.assertEqual(engine.driving_since_break, 8)
-        
-        # Take break
-        engine._add_break()
-        
-        # Only driving_since_break should reset
-        self.assertEqual(engine.driving_since_break, 0)
-        self.assertEqual(engine.current_day_driving, 8)  # Still 8
-
     def test_cycle_hours_tracking(self):
         """Test that cycle hours are accumulated correctly."""
         engine = HOSEngine(cycle_hours_used=50)
         
-        engine._add_driving(5, 275)
-        engine._add_on_duty(1)
+        engine._add_driving(5 * 60, 275)
+        engine._add_on_duty(60)
         
         self.assertEqual(engine.cycle_hours_used, 56)  # 50 + 5 + 1
 
@@ -97,6 +115,20 @@ class HOSEngineUnitTests(TestCase):
         self.assertEqual(engine._format_time(23.75), "23:45")
         self.assertEqual(engine._format_time(0), "00:00")
 
+    def test_activities_bucketed_by_day_in_order(self):
+        """Test day buckets hold every activity, in start-time order."""
+        engine = HOSEngine()
+        list(engine._iter_driving(3000, {'label': 'A', 'lat': 34.0, 'lng': -118.0},
+                                  {'label': 'B', 'lat': 40.7, 'lng': -74.0}))
+        
+        bucketed = [a for day in sorted(engine.activities_by_day)
+                    for a in engine.activities_by_day[day]]
+        self.assertEqual(bucketed, engine.activities)
+        for day_num, bucket in engine.activities_by_day.items():
+            self.assertTrue(all(a.day == day_num for a in bucket))
+            starts = [a.start for a in bucket]
+            self.assertEqual(starts, sorted(starts))
+
     def test_location_interpolation(self):
         """Test location interpolation between two points."""
         engine = HOSEngine()
@@ -188,6 +220,557 @@ class TripCalculationTests(TestCase):
         self.assertLessEqual(result['totalDrivingHours'], result['totalMiles'] / 55 + 2)
 
 
+class MultiStopTripTests(TestCase):
+    """Tests for trips with intermediate stops."""
+
+    def setUp(self):
+        self.data = {
+            'current_location': {'label': 'Atlanta', 'lat': 33.7490, 'lng': -84.3880},
+            'pickup_location': {'label': 'Terminal', 'lat': 33.6407, 'lng': -84.4277},
+            'dropoff_location': {'label': 'Richmond', 'lat': 37.5407, 'lng': -77.4360},
+            'stops': [
+                {'label': 'Charlotte', 'lat': 35.2271, 'lng': -80.8431, 'duration': 0.5},
+                {'label': 'Greensboro', 'lat': 36.0726, 'lng': -79.7920, 'type': 'pickup'},
+                {'label': 'Durham', 'lat': 35.9940, 'lng': -78.8986, 'duration': 0.25},
+            ],
+            'cycle_hours_used': 0
+        }
+
+    def test_route_has_one_leg_per_stop(self):
+        """Test the route visits every stop in order."""
+        locations = [
+            self.data['current_location'], self.data['pickup_location'],
+            *self.data['stops'], self.data['dropoff_location'],
+        ]
+        route = calculate_multi_stop_route(locations)
+        
+        self.assertEqual(len(route['legs']), 5)
+        self.assertEqual([leg['to'] for leg in route['legs']], locations[1:])
+        self.assertAlmostEqual(
+            route['total_distance'], sum(leg['distance'] for leg in route['legs']), delta=0.3
+        )
+
+    def test_stops_scheduled_in_order_with_durations(self):
+        """Test each stop appears once, in order, with its own duration."""
+        result = calculate_trip(self.data)
+        duty_stops = [
+            (stop['location'], stop['type'], stop['duration'])
+            for day in result['days'] for stop in day['stops']
+            if stop['type'] in ('pickup', 'dropoff')
+        ]
+        
+        self.assertEqual(duty_stops, [
+            ('Terminal', 'pickup', 1.0),
+            ('Charlotte', 'dropoff', 0.5),
+            ('Greensboro', 'pickup', 1.0),
+            ('Durham', 'dropoff', 0.25),
+            ('Richmond', 'dropoff', 1.0),
+        ])
+        self.assertEqual(result['stops'], self.data['stops'])
+        self.assertEqual(len(result['route']['waypoints']), 6)
+
+    def test_on_duty_hours_include_stop_durations(self):
+        """Test on-duty totals add up the per-stop durations."""
+        result = calculate_trip(self.data)
+        fuel_stops = sum(
+            1 for day in result['days'] for stop in day['stops'] if stop['type'] == 'fuel'
+        )
+        
+        self.assertAlmostEqual(
+            result['totalOnDutyHours'], 1.0 + 0.5 + 1.0 + 0.25 + 1.0 + 0.5 * fuel_stops, delta=0.1
+        )
+
+    def test_api_accepts_stops(self):
+        """Test the endpoint plans a multi-stop trip and validates stops."""
+        client = Client()
+        response = client.post(
+            '/api/plan-trip', data=json.dumps(self.data), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['stops']), 3)
+        
+        self.data['stops'][1]['type'] = 'lunch'
+        response = client.post(
+            '/api/plan-trip', data=json.dumps(self.data), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('type', response.json()['errors']['stops'][1])
+
+    def test_stops_change_cache_key(self):
+        """Test intermediate stops and durations are part of the plan key."""
+        without_stops = {k: v for k, v in self.data.items() if k != 'stops'}
+        shorter = json.loads(json.dumps(self.data))
+        shorter['stops'][0]['duration'] = 1.0
+        
+        keys = {plan_cache.make_key(d) for d in (self.data, without_stops, shorter)}
+        self.assertEqual(len(keys), 3)
+
+
+class CheckpointReplanTests(TestCase):
+    """Tests for engine checkpoints and mid-trip replanning."""
+
+    def setUp(self):
+        self.data = {
+            'current_location': {'label': 'Miami', 'lat': 25.7617, 'lng': -80.1918},
+            'pickup_location': {'label': 'Seattle', 'lat': 47.6062, 'lng': -122.3321},
+            'dropoff_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'stops': [
+                {'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903},
+                {'label': 'Chicago', 'lat': 41.8781, 'lng': -87.6298},
+            ],
+            'cycle_hours_used': 0
+        }
+
+    def _replan_at(self, checkpoint, position, next_stop):
+        engine = HOSEngine.from_checkpoint(checkpoint) if checkpoint else HOSEngine()
+        result = engine.replan_trip(self.data, position, next_stop)
+        # Checkpoints travel as JSON
+        return result, json.loads(json.dumps(result['checkpoint']))
+
+    def test_checkpoint_round_trip(self):
+        """Test from_checkpoint restores every counter to_checkpoint saved."""
+        engine = HOSEngine(25)
+        engine.position = self.data['pickup_location']
+        engine.next_stop = 1
+        # Off duty before the start, as the planning paths record it
+        engine._append_activity(1, 0, engine._time, 'offDuty')
+        engine._add_driving(570, 522.5)
+        engine._add_on_duty(60)
+        
+        restored = HOSEngine.from_checkpoint(json.loads(json.dumps(engine.to_checkpoint())))
+        
+        for attr in ('current_time', 'current_day', 'current_mileage', 'current_day_driving',
+                     'current_day_duty', 'driving_since_break', 'cycle_hours_used', 'next_stop',
+                     'cycle_window', 'restarts'):
+            self.assertEqual(getattr(restored, attr), getattr(engine, attr), attr)
+        self.assertEqual(restored.activities_by_day, {engine.current_day: engine.activities_by_day[engine.current_day]})
+
+    def test_resumed_plan_matches_full_plan(self):
+        """Test resuming at a stop reproduces the rest of the full plan."""
+        full = calculate_trip(self.data)
+        
+        # Fresh replan at the pickup, then resume from its checkpoint at Denver
+        first, checkpoint = self._replan_at(None, self.data['pickup_location'], 1)
+        self.assertEqual(first['days'], full['days'])
+        
+        resumed, _ = self._replan_at(checkpoint, self.data['stops'][0], 2)
+        expected = full['days'][checkpoint['day'] - 1:]
+        
+        self.assertEqual(resumed['days'][0]['day'], checkpoint['day'])
+        # Only the checkpoint day's stops before the checkpoint are left out
+        self.assertEqual(resumed['days'][0]['log'], expected[0]['log'])
+        self.assertEqual(resumed['days'][1:], expected[1:])
+        self.assertEqual(resumed['cycleHoursActual'], full['cycleHoursActual'])
+
+    def test_replan_endpoint(self):
+        """Test the replan loop over the API: fresh, then from the checkpoint."""
+        client = Client()
+        body = dict(self.data, position={'label': 'I-90 MM 120', 'lat': 46.9, 'lng': -119.9}, next_stop=1)
+        
+        response = client.post('/api/replan', data=json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        checkpoint = response.json()['checkpoint']
+        self.assertEqual(checkpoint['nextStop'], 1)
+        
+        body.update(checkpoint=checkpoint, position={'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903}, next_stop=2)
+        response = client.post('/api/replan', data=json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['days'][0]['day'], checkpoint['day'])
+        self.assertEqual(result['nextStop'], 2)
+        self.assertGreater(result['checkpoint']['mileage'], checkpoint['mileage'])
+
+    def test_replan_rejects_going_back(self):
+        """Test next_stop cannot move behind the checkpoint or past the end."""
+        _, checkpoint = self._replan_at(None, self.data['pickup_location'], 1)
+        body = dict(self.data, position=self.data['pickup_location'], checkpoint=checkpoint)
+        
+        for next_stop in (0, 5):
+            response = Client().post(
+                '/api/replan', data=json.dumps(dict(body, next_stop=next_stop)),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('next_stop', response.json()['errors'])
+
+    def test_replan_errors_are_not_blamed_on_the_checkpoint(self):
+        """Test a 24:00 checkpoint is rejected, but engine errors stay 500s."""
+        _, checkpoint = self._replan_at(None, self.data['pickup_location'], 1)
+        body = dict(self.data, position=self.data['stops'][0], next_stop=2)
+        
+        response = Client().post(
+            '/api/replan', data=json.dumps(dict(body, checkpoint=dict(checkpoint, time=24))),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('time', response.json()['errors']['checkpoint'])
+        with self.assertRaises(CheckpointError):
+            HOSEngine.from_checkpoint(dict(checkpoint, time=23.999))
+        
+        with mock.patch.object(HOSEngine, 'replan_trip', side_effect=ValueError('math domain error')):
+            with self.assertLogs('trips.views', level='ERROR'):
+                response = Client().post(
+                    '/api/replan', data=json.dumps(dict(body, checkpoint=checkpoint)),
+                    content_type='application/json'
+                )
+        self.assertEqual(response.status_code, 500)
+
+    def test_tampered_checkpoint_rejected(self):
+        """Test out-of-range days and activities that do not tile the day up to time are rejected."""
+        _, checkpoint = self._replan_at(None, self.data['pickup_location'], 1)
+        body = dict(self.data, position=self.data['stops'][0], next_stop=2)
+        activities = checkpoint['activities']
+        gap = [dict(activities[0], end=activities[0]['end'] - 0.5)] + activities[1:]
+        
+        for tampered, field in (
+            (dict(checkpoint, day=10 ** 9), 'day'),
+            (dict(checkpoint, activities=activities[::-1]), 'activities'),
+            (dict(checkpoint, activities=gap), 'activities'),
+            (dict(checkpoint, activities=activities[:-1]), 'activities'),
+        ):
+            response = Client().post(
+                '/api/replan', data=json.dumps(dict(body, checkpoint=tampered)),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.json()['errors']['checkpoint'])
+        with self.assertRaises(CheckpointError):
+            HOSEngine.from_checkpoint(dict(checkpoint, activities=gap))
+
+
+class CycleWindowTests(TestCase):
+    """Tests for the rolling 70-hour/8-day cycle and 34-hour restarts."""
+
+    def setUp(self):
+        self.data = {
+            'current_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+            'pickup_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+            'dropoff_location': {'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903},
+            'cycle_hours_used': 60
+        }
+
+    def _stop_types(self, plan):
+        return [stop['type'] for day in plan['days'] for stop in day['stops']]
+
+    def test_hours_drop_out_after_eight_days(self):
+        """Test each midnight recovers the hours worked 8 days earlier."""
+        engine = HOSEngine(cycle_history=[9, 8, 7, 6, 5, 4, 3, 2])
+        self.assertEqual(engine.cycle_hours_used, 44)
+        
+        engine._add_rest()
+        engine._add_rest()
+        
+        # 06:00 day 1 -> 02:00 day 2: day 1's oldest entry is gone
+        self.assertEqual(engine.current_day, 2)
+        self.assertEqual(engine.cycle_recap(), [8, 7, 6, 5, 4, 3, 2, 0])
+        self.assertEqual(engine.cycle_hours_used, 35)
+        
+        engine._add_on_duty(23 * 60)
+        self.assertEqual(engine.cycle_recap(), [7, 6, 5, 4, 3, 2, 22, 1])
+        self.assertEqual(engine.cycle_hours_used, 50)
+
+    def test_restart_inserted_when_cycle_runs_out(self):
+        """Test driving stops at 70 hours and resumes after a 34-hour restart."""
+        plan = calculate_trip(self.data)
+        
+        self.assertEqual(plan['restarts'], 1)
+        restart = next(
+            stop for day in plan['days'] for stop in day['stops'] if stop['type'] == 'restart'
+        )
+        self.assertEqual(restart['duration'], 34)
+        self.assertNotIn('warning', plan)
+        self.assertLess(plan['cycleHoursActual'], 70)
+
+    def test_history_recovers_hours_instead_of_restarting(self):
+        """Test a recap with old hours avoids the restart a flat total forces."""
+        history = [24, 22, 0, 0, 0, 0, 0, 14]
+        plan = calculate_trip(dict(self.data, cycle_history=history))
+        
+        self.assertEqual(plan['restarts'], 0)
+        self.assertNotIn('restart', self._stop_types(plan))
+        self.assertLess(plan['totalDays'], calculate_trip(self.data)['totalDays'])
+        self.assertNotEqual(plan_cache.make_key(self.data), plan_cache.make_key(dict(self.data, cycle_history=history)))
+
+    def test_restart_before_on_duty_stops_that_exceed_the_cycle(self):
+        """Test long pickups and drops restart first instead of running past 70 hours."""
+        data = dict(
+            self.data,
+            pickup_location=dict(self.data['pickup_location'], duration=10),
+            dropoff_location={'label': 'Baltimore', 'lat': 39.2904, 'lng': -76.6122, 'duration': 10},
+            cycle_hours_used=69,
+            cycle_history=[24, 24, 21],
+        )
+        plan = calculate_trip(data)
+        
+        self.assertEqual(self._stop_types(plan)[:3], ['start', 'restart', 'pickup'])
+        self.assertNotIn('warning', plan)
+        self.assertLessEqual(plan['cycleHoursActual'], 70)
+    
+    def test_history_validation(self):
+        """Test the recap is at most 8 days of at most 24 hours, adding up to the cycle hours."""
+        self.assertIsNone(validate_plan_trip(dict(self.data, cycle_history=[10] * 6))[1])
+        _, errors = validate_plan_trip(dict(self.data, cycle_history=[10] * 8))
+        self.assertEqual(errors['cycle_history'][0].code, 'invalid')
+        _, errors = validate_plan_trip(dict(self.data, cycle_history=[10] * 9))
+        self.assertIn('cycle_history', errors)
+        _, errors = validate_plan_trip(dict(self.data, cycle_history=[25]))
+        self.assertIn('cycle_history', errors)
+
+
+class MinuteClockTests(TestCase):
+    """Tests for the engine's integer-minute clock."""
+
+    def setUp(self):
+        self.from_loc = {'label': 'A', 'lat': 34.0, 'lng': -118.0}
+        self.to_loc = {'label': 'B', 'lat': 40.7, 'lng': -74.0}
+
+    def test_activities_tile_each_day_exactly(self):
+        """Test every day's activities run from 00:00 to 24:00 with no gap or overlap."""
+        engine = HOSEngine(cycle_hours_used=55)
+        list(engine._iter_stops(self.from_loc, [('dropoff', self.to_loc, 1.0)], {'legs': [{'distance': 2777.7}]}))
+        
+        for bucket in engine.activities_by_day.values():
+            self.assertEqual(bucket[0].start, 0)
+            self.assertEqual(bucket[-1].end, 24 * 60)
+            for previous, activity in zip(bucket, bucket[1:]):
+                self.assertEqual(previous.end, activity.start)
+                self.assertIsInstance(activity.start, int)
+
+    def test_rollover_lands_exactly_on_midnight(self):
+        """Test 18 hours from 06:00 ends at 00:00 of the next day, not 23:59."""
+        engine = HOSEngine()
+        engine._add_on_duty(18 * 60)
+        
+        self.assertEqual((engine.current_day, engine.current_time), (2, 0.0))
+        self.assertEqual(engine.activities_by_day[1][-1].end, 24 * 60)
+        self.assertNotIn(2, engine.activities_by_day)
+
+    def test_leg_time_rounds_to_the_minute(self):
+        """Test a leg takes its whole-minute driving time and all of its miles."""
+        engine = HOSEngine()
+        list(engine._iter_driving(100, self.from_loc, self.to_loc))
+        
+        # 100 miles at 55 mph = 109.09 minutes -> 109
+        self.assertEqual(engine._time, 6 * 60 + 109)
+        self.assertEqual(engine.current_mileage, 100)
+        self.assertEqual(engine._format_time(engine.current_time), '07:49')
+
+
+class TruckStopTests(TestCase):
+    """Tests for snapping scheduled stops to truck-stop POIs."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.pois = [
+            {'label': f'TS {i}', 'lat': lat, 'lng': lng, 'fuel': bool(i % 3), 'parking': True}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(25, 49, 20000), rng.uniform(-124, -67, 20000)))
+        ]
+        self.trip = {
+            'current_location': {'label': 'Miami', 'lat': 25.7617, 'lng': -80.1918},
+            'pickup_location': {'label': 'Seattle', 'lat': 47.6062, 'lng': -122.3321},
+            'dropoff_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'cycle_hours_used': 0
+        }
+        truck_stops.reset_truck_stop_index()
+        self.addCleanup(truck_stops.reset_truck_stop_index)
+
+    def test_nearest_matches_brute_force(self):
+        """Test the grid finds the same POI as a scan of every POI."""
+        pois = self.pois[:2000]
+        index = truck_stops.TruckStopIndex(pois)
+        rng = np.random.default_rng(8)
+        for lat, lng in zip(rng.uniform(25, 49, 100), rng.uniform(-124, -67, 100)):
+            for need in (None, 'fuel'):
+                in_range = [
+                    (haversine_distance(lat, lng, poi['lat'], poi['lng']), poi['label'])
+                    for poi in pois if need is None or poi[need]
+                ]
+                in_range = [entry for entry in in_range if entry[0] <= 30]
+                found = index.nearest(lat, lng, 30, need)
+                if in_range:
+                    self.assertEqual(found[0]['label'], min(in_range)[1])
+                else:
+                    self.assertIsNone(found)
+
+    def test_stops_snap_within_detour_budget(self):
+        """Test rest and fuel stops move to suitable POIs the driver can legally reach."""
+        unsnapped = calculate_trip(self.trip)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,lat,lng,fuel,parking\n')
+            for poi in self.pois:
+                f.write(f"{poi['label']},{poi['lat']},{poi['lng']},{int(poi['fuel'])},1\n")
+        self.addCleanup(os.unlink, f.name)
+        
+        engine = HOSEngine(0)
+        with override_settings(TRUCK_STOPS_FILE=f.name, TRUCK_STOP_DETOUR_MILES=15):
+            snapped = engine.calculate_trip(self.trip)
+        
+        labels = {poi['label'] for poi in self.pois}
+        fuel = {poi['label'] for poi in self.pois if poi['fuel']}
+        stops = [stop for day in snapped['days'] for stop in day['stops']]
+        moved = [stop for stop in stops if stop['location'] in labels]
+        self.assertGreater(len(moved), 0)
+        for stop in moved:
+            self.assertIn(stop['type'], truck_stops.STOP_NEEDS)
+            if stop['type'] == 'fuel':
+                self.assertIn(stop['location'], fuel)
+        
+        # The detours are driven: more driving, and still within the 11 and
+        # 14-hour limits of every duty period
+        self.assertGreater(snapped['totalDrivingHours'], unsnapped['totalDrivingHours'])
+        intervals = []
+        for activity in engine.activities:
+            start = (activity.day - 1) * 24 * 60 + activity.start
+            end = (activity.day - 1) * 24 * 60 + activity.end
+            if intervals and intervals[-1][0] == activity.type and intervals[-1][2] == start:
+                intervals[-1][2] = end
+            else:
+                intervals.append([activity.type, start, end])
+        period_start = None
+        period_driving = 0
+        for activity_type, start, end in intervals:
+            if activity_type in ('sleeperBerth', 'offDuty') and end - start >= 10 * 60:
+                period_start = None
+                period_driving = 0
+            elif activity_type in ('driving', 'onDuty'):
+                period_start = start if period_start is None else period_start
+                period_driving += (end - start) * (activity_type == 'driving')
+                self.assertLessEqual(period_driving, 11 * 60)
+                self.assertLessEqual(end - period_start, 14 * 60)
+
+
+class RoadGraphTests(TestCase):
+    """Tests for the memory-mapped road graph backend."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 30 x 30 grid of roads around Denver with a closed block in the middle
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(3)
+        nodes = os.path.join(cls.tmp.name, 'nodes.csv')
+        edges = os.path.join(cls.tmp.name, 'edges.csv')
+        with open(nodes, 'w') as f:
+            f.write('id,lat,lng\n')
+            for row in range(30):
+                for col in range(30):
+                    f.write(f'n{row}_{col},{39.0 + row * 0.05},{-105.5 + col * 0.05}\n')
+        with open(edges, 'w') as f:
+            f.write('from,to,miles,mph\n')
+            for row in range(30):
+                for col in range(30):
+                    if 10 <= row < 20 and 10 <= col < 20:
+                        continue
+                    for other in ((row + 1, col), (row, col + 1)):
+                        if 10 <= other[0] < 20 and 10 <= other[1] < 20 or max(other) >= 30:
+                            continue
+                        f.write(f'n{row}_{col},n{other[0]}_{other[1]},{rng.uniform(3.5, 5):.2f},{rng.uniform(35, 65):.0f}\n')
+        cls.path = os.path.join(cls.tmp.name, 'graph')
+        call_command('build_road_graph', nodes=nodes, edges=edges, output=cls.path, stdout=io.StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        road_graph.reset_road_graph()
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        road_graph.reset_road_graph()
+        self.graph = road_graph.RoadGraph(self.path)
+
+    def test_astar_matches_dijkstra(self):
+        """Test A* finds paths as fast as a plain Dijkstra search."""
+        dijkstra = road_graph.RoadGraph(self.path)
+        dijkstra.max_mph = float('inf')
+        rng = np.random.default_rng(4)
+        for source, target in rng.integers(0, len(self.graph), (30, 2)):
+            found = self.graph.shortest_path(int(source), int(target))
+            expected = dijkstra.shortest_path(int(source), int(target))
+            self.assertEqual(found is None, expected is None)
+            if found is not None:
+                self.assertAlmostEqual(
+                    float(self.graph.hours[found[1]].sum()), float(self.graph.hours[expected[1]].sum()), places=4
+                )
+                self.assertEqual(list(self.graph.targets[found[1]]), found[0][1:])
+
+    def test_graph_legs_in_plans(self):
+        """Test plans use graph miles and geometry, falling back off the graph."""
+        west = {'label': 'West', 'lat': 39.725, 'lng': -105.5}
+        east = {'label': 'East', 'lat': 39.725, 'lng': -104.05}
+        far = {'label': 'Chicago', 'lat': 41.8781, 'lng': -87.6298}
+        
+        with override_settings(ROUTING_BACKEND='graph', ROAD_GRAPH_PATH=self.path):
+            route = calculate_multi_stop_route([west, east, far])
+            plan = calculate_trip({
+                'current_location': west, 'pickup_location': east,
+                'dropoff_location': far, 'cycle_hours_used': 0
+            })
+        
+        graph_leg, far_leg = route['legs']
+        # The closed block forces a detour well past the road-factor estimate
+        self.assertGreater(graph_leg['distance'], haversine_distance(39.725, -105.5, 39.725, -104.05) * ROAD_FACTOR)
+        self.assertGreater(len(graph_leg['geometry']), 30)
+        self.assertNotIn('geometry', far_leg)
+        self.assertEqual(far_leg['distance'], round(haversine_distance(39.725, -104.05, 41.8781, -87.6298) * ROAD_FACTOR, 1))
+        self.assertEqual(plan['totalMiles'], round(route['total_distance']))
+        self.assertEqual(plan['route']['geometry'][:len(graph_leg['geometry'])], graph_leg['geometry'])
+
+    @override_settings(LEG_CACHE_ENABLED=True)
+    def test_graph_legs_use_shared_leg_cache(self):
+        """Test a routed leg is shared through the leg cache under the graph's checksum."""
+        west = {'label': 'West', 'lat': 39.725, 'lng': -105.5}
+        east = {'label': 'East', 'lat': 39.725, 'lng': -104.05}
+        caches['routes'].clear()
+        reset_leg_cache()
+        
+        with override_settings(ROUTING_BACKEND='graph', ROAD_GRAPH_PATH=self.path):
+            first = road_graph.route_legs([(west, east)])
+            reset_leg_cache()  # As seen by a fresh worker
+            with mock.patch.object(road_graph.RoadGraph, 'shortest_path') as search:
+                second = road_graph.route_legs([(west, east)])
+        
+        search.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertEqual(leg_cache_stats()['sharedHits'], 1)
+        key = f"route:{self.graph.checksum}:10.0:39.725,-105.5:39.725,-104.05"
+        self.assertEqual(caches['routes'].get(key), first[0])
+
+
+class DrivingLoopTests(TestCase):
+    """Tests for the driving loop across trip shapes."""
+
+    TRIPS = [
+        # Local
+        ({'label': 'A', 'lat': 40.7128, 'lng': -74.0060},
+         {'label': 'B', 'lat': 40.8, 'lng': -74.1},
+         {'label': 'C', 'lat': 40.9, 'lng': -74.2}, 0),
+        # Cross-country, several fuel stops
+        ({'label': 'Miami', 'lat': 25.7617, 'lng': -80.1918},
+         {'label': 'Seattle', 'lat': 47.6062, 'lng': -122.3321},
+         {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589}, 40),
+        # Pickup at the origin
+        ({'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+         {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+         {'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903}, 70),
+    ]
+
+    def test_logs_cover_each_day_and_all_driving(self):
+        """Test every day logs 24 hours and the days add up to the trip's driving."""
+        for origin, pickup, dropoff, cycle in self.TRIPS:
+            engine = HOSEngine(cycle)
+            plan = engine.calculate_trip({
+                'current_location': origin,
+                'pickup_location': pickup,
+                'dropoff_location': dropoff,
+                'cycle_hours_used': cycle,
+            })
+            
+            for day in plan['days']:
+                self.assertAlmostEqual(sum(day['log']['totals'].values()), 24, places=1)
+            driving = sum(a.end - a.start for a in engine.activities if a.type == 'driving')
+            self.assertAlmostEqual(driving / 60, plan['totalDrivingHours'], places=1)
+
+
 class APIEndpointTests(TestCase):
     """Tests for the REST API endpoints."""
 
@@ -275,3 +858,1106 @@ class APIEndpointTests(TestCase):
         )
         
         self.assertEqual(response.status_code, 400)
+
+
+class BatchPlanningTests(TestCase):
+    """Tests for batch trip planning."""
+
+    def setUp(self):
+        self.client = Client()
+        self.trip = {
+            'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+            'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'dropoff_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+            'cycle_hours_used': 10
+        }
+
+    @override_settings(TRIP_BATCH_WORKERS=2)
+    def test_pool_preserves_input_order(self):
+        """Test results come back in input order when spread over workers."""
+        items = []
+        for cycle in range(5):
+            item = dict(self.trip)
+            item['cycle_hours_used'] = cycle * 10
+            items.append(item)
+        
+        outcomes = plan_trips(items)
+        
+        self.assertEqual(len(outcomes), 5)
+        for item, outcome in zip(items, outcomes):
+            self.assertEqual(outcome['result'], calculate_trip(item))
+
+    def test_batch_reports_per_item_errors(self):
+        """Test one bad item does not fail the rest of the batch."""
+        bad = dict(self.trip)
+        bad['cycle_hours_used'] = 100
+        
+        response = self.client.post(
+            '/api/plan-trip/batch',
+            data=json.dumps({'trips': [self.trip, bad, 'not-a-trip', self.trip]}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['succeeded'], 2)
+        self.assertEqual(data['failed'], 2)
+        
+        results = data['results']
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertIn('result', results[0])
+        self.assertIn('cycle_hours_used', results[1]['errors'])
+        self.assertIn('non_field_errors', results[2]['errors'])
+        self.assertEqual(results[3]['result']['name'], 'NYC → DC')
+
+    def test_batch_rejects_empty_envelope(self):
+        """Test the batch endpoint requires a non-empty trips list."""
+        response = self.client.post(
+            '/api/plan-trip/batch',
+            data=json.dumps({'trips': []}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.json())
+
+    @override_settings(TRIP_BATCH_WORKERS=None, WEB_CONCURRENCY=4)
+    def test_pool_size_shares_cores_among_web_workers(self):
+        """Test each web worker's pool gets its share of the cores."""
+        with mock.patch('trips.services.batch_service.os.cpu_count', return_value=8):
+            self.assertEqual(get_pool_size(), 2)
+            with override_settings(WEB_CONCURRENCY=16):
+                self.assertEqual(get_pool_size(), 1)
+            with override_settings(TRIP_BATCH_WORKERS=3):
+                self.assertEqual(get_pool_size(), 3)
+
+
+class SweepTests(TestCase):
+    """Tests for what-if sweeps over start times and cycle hours."""
+
+    def setUp(self):
+        self.trip = {
+            'current_location': {'label': 'LA', 'lat': 34.05, 'lng': -118.24},
+            'pickup_location': {'label': 'Phoenix', 'lat': 33.45, 'lng': -112.07},
+            'dropoff_location': {'label': 'NYC', 'lat': 40.71, 'lng': -74.01},
+        }
+
+    def _sweep(self, **body):
+        return Client().post(
+            '/api/plan-trip/sweep', data=json.dumps(dict(self.trip, **body)),
+            content_type='application/json'
+        )
+
+    def test_route_calculated_once(self):
+        """Test every variant is scheduled on a single route calculation."""
+        with mock.patch(
+            'trips.services.sweep_service.calculate_multi_stop_route',
+            wraps=route_service.calculate_multi_stop_route
+        ) as calculate_route:
+            result = sweep_trip(self.trip, [6, 22], [0, 40, 65])
+        
+        calculate_route.assert_called_once()
+        self.assertEqual(
+            [(v['startTime'], v['cycleHoursUsed']) for v in result['variants']],
+            [('06:00', 0), ('06:00', 40), ('06:00', 65), ('22:00', 0), ('22:00', 40), ('22:00', 65)]
+        )
+
+    def test_variant_matches_full_plan(self):
+        """Test a 06:00 variant's plan is the plan /api/plan-trip would return."""
+        response = self._sweep(start_times=[6], cycle_hours=[65], include_plans=True)
+        
+        self.assertEqual(response.status_code, 200)
+        variant = response.json()['variants'][0]
+        plan = calculate_trip(dict(self.trip, cycle_hours_used=65))
+        self.assertEqual(json.loads(json.dumps(plan)), variant['plan'])
+        self.assertEqual(variant['totalDays'], plan['totalDays'])
+        self.assertEqual(variant['restarts'], plan['restarts'])
+        dropoff = [stop for day in plan['days'] for stop in day['stops'] if stop['type'] == 'dropoff'][-1]
+        self.assertEqual(variant['arrival'], {'day': dropoff['day'], 'time': dropoff['time']})
+
+    def test_later_start_shifts_the_day(self):
+        """Test the start time sets day 1's clock; summaries carry no plan by default."""
+        response = self._sweep(start_times=[0, 13.5], cycle_hours=[0])
+        
+        early, late = response.json()['variants']
+        self.assertNotIn('plan', early)
+        self.assertEqual(early['elapsedHours'], late['elapsedHours'])
+        
+        def arrival_minute(variant):
+            hours, minutes = variant['arrival']['time'].split(':')
+            return (variant['arrival']['day'] - 1) * 24 * 60 + int(hours) * 60 + int(minutes)
+        self.assertEqual(arrival_minute(late) - arrival_minute(early), 13 * 60 + 30)
+
+    @override_settings(TRIP_SWEEP_MAX_VARIANTS=4)
+    def test_grid_validation(self):
+        """Test the grid size limit and start times at or past midnight."""
+        response = self._sweep(start_times=[0, 6, 12], cycle_hours=[0, 10])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json()['errors'])
+        
+        response = self._sweep(start_times=[23.999], cycle_hours=[0])
+        self.assertIn('start_times', response.json()['errors'])
+
+
+class PlanCacheTests(TestCase):
+    """Tests for the whole-plan result cache."""
+
+    def setUp(self):
+        caches['plans'].clear()
+        plan_cache.reset_stats()
+        self.trip = {
+            'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+            'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'dropoff_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+            'cycle_hours_used': 10
+        }
+
+    def test_repeat_lane_is_served_from_cache(self):
+        """Test a repeated lane is a hit and matches a fresh calculation."""
+        first = plan_cache.get_or_calculate(self.trip)
+        second = plan_cache.get_or_calculate(self.trip)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(plan_cache.stats()['hits'], 1)
+        self.assertEqual(plan_cache.stats()['misses'], 1)
+
+    @override_settings(PLAN_CACHE_PRECISION=2)
+    def test_key_uses_rounded_coordinates_and_cycle(self):
+        """Test nearby coordinates share a key but cycle hours do not."""
+        nearby = json.loads(json.dumps(self.trip))
+        nearby['pickup_location']['lat'] += 0.001
+        other_cycle = dict(self.trip, cycle_hours_used=20)
+        
+        self.assertEqual(plan_cache.make_key(self.trip), plan_cache.make_key(nearby))
+        self.assertNotEqual(plan_cache.make_key(self.trip), plan_cache.make_key(other_cycle))
+
+    def test_engine_or_routing_change_misses(self):
+        """Test a new engine version or routing backend does not reuse cached plans."""
+        plan = plan_cache.get_or_calculate(self.trip)
+        graph = mock.Mock(checksum='0' * 40)
+        
+        with mock.patch('trips.services.plan_cache.ENGINE_VERSION', -1):
+            plan_cache.get_or_calculate(self.trip)
+        with override_settings(ROUTING_BACKEND='graph'), \
+                mock.patch('trips.services.road_graph.get_road_graph', return_value=graph):
+            plan_cache.get_or_calculate(self.trip, calculate=lambda data: plan)
+        plan_cache.get_or_calculate(self.trip)
+        
+        self.assertEqual(plan_cache.stats()['misses'], 3)
+        self.assertEqual(plan_cache.stats()['hits'], 1)
+
+    def test_hit_rebases_dates(self):
+        """Test dates in a cached plan are rebased on today."""
+        plan = plan_cache.get_or_calculate(self.trip)
+        key = plan_cache.make_key(self.trip)
+        for day in plan['days']:
+            day['date'] = '2000-01-01'
+        caches['plans'].set(key, plan)
+        
+        cached = plan_cache.get_or_calculate(self.trip)
+        
+        self.assertEqual(
+            [day['date'] for day in cached['days']],
+            [day['date'] for day in calculate_trip(self.trip)['days']]
+        )
+
+    def test_cache_stats_endpoint(self):
+        """Test cache counters are exposed over the API."""
+        plan_cache.get_or_calculate(self.trip)
+        
+        response = Client().get('/api/cache-stats')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['plans']['misses'], 1)
+
+
+class PlanCoalescingTests(TestCase):
+    """Tests for single-flight coalescing of concurrent plan misses."""
+
+    def setUp(self):
+        caches['plans'].clear()
+        plan_cache.reset_stats()
+        self.trip = {
+            'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+            'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'dropoff_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+            'cycle_hours_used': 10
+        }
+        self.calls = 0
+
+    def _slow_calculate(self, fail_first=False):
+        def calculate(data):
+            self.calls += 1
+            threading.Event().wait(0.2)
+            if fail_first and self.calls == 1:
+                raise RuntimeError('engine failed')
+            return calculate_trip(data)
+        return calculate
+
+    def _run_concurrently(self, calculate, count=8):
+        results = [None] * count
+        
+        def request(index):
+            try:
+                results[index] = plan_cache.get_or_calculate(self.trip, calculate)
+            except RuntimeError as e:
+                results[index] = e
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_requests_share_one_computation(self):
+        """Test identical concurrent misses run the engine once."""
+        calculate = self._slow_calculate()
+        results = self._run_concurrently(calculate)
+        
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(plan_cache.stats()['coalesced'], 7)
+
+    def test_failed_leader_hands_over(self):
+        """Test waiters retry when the leader fails, and only it sees the error."""
+        calculate = self._slow_calculate(fail_first=True)
+        results = self._run_concurrently(calculate)
+        
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sum(isinstance(result, RuntimeError) for result in results), 1)
+
+    @override_settings(PLAN_COALESCE_TIMEOUT=0.3)
+    def test_waits_for_another_workers_lock(self):
+        """Test a plan stored by the lock holder is used, and a stuck lock times out."""
+        key = plan_cache.make_key(self.trip)
+        plan = calculate_trip(self.trip)
+        calculate = mock.Mock(side_effect=calculate_trip)
+        
+        caches['plans'].add(f"{key}:lock", 'other-worker')
+        threading.Timer(0.1, caches['plans'].set, (key, plan)).start()
+        self.assertEqual(plan_cache.get_or_calculate(self.trip, calculate), plan)
+        calculate.assert_not_called()
+        
+        caches['plans'].delete(key)
+        self.assertEqual(plan_cache.get_or_calculate(self.trip, calculate), plan)
+        calculate.assert_called_once()
+
+    def test_async_requests_share_one_computation(self):
+        """Test identical concurrent async misses run the engine once."""
+        async def calculate(data):
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            return calculate_trip(data)
+        
+        async def run():
+            return await asyncio.gather(*(plan_cache.aget_or_calculate(self.trip, calculate) for _ in range(5)))
+        
+        results = asyncio.run(run())
+        
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+
+class PlanStoreTests(TestCase):
+    """Tests for the persistent plan store."""
+
+    def setUp(self):
+        caches['plans'].clear()
+        plan_store.reset_stats()
+        self.trip = {
+            'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+            'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+            'dropoff_location': {'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903},
+            'cycle_hours_used': 10
+        }
+
+    def test_stored_plan_matches_computed_plan(self):
+        """Test a plan rebuilt from its rows equals the computed one, in three queries."""
+        plan = calculate_trip(self.trip)
+        input_hash = plan_store.store_key(self.trip)
+        
+        self.assertTrue(plan_store.save_plan(input_hash, self.trip, plan))
+        self.assertFalse(plan_store.save_plan(input_hash, self.trip, plan))
+        with self.assertNumQueries(3):
+            stored = plan_store.find_plan(input_hash)
+        
+        self.assertEqual(stored, plan)
+        self.assertEqual(list(stored), list(plan))
+
+    def test_lookup_before_compute(self):
+        """Test a request evicted from the cache is served from the store."""
+        client = Client()
+        first = client.post('/api/plan-trip', data=json.dumps(self.trip), content_type='application/json')
+        caches['plans'].clear()
+        
+        with mock.patch('trips.views.calculate_trip') as calculate:
+            second = client.post('/api/plan-trip', data=json.dumps(self.trip), content_type='application/json')
+        
+        calculate.assert_not_called()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(plan_store.stats()['hits'], 1)
+        self.assertEqual(Plan.objects.count(), 1)
+
+    def test_key_covers_engine_and_configuration(self):
+        """Test plans stored by another engine version or routing setup are not served."""
+        key = plan_store.store_key(self.trip)
+        self.assertNotEqual(key, plan_cache.plan_hash(self.trip))
+        with mock.patch('trips.services.plan_cache.ENGINE_VERSION', -1):
+            self.assertNotEqual(plan_store.store_key(self.trip), key)
+        with override_settings(LEG_CACHE_ENABLED=True, LEG_CACHE_PRECISION=1):
+            self.assertNotEqual(plan_store.store_key(self.trip), key)
+    
+    def test_database_errors_fall_back_to_computing(self):
+        """Test a store without its tables still serves plans."""
+        with mock.patch.object(Plan.objects, 'filter', side_effect=OperationalError('no such table: trips_plan')), \
+                mock.patch.object(Plan.objects, 'create', side_effect=OperationalError('no such table: trips_plan')), \
+                self.assertLogs('trips.services.plan_store', 'WARNING'):
+            response = Client().post('/api/plan-trip', data=json.dumps(self.trip), content_type='application/json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totalDays'], calculate_trip(self.trip)['totalDays'])
+        self.assertEqual(plan_store.stats()['errors'], 2)
+        self.assertEqual(Plan.objects.count(), 0)
+    
+    def test_keyset_pagination(self):
+        """Test pages walk every plan newest first, with no repeats."""
+        plan = calculate_trip(self.trip)
+        for index in range(5):
+            plan_store.save_plan(f'{index:040d}', self.trip, plan)
+        
+        client = Client()
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = client.get('/api/plans', {'limit': 2, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            seen.extend(item['id'] for item in page['plans'])
+            cursor = page['nextCursor']
+        
+        self.assertEqual(seen, [f'{index:040d}' for index in reversed(range(5))])
+        self.assertEqual(client.get(f'/api/plans/{seen[0]}').json()['days'], plan['days'])
+        self.assertEqual(client.get('/api/plans/missing').status_code, 404)
+        self.assertEqual(client.get('/api/plans', {'cursor': 'bogus'}).status_code, 400)
+        self.assertEqual(client.get('/api/plans', {'limit': 0}).status_code, 400)
+
+
+class CompactResponseTests(TestCase):
+    """Tests for the version 2 response encoding and response compression."""
+
+    def setUp(self):
+        caches['plans'].clear()
+        self.trip = {
+            'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+            'pickup_location': {'label': 'Chicago', 'lat': 41.8781, 'lng': -87.6298},
+            'dropoff_location': {'label': 'Los Angeles', 'lat': 34.0522, 'lng': -118.2437},
+            'cycle_hours_used': 10
+        }
+
+    def _post(self, path, **extra):
+        return self.client.post(path, data=json.dumps(self.trip), content_type='application/json', **extra)
+
+    def test_polyline_round_trip(self):
+        """Test the polyline encoding against the reference example."""
+        points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+        
+        self.assertEqual(encode_polyline(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline(encode_polyline(points)), points)
+
+    def test_v2_carries_the_v1_plan(self):
+        """Test every stop, time and log interval decodes back to version 1."""
+        full = self._post('/api/plan-trip').json()
+        compact = self._post('/api/plan-trip?version=2').json()
+        locations = compact['locations']
+        
+        self.assertEqual(locations[compact['origin']], [40.7128, -74.006, 'NYC'])
+        self.assertEqual(
+            decode_polyline(compact['route']['waypoints']),
+            [[point['lat'], point['lng']] for point in full['route']['waypoints']]
+        )
+        self.assertEqual(compact['totalMiles'], full['totalMiles'])
+        self.assertEqual(compact['startDate'], full['days'][0]['date'])
+        for full_day, day in zip(full['days'], compact['days']):
+            for stop, (stop_type, location, minute, duration, mileage) in zip(full_day['stops'], day['stops']):
+                lat, lng, label = locations[location]
+                self.assertEqual((stop_type, label, mileage), (stop['type'], stop['location'], stop['mileage']))
+                self.assertAlmostEqual(lat, stop['lat'], places=5)
+                self.assertEqual(minute // 1440 + 1, stop['day'])
+                self.assertEqual('%02d:%02d' % divmod(minute % 1440, 60), stop['time'])
+                self.assertEqual(duration, round(stop['duration'] * 60))
+            self.assertEqual(
+                day['log']['driving'],
+                [round(value * 60) for entry in full_day['log']['driving'] for value in (entry['start'], entry['end'])]
+            )
+        
+        self.assertEqual(self._post('/api/plan-trip?version=3').status_code, 404)
+
+    def test_negotiated_compression(self):
+        """Test brotli is preferred, gzip is the fallback and q=0 is honoured."""
+        plain = self._post('/api/plan-trip')
+        brotli_response = self._post('/api/plan-trip', HTTP_ACCEPT_ENCODING='gzip, br')
+        gzip_response = self._post('/api/plan-trip', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(brotli_response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(brotli_response.content), plain.content)
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzip_response.content), plain.content)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        
+        # Too small to be worth it
+        health = self.client.get('/api/health', HTTP_ACCEPT_ENCODING='br')
+        self.assertNotIn('Content-Encoding', health)
+
+
+@override_settings(LEG_CACHE_ENABLED=True)
+class LegCacheTests(TestCase):
+    """Tests for the two-tier route-leg cache."""
+
+    NYC = {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060}
+    BOSTON = {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589}
+    DC = {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369}
+
+    def setUp(self):
+        caches['routes'].clear()
+        reset_leg_cache()
+
+    def test_repeat_route_hits_local_tier(self):
+        """Test a repeated route is served from the in-process LRU."""
+        first = calculate_route(self.NYC, self.BOSTON, self.DC)
+        second = calculate_route(self.NYC, self.BOSTON, self.DC)
+        stats = leg_cache_stats()
+        
+        self.assertEqual(first, second)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['localHits'], 2)
+        self.assertEqual(stats['hitRatio'], 0.5)
+
+    def test_shared_tier_serves_other_workers(self):
+        """Test a leg missing locally is taken from the shared backend."""
+        warmed = leg_distances([(self.NYC, self.BOSTON)])
+        reset_leg_cache()  # As seen by a fresh worker
+        
+        self.assertEqual(leg_distances([(self.NYC, self.BOSTON)]), warmed)
+        self.assertEqual(leg_cache_stats()['sharedHits'], 1)
+        self.assertEqual(leg_cache_stats()['misses'], 0)
+
+    @override_settings(LEG_CACHE_PRECISION=2)
+    def test_nearby_points_share_a_leg(self):
+        """Test coordinates equal after rounding share one entry."""
+        nearby = dict(self.BOSTON, lat=self.BOSTON['lat'] + 0.001)
+        
+        self.assertEqual(
+            leg_distances([(self.NYC, self.BOSTON)]),
+            leg_distances([(self.NYC, nearby)])
+        )
+        self.assertEqual(leg_cache_stats()['localHits'], 1)
+
+    def test_distance_matches_road_factored_haversine(self):
+        """Test cached distances agree with the uncached formula."""
+        [miles] = leg_distances([(self.NYC, self.DC)])
+        expected = haversine_distance(
+            self.NYC['lat'], self.NYC['lng'], self.DC['lat'], self.DC['lng']
+        ) * ROAD_FACTOR
+        
+        self.assertAlmostEqual(miles, expected, delta=0.05)
+
+    @override_settings(LEG_CACHE_LOCAL_SIZE=2)
+    def test_lru_evicts_oldest_leg(self):
+        """Test the local tier is bounded and counts evictions."""
+        with mock.patch.object(route_service, '_leg_cache', None):
+            leg_distances([(self.NYC, self.BOSTON), (self.BOSTON, self.DC), (self.DC, self.NYC)])
+            stats = leg_cache_stats()
+        
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['localSize'], 2)
+
+    def test_cache_stats_endpoint_includes_legs(self):
+        """Test leg counters are exposed next to plan counters."""
+        calculate_route(self.NYC, self.BOSTON, self.DC)
+        
+        response = Client().get('/api/cache-stats')
+        
+        self.assertEqual(response.json()['legs']['misses'], 2)
+
+
+class DistanceMatrixTests(TestCase):
+    """Tests for the vectorized distance matrix."""
+
+    TRUCKS = [
+        {'lat': 40.7128, 'lng': -74.0060},
+        {'lat': 41.8781, 'lng': -87.6298},
+        {'lat': 34.0522, 'lng': -118.2437},
+    ]
+    PICKUPS = [
+        {'lat': 42.3601, 'lng': -71.0589},
+        {'lat': 39.7392, 'lng': -104.9903},
+    ]
+
+    def test_matches_scalar_haversine(self):
+        """Test every cell matches the scalar function with the road factor."""
+        matrix = distance_matrix(self.TRUCKS, self.PICKUPS)
+        
+        self.assertEqual(matrix['distances'].shape, (3, 2))
+        for i, truck in enumerate(self.TRUCKS):
+            for j, pickup in enumerate(self.PICKUPS):
+                miles = haversine_distance(
+                    truck['lat'], truck['lng'], pickup['lat'], pickup['lng']
+                ) * ROAD_FACTOR
+                self.assertAlmostEqual(matrix['distances'][i, j], miles, places=6)
+                self.assertAlmostEqual(matrix['durations'][i, j], miles / 55, places=6)
+
+    def test_distance_matrix_endpoint(self):
+        """Test the endpoint returns an origins x destinations matrix."""
+        response = Client().post(
+            '/api/distance-matrix',
+            data=json.dumps({'origins': self.TRUCKS, 'destinations': self.PICKUPS}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['distances']), 3)
+        self.assertEqual(len(data['durations'][0]), 2)
+
+    def test_distance_matrix_without_numpy(self):
+        """Test the endpoint answers 501 where the optional numpy is not installed."""
+        with mock.patch.dict('sys.modules', {'numpy': None}):
+            response = Client().post(
+                '/api/distance-matrix',
+                data=json.dumps({'origins': self.TRUCKS, 'destinations': self.PICKUPS}),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(DISTANCE_MATRIX_MAX_CELLS=4)
+    def test_distance_matrix_size_limit(self):
+        """Test oversized matrices are rejected."""
+        response = Client().post(
+            '/api/distance-matrix',
+            data=json.dumps({'origins': self.TRUCKS, 'destinations': self.PICKUPS}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_list_rejected_before_item_validation(self):
+        """Test a list longer than the cell limit is refused without validating its items."""
+        from django.conf import settings
+        origins = [{'lat': 0, 'lng': 0}] * (settings.DISTANCE_MATRIX_MAX_CELLS + 1)
+        with mock.patch.object(CoordinateSerializer, 'run_validation') as validate_item:
+            serializer = DistanceMatrixRequestSerializer(data={'origins': origins, 'destinations': self.PICKUPS[:1]})
+            self.assertFalse(serializer.is_valid())
+        
+        self.assertEqual(serializer.errors['origins']['non_field_errors'][0].code, 'max_length')
+        # Only the one destination was validated
+        self.assertEqual(validate_item.call_count, 1)
+
+
+class StreamingPlanTests(TestCase):
+    """Tests for NDJSON plan streaming."""
+
+    TRIP = {
+        'current_location': {'label': 'Miami', 'lat': 25.7617, 'lng': -80.1918},
+        'pickup_location': {'label': 'Seattle', 'lat': 47.6062, 'lng': -122.3321},
+        'dropoff_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+        'cycle_hours_used': 0
+    }
+
+    def _lines(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_days_emitted_before_schedule_finishes(self):
+        """Test each day is yielded while the engine is still scheduling."""
+        engine = HOSEngine()
+        items = engine.iter_trip(self.TRIP)
+        
+        kind, day = next(items)
+        
+        self.assertEqual(kind, 'day')
+        self.assertEqual(day['day'], 1)
+        self.assertEqual(engine.current_day, 2)
+
+    def test_stream_matches_full_plan(self):
+        """Test streamed days and summary reassemble into the full plan."""
+        response = Client().post(
+            '/api/plan-trip/stream',
+            data=json.dumps(self.TRIP),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self._lines(response)
+        plan = calculate_trip(self.TRIP)
+        
+        self.assertEqual([l['type'] for l in lines[:-1]], ['day'] * plan['totalDays'])
+        self.assertEqual([l['data'] for l in lines[:-1]], plan['days'])
+        summary = lines[-1]
+        self.assertEqual(summary['type'], 'summary')
+        self.assertEqual(summary['data']['totalMiles'], plan['totalMiles'])
+        self.assertNotIn('days', summary['data'])
+
+    def test_batch_stream_in_input_order(self):
+        """Test batch streaming emits one line per item, then a summary."""
+        bad = dict(self.TRIP, cycle_hours_used=-1)
+        
+        response = Client().post(
+            '/api/plan-trip/batch/stream',
+            data=json.dumps({'trips': [self.TRIP, bad]}),
+            content_type='application/json'
+        )
+        
+        lines = self._lines(response)
+        self.assertEqual([(l['type'], l.get('index')) for l in lines],
+                         [('item', 0), ('item', 1), ('summary', None)])
+        self.assertIn('result', lines[0])
+        self.assertIn('errors', lines[1])
+        self.assertEqual(lines[2]['failed'], 1)
+
+
+class AsyncViewTests(TestCase):
+    """Tests for the native async views and bounded executor."""
+
+    TRIP = {
+        'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+        'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+        'dropoff_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+        'cycle_hours_used': 10
+    }
+
+    def test_bounded_executor_refuses_when_full(self):
+        """Test work beyond workers plus queue depth is refused."""
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        
+        running = executor.submit(release.wait)
+        queued = executor.submit(release.wait)
+        with self.assertRaises(ExecutorFull):
+            executor.submit(release.wait)
+        
+        release.set()
+        running.result()
+        queued.result()
+        executor.submit(lambda: None).result()
+        executor.shutdown()
+
+    async def test_async_health(self):
+        """Test the async health check."""
+        response = await AsyncClient().get('/api/async/health')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ok')
+
+    async def test_async_plan_trip(self):
+        """Test the async view returns the same plan as the engine."""
+        response = await AsyncClient().post(
+            '/api/async/plan-trip',
+            data=json.dumps(self.TRIP),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totalMiles'], calculate_trip(self.TRIP)['totalMiles'])
+
+    async def test_async_plan_trip_validation(self):
+        """Test the async view reports serializer errors."""
+        response = await AsyncClient().post(
+            '/api/async/plan-trip',
+            data=json.dumps({'cycle_hours_used': 10}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pickup_location', response.json()['errors'])
+
+    @override_settings(PLAN_CACHE_ENABLED=False)
+    async def test_async_plan_trip_busy(self):
+        """Test a saturated executor yields a fast 503."""
+        full = mock.Mock()
+        full.submit.side_effect = ExecutorFull()
+        
+        with mock.patch('trips.async_views.get_plan_executor', return_value=full):
+            response = await AsyncClient().post(
+                '/api/async/plan-trip',
+                data=json.dumps(self.TRIP),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(PLAN_CACHE_ENABLED=False, PLAN_STORE_ENABLED=True, METRICS_ENABLED=True)
+    async def test_async_plan_trip_uses_store_and_metrics(self):
+        """Test the async view serves stored plans and records metrics like the sync view."""
+        await sync_to_async(metrics.reset)()
+        client = AsyncClient()
+        first = await client.post('/api/async/plan-trip', data=json.dumps(self.TRIP), content_type='application/json')
+        
+        with mock.patch('trips.async_views.calculate_trip') as calculate:
+            second = await client.post('/api/async/plan-trip', data=json.dumps(self.TRIP), content_type='application/json')
+        
+        calculate.assert_not_called()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(await Plan.objects.acount(), 1)
+        collected = metrics.collect(all_workers=False)
+        self.assertEqual(collected['histograms']['planTripLatency']['count'], 2)
+        self.assertEqual(collected['counters']['requests'], {'async-plan-trip:200': 2})
+
+    def test_asgi_startup_loads_truck_stops(self):
+        """Test the ASGI entry point loads the truck-stop index before serving."""
+        import importlib
+        from config import asgi
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,lat,lng\nTS,39.0,-105.0\n')
+        self.addCleanup(os.unlink, f.name)
+        self.addCleanup(truck_stops.reset_truck_stop_index)
+        truck_stops.reset_truck_stop_index()
+        
+        with override_settings(TRUCK_STOPS_FILE=f.name), \
+                mock.patch('trips.services.truck_stops.TruckStopIndex.from_csv',
+                           wraps=truck_stops.TruckStopIndex.from_csv) as load:
+            importlib.reload(asgi)
+            truck_stops.get_truck_stop_index()
+        
+        load.assert_called_once_with(f.name)
+
+
+class BenchmarkSuiteTests(TestCase):
+    """Tests for the benchmark_hos regression check."""
+
+    def _results(self, seconds, allocated):
+        return {'cases': {'regional': {'calculate_trip': {
+            'seconds': seconds, 'allocated_bytes': allocated,
+        }}}}
+
+    def test_regression_detected_past_threshold(self):
+        """Test slowdowns beyond the threshold are flagged, others are not."""
+        from .management.commands.benchmark_hos import find_regressions
+        baseline = self._results(0.001, 4096)
+        
+        self.assertEqual(find_regressions(self._results(0.0011, 4096), baseline, 0.2), [])
+        self.assertEqual(
+            find_regressions(self._results(0.002, 4096), baseline, 0.2),
+            [('regional', 'calculate_trip', 'seconds', 0.001, 0.002)]
+        )
+
+    def test_command_fails_on_regression(self):
+        """Test the command writes JSON and fails against a faster baseline."""
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_path = os.path.join(tmp, 'baseline.json')
+            output_path = os.path.join(tmp, 'run.json')
+            with open(baseline_path, 'w') as f:
+                json.dump(self._results(0.001, 4096), f)
+            
+            with mock.patch(
+                'trips.management.commands.benchmark_hos.run_suite',
+                return_value=self._results(0.005, 4096)
+            ):
+                with self.assertRaises(CommandError):
+                    call_command('benchmark_hos', output=output_path,
+                                 baseline=baseline_path, stdout=io.StringIO())
+            
+            with open(output_path) as f:
+                self.assertEqual(json.load(f)['cases']['regional']['calculate_trip']['seconds'], 0.005)
+
+
+class StartupProfileTests(TestCase):
+    """Tests for the API-only settings profile and bench_startup."""
+
+    def test_both_profiles_serve_plans(self):
+        """Test each profile cold-starts and plans a trip; the API one loads less."""
+        out = io.StringIO()
+        call_command('bench_startup', runs=1, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        
+        full = report['config.settings']
+        lean = report['config.settings_api']
+        self.assertGreater(full['firstRequestMs'], 0)
+        self.assertGreater(lean['firstRequestMs'], 0)
+        self.assertLess(lean['modules'], full['modules'])
+
+
+class FleetSimulationTests(TestCase):
+    """Tests for the vectorized fleet simulation."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.distances = np.round(np.stack([
+            rng.uniform(0, 150, (40, 12)),
+            rng.uniform(50, 1500, (40, 12)),
+        ], axis=-1), 1)
+        self.cycle_hours = rng.integers(0, 71, 40).astype(float)
+
+    def test_matches_scalar_engine(self):
+        """Test every driver's report matches HOSEngine run load by load."""
+        report = simulate(self.distances, cycle_hours=self.cycle_hours, days=14)
+        
+        for index in range(len(self.distances)):
+            reference = simulate_driver_scalar(
+                self.distances[index], cycle_hours=self.cycle_hours[index], days=14
+            )
+            for key, expected in reference.items():
+                self.assertAlmostEqual(report[key][index], expected, places=6, msg=f"driver {index} {key}")
+            self.assertEqual(report['cycleHours'][index], reference['cycleHours'])
+
+    def test_single_load_matches_calculate_trip(self):
+        """Test one load reproduces calculate_trip's totals for a real lane."""
+        trip = {
+            'current_location': {'label': 'Chicago', 'lat': 41.8781, 'lng': -87.6298},
+            'pickup_location': {'label': 'Indianapolis', 'lat': 39.7684, 'lng': -86.1581},
+            'dropoff_location': {'label': 'Denver', 'lat': 39.7392, 'lng': -104.9903},
+            'cycle_hours_used': 20
+        }
+        legs = calculate_route(
+            trip['current_location'], trip['pickup_location'], trip['dropoff_location']
+        )['legs']
+        plan = calculate_trip(trip)
+        
+        report = simulate([[[leg['distance'] for leg in legs]]], cycle_hours=[20], days=1)
+        
+        self.assertEqual(round(report['drivingHours'][0], 1), plan['totalDrivingHours'])
+        self.assertEqual(round(report['onDutyHours'][0], 1), plan['totalOnDutyHours'])
+        self.assertEqual(round(report['cycleHours'][0], 1), plan['cycleHoursActual'])
+        self.assertEqual(report['day'][0], plan['totalDays'] + 1)
+
+    def test_horizon_and_cycle_restarts(self):
+        """Test no load starts past the horizon and a full cycle forces a restart."""
+        report = simulate(self.distances, cycle_hours=np.full(40, 65.0), days=3)
+        
+        self.assertTrue((report['day'] <= 3 + 12).all())
+        self.assertTrue((report['loadsCompleted'] >= 1).all())
+        self.assertTrue((report['loadsCompleted'] < 12).all())
+        self.assertTrue((report['restarts'] >= 1).all())
+        # Only on-duty time at a stop can still run past 70 hours
+        self.assertTrue((report['excessHours'][report['cycleViolations'] == 0] == 0).all())
+        self.assertTrue((report['excessHours'] <= report['cycleViolations'] * 2).all())
+
+    def test_command_verifies_sample(self):
+        """Test the command runs and verifies sampled drivers."""
+        out = io.StringIO()
+        call_command('simulate_fleet', drivers=20, days=7, loads=8, verify=5, stdout=out)
+        
+        self.assertIn('5 sampled drivers match HOSEngine', out.getvalue())
+
+
+class ServerTimingTests(TestCase):
+    """Tests for per-stage plan-trip timing."""
+
+    TRIP = {
+        'current_location': {'label': 'NYC', 'lat': 40.7128, 'lng': -74.0060},
+        'pickup_location': {'label': 'Boston', 'lat': 42.3601, 'lng': -71.0589},
+        'dropoff_location': {'label': 'DC', 'lat': 38.9072, 'lng': -77.0369},
+        'cycle_hours_used': 10
+    }
+
+    def _post(self):
+        return Client().post(
+            '/api/plan-trip',
+            data=json.dumps(self.TRIP),
+            content_type='application/json'
+        )
+
+    def test_engine_records_stage_timings(self):
+        """Test the engine fills in route, schedule and grouping timings."""
+        timings = {}
+        calculate_trip(self.TRIP, timings=timings)
+        
+        self.assertEqual(set(timings), {'route', 'schedule', 'grouping'})
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    @override_settings(PLAN_TIMING_ENABLED=True, PLAN_CACHE_ENABLED=False)
+    def test_server_timing_header_and_log(self):
+        """Test timings are sent as Server-Timing and logged as JSON."""
+        with self.assertLogs('trips.timing', level='INFO') as logs:
+            response = self._post()
+        
+        self.assertEqual(response.status_code, 200)
+        stages = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        for stage in ('parse', 'validation', 'route', 'schedule', 'grouping', 'render', 'total'):
+            self.assertIn(stage, stages)
+        
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['event'], 'plan_trip_timing')
+        self.assertIn('schedule', line['stages_ms'])
+
+    @override_settings(PLAN_TIMING_ENABLED=False)
+    def test_no_timing_when_disabled(self):
+        """Test no header is added when timing is off."""
+        response = self._post()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(METRICS_ENABLED=True, PLAN_CACHE_ENABLED=False, PLAN_STORE_ENABLED=False)
+class MetricsTests(TestCase):
+    """Tests for the metrics registry and endpoint."""
+
+    TRIP = ServerTimingTests.TRIP
+
+    def setUp(self):
+        metrics.reset()
+
+    def _post(self):
+        return Client().post(
+            '/api/plan-trip',
+            data=json.dumps(self.TRIP),
+            content_type='application/json'
+        )
+
+    def test_plan_trip_records_latency_and_plan_size(self):
+        """Test a plan records request latency, engine time and plan size."""
+        plan = self._post().json()
+        
+        histograms = metrics.collect(all_workers=False)['histograms']
+        self.assertEqual(histograms['planTripLatency']['count'], 1)
+        self.assertEqual(histograms['engineTime']['count'], 1)
+        self.assertEqual(histograms['planDays']['sum'], plan['totalDays'])
+        self.assertEqual(
+            histograms['planStops']['sum'],
+            sum(len(day['stops']) for day in plan['days'])
+        )
+        self.assertGreaterEqual(histograms['engineTime']['p50'], 0)
+
+    def test_errors_are_counted_by_type(self):
+        """Test an engine failure is counted by endpoint and type."""
+        with mock.patch('trips.views.calculate_trip', side_effect=KeyError('lat')):
+            with self.assertLogs('trips.views', level='ERROR'):
+                response = self._post()
+        
+        self.assertEqual(response.status_code, 500)
+        counters = metrics.collect(all_workers=False)['counters']
+        self.assertEqual(counters['errors'], {'plan-trip:KeyError': 1})
+        self.assertEqual(counters['requests'], {'plan-trip:500': 1})
+
+    def test_collect_sums_published_workers(self):
+        """Test snapshots published by other workers are added in."""
+        other = {
+            'histograms': {'planDays': {'counts': [0, 3] + [0] * 9, 'count': 3, 'sum': 6.0}},
+            'counters': {'errors': {'replan:ValueError': 2}},
+        }
+        caches['metrics'].set('metrics:worker:other', other)
+        caches['metrics'].set(metrics.INDEX_KEY, ['metrics:worker:other'])
+        metrics.observe('planDays', 1)
+        metrics.record_error('replan', ValueError())
+        
+        collected = metrics.collect()
+        
+        self.assertEqual(collected['workers'], 2)
+        self.assertEqual(collected['counters']['errors'], {'replan:ValueError': 3})
+        days = collected['histograms']['planDays']
+        self.assertEqual(days['count'], 4)
+        self.assertEqual(days['buckets']['1'], 1)
+        self.assertEqual(days['buckets']['2'], 3)
+        # Rank 2 of 4 falls a third of the way into the (1, 2] bucket
+        self.assertAlmostEqual(days['p50'], 1 + 1 / 3, places=5)
+
+    def test_metrics_endpoint(self):
+        """Test GET /api/metrics returns every histogram."""
+        self._post()
+        response = Client().get('/api/metrics?scope=worker')
+        
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['workers'], 1)
+        self.assertEqual(set(body['histograms']), set(metrics.HISTOGRAMS))
+        self.assertEqual(body['counters']['requests'], {'plan-trip:200': 1})
+
+
+class FastPathTests(TestCase):
+    """Tests for the compiled validator and the orjson renderer/parser."""
+
+    VALID_LOCATION = {'label': 'Chicago, IL', 'lat': 41.8781, 'lng': -87.6298}
+
+    # Values tried in every location and cycle field
+    ODD_VALUES = [
+        None, '', '   ', ' Chicago ', 'a' * 201, 'a\x00b', 0, -91, 91, 181, 45.5,
+        True, [], {}, '12', '12.5', '1.0', '1e3', 'abc', 70, 71, 1.0, 1.5,
+        float('nan'), 1e500, '9' * 1001,
+    ]
+
+    def _payloads(self):
+        base = {
+            'current_location': dict(self.VALID_LOCATION),
+            'pickup_location': dict(self.VALID_LOCATION),
+            'dropoff_location': dict(self.VALID_LOCATION),
+            'cycle_hours_used': 10,
+        }
+        yield base
+        yield {}
+        stop = {**self.VALID_LOCATION, 'type': 'pickup', 'duration': 0.5}
+        yield {**base, 'stops': [stop, self.VALID_LOCATION]}
+        for value in self.ODD_VALUES + ['lunch', 'dropoff', -1, 25]:
+            yield {**base, 'stops': value}
+            yield {**base, 'stops': [stop, {**stop, 'type': value}, {**stop, 'duration': value}]}
+        for field in base:
+            payload = dict(base)
+            del payload[field]
+            yield payload
+            for value in self.ODD_VALUES:
+                yield {**base, field: value}
+        for key in ('label', 'lat', 'lng'):
+            location = dict(self.VALID_LOCATION)
+            del location[key]
+            yield {**base, 'pickup_location': location}
+            for value in self.ODD_VALUES:
+                yield {**base, 'pickup_location': {**self.VALID_LOCATION, key: value}}
+
+    def test_validator_matches_serializer(self):
+        """Test the compiled validator agrees with the serializer on data and errors."""
+        for payload in self._payloads():
+            serializer = PlanTripRequestSerializer(data=payload)
+            validated, errors = validate_plan_trip(payload)
+            
+            if serializer.is_valid():
+                self.assertIsNone(errors, payload)
+                self.assertEqual(validated, serializer.validated_data)
+            else:
+                self.assertIsNone(validated, payload)
+                self.assertEqual(errors, serializer.errors)
+                # Error codes are part of the contract too
+                self.assertEqual(
+                    json.dumps(errors, default=lambda e: e.code),
+                    json.dumps(serializer.errors, default=lambda e: e.code)
+                )
+
+    def test_validator_falls_back_for_non_objects(self):
+        """Test non-object payloads get the serializer's own errors."""
+        for payload in ([], 'trip', 3):
+            validated, errors = validate_plan_trip(payload)
+            serializer = PlanTripRequestSerializer(data=payload)
+            serializer.is_valid()
+            self.assertIsNone(validated)
+            self.assertEqual(errors, serializer.errors)
+
+    def test_renderer_round_trip(self):
+        """Test the orjson renderer and parser round-trip a plan."""
+        plan = calculate_trip({
+            'current_location': self.VALID_LOCATION,
+            'pickup_location': {'label': 'Indianapolis, IN', 'lat': 39.7684, 'lng': -86.1581},
+            'dropoff_location': {'label': 'Nashville, TN', 'lat': 36.1627, 'lng': -86.7816},
+            'cycle_hours_used': 20,
+        })
+        
+        body = ORJSONRenderer().render(plan)
+        
+        self.assertEqual(json.loads(body), plan)
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), plan)
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_renderer_handles_error_details(self):
+        """Test serializer errors render like the stock renderer."""
+        _, errors = validate_plan_trip({})
+        
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render({'errors': errors})),
+            {'errors': json.loads(json.dumps(errors))}
+        )
+
+    def test_parser_rejects_invalid_json(self):
+        """Test malformed bodies raise a ParseError."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"cycle_hours_used": NaN}'))
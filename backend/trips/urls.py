@@ -3,9 +3,36 @@ Trip API URLs.
 """
 
 from django.urls import path
-from .views import PlanTripView, HealthCheckView
+from . import async_views
+from .views import (
+    PlanTripView,
+    PlanTripBatchView,
+    PlanTripStreamView,
+    PlanTripBatchStreamView,
+    PlanTripSweepView,
+    ReplanTripView,
+    PlanListView,
+    PlanDetailView,
+    DistanceMatrixView,
+    CacheStatsView,
+    MetricsView,
+    HealthCheckView,
+)
 
 urlpatterns = [
     path('health', HealthCheckView.as_view(), name='health'),
     path('plan-trip', PlanTripView.as_view(), name='plan-trip'),
+    path('plan-trip/stream', PlanTripStreamView.as_view(), name='plan-trip-stream'),
+    path('plan-trip/batch', PlanTripBatchView.as_view(), name='plan-trip-batch'),
+    path('plan-trip/batch/stream', PlanTripBatchStreamView.as_view(), name='plan-trip-batch-stream'),
+    path('plan-trip/sweep', PlanTripSweepView.as_view(), name='plan-trip-sweep'),
+    path('replan', ReplanTripView.as_view(), name='replan'),
+    path('plans', PlanListView.as_view(), name='plans'),
+    path('plans/<str:plan_id>', PlanDetailView.as_view(), name='plan-detail'),
+    path('distance-matrix', DistanceMatrixView.as_view(), name='distance-matrix'),
+    path('cache-stats', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    # Native async views for ASGI deployments
+    path('async/health', async_views.health, name='async-health'),
+    path('async/plan-trip', async_views.plan_trip, name='async-plan-trip'),
 ]
@@ -0,0 +1,354 @@
+"""
+Precompiled request validators.
+
+compile_serializer() turns a plain DRF Serializer class into a single
+function that validates a parsed JSON payload. Field options and error
+messages are read from the serializer once, up front, so each request only
+runs a few direct type checks and comparisons instead of DRF's generic
+field machinery. Valid input yields the same validated data, and invalid
+input the same error structure (messages and codes), as
+serializer.is_valid().
+
+Only the field types the plan-trip payload uses are compiled (char, float,
+integer, nested and many=True serializers); any other field, or a nested
+serializer with custom validation hooks, falls back to DRF's own
+run_validation for that part of the payload. The top-level serializer's
+validate() runs on the compiled fields' output, as in is_valid().
+"""
+
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.fields import SkipField, empty
+from rest_framework.settings import api_settings
+from rest_framework.utils import html
+
+from .serializers import PlanTripRequestSerializer
+
+
+class _Invalid(Exception):
+    """Carries a field's error detail out of a compiled validator."""
+
+    def __init__(self, detail):
+        self.detail = detail
+
+
+def _error(message: str, code: str) -> ErrorDetail:
+    return ErrorDetail(message, code=code)
+
+
+def _compile_fallback(field: serializers.Field) -> Callable[[Any], Any]:
+    """Validate with DRF itself, translating its errors."""
+    def validate(data):
+        try:
+            return field.run_validation(data)
+        except ValidationError as exc:
+            raise _Invalid(exc.detail)
+    return validate
+
+
+def _range_checks(field: serializers.Field):
+    """Compiled max_value/min_value checks, in the order DRF runs them."""
+    checks = []
+    if field.max_value is not None:
+        checks.append((
+            lambda value, limit=field.max_value: value > limit,
+            _error(field.error_messages['max_value'].format(max_value=field.max_value), 'max_value'),
+        ))
+    if field.min_value is not None:
+        checks.append((
+            lambda value, limit=field.min_value: value < limit,
+            _error(field.error_messages['min_value'].format(min_value=field.min_value), 'min_value'),
+        ))
+    return checks
+
+
+def _run_checks(checks, value):
+    errors = [error for failed, error in checks if failed(value)]
+    if errors:
+        raise _Invalid(errors)
+    return value
+
+
+def _compile_char(field: serializers.CharField) -> Callable[[Any], Any]:
+    messages = field.error_messages
+    trim = field.trim_whitespace
+    allow_blank = field.allow_blank
+    allow_null = field.allow_null
+    required_error = [_error(messages['required'], 'required')]
+    null_error = [_error(messages['null'], 'null')]
+    blank_error = [_error(messages['blank'], 'blank')]
+    invalid_error = [_error(messages['invalid'], 'invalid')]
+
+    checks = []
+    if field.max_length is not None:
+        checks.append((
+            lambda value, limit=field.max_length: len(value) > limit,
+            _error(messages['max_length'].format(max_length=field.max_length), 'max_length'),
+        ))
+    if field.min_length is not None:
+        checks.append((
+            lambda value, limit=field.min_length: len(value) < limit,
+            _error(messages['min_length'].format(min_length=field.min_length), 'min_length'),
+        ))
+    checks.append((
+        lambda value: '\x00' in value,
+        _error('Null characters are not allowed.', 'null_characters_not_allowed'),
+    ))
+    fallback = _compile_fallback(field)
+
+    def validate(data):
+        if data is empty:
+            if field.required:
+                raise _Invalid(required_error)
+            return fallback(data)
+        if data is None:
+            if not allow_null:
+                raise _Invalid(null_error)
+            return None
+        if data == '' or (trim and str(data).strip() == ''):
+            if not allow_blank:
+                raise _Invalid(blank_error)
+            return ''
+        if isinstance(data, bool) or not isinstance(data, (str, int, float)):
+            raise _Invalid(invalid_error)
+
+        value = str(data)
+        if trim:
+            value = value.strip()
+        errors = [error for failed, error in checks if failed(value)]
+        for ch in value:
+            if 0xD800 <= ord(ch) <= 0xDFFF:
+                errors.append(_error(
+                    f'Surrogate characters are not allowed: U+{ord(ch):X}.',
+                    'surrogate_characters_not_allowed'
+                ))
+                break
+        if errors:
+            raise _Invalid(errors)
+        return value
+
+    return validate
+
+
+def _compile_number(field: serializers.Field, convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    messages = field.error_messages
+    allow_null = field.allow_null
+    max_string_length = field.MAX_STRING_LENGTH
+    required_error = [_error(messages['required'], 'required')]
+    null_error = [_error(messages['null'], 'null')]
+    too_long_error = [_error(messages['max_string_length'], 'max_string_length')]
+    checks = _range_checks(field)
+    fallback = _compile_fallback(field)
+
+    def validate(data):
+        if data is empty:
+            if field.required:
+                raise _Invalid(required_error)
+            return fallback(data)
+        if data is None:
+            if not allow_null:
+                raise _Invalid(null_error)
+            return None
+        if isinstance(data, str) and len(data) > max_string_length:
+            raise _Invalid(too_long_error)
+        return _run_checks(checks, convert(data))
+
+    return validate
+
+
+def _compile_float(field: serializers.FloatField) -> Callable[[Any], Any]:
+    invalid_error = [_error(field.error_messages['invalid'], 'invalid')]
+    overflow_error = [_error(field.error_messages['overflow'], 'overflow')]
+
+    def convert(data):
+        try:
+            return float(data)
+        except (TypeError, ValueError):
+            raise _Invalid(invalid_error)
+        except OverflowError:
+            raise _Invalid(overflow_error)
+
+    return _compile_number(field, convert)
+
+
+def _compile_integer(field: serializers.IntegerField) -> Callable[[Any], Any]:
+    invalid_error = [_error(field.error_messages['invalid'], 'invalid')]
+    re_decimal = field.re_decimal
+
+    def convert(data):
+        try:
+            return int(re_decimal.sub('', str(data)))
+        except (ValueError, TypeError):
+            raise _Invalid(invalid_error)
+
+    return _compile_number(field, convert)
+
+
+def _has_custom_validation(serializer: serializers.Serializer) -> bool:
+    if type(serializer).validate is not serializers.Serializer.validate:
+        return True
+    if serializer.validators:
+        return True
+    return any(
+        hasattr(serializer, f'validate_{name}') for name in serializer.fields
+    )
+
+
+def _compile_fields(serializer: serializers.Serializer) -> Callable[[Mapping], Dict]:
+    """Compile the field loop of Serializer.to_internal_value."""
+    compiled = [
+        (field.field_name, _compile_field(field))
+        for field in serializer._writable_fields
+    ]
+
+    def validate(data):
+        ret = {}
+        errors = {}
+        for name, validate_field in compiled:
+            try:
+                ret[name] = validate_field(data.get(name, empty))
+            except _Invalid as exc:
+                errors[name] = exc.detail
+            except SkipField:
+                pass
+        if errors:
+            raise _Invalid(errors)
+        return ret
+
+    return validate
+
+
+def _compile_nested(field: serializers.Serializer) -> Callable[[Any], Any]:
+    messages = field.error_messages
+    required_error = [_error(messages['required'], 'required')]
+    null_error = [_error(messages['null'], 'null')]
+    invalid_message = messages['invalid']
+    validate_fields = _compile_fields(field)
+    fallback = _compile_fallback(field)
+
+    def validate(data):
+        if data is empty:
+            if field.required:
+                raise _Invalid(required_error)
+            return fallback(data)
+        if data is None:
+            if not field.allow_null:
+                raise _Invalid(null_error)
+            return None
+        if not isinstance(data, Mapping):
+            raise _Invalid({api_settings.NON_FIELD_ERRORS_KEY: [
+                _error(invalid_message.format(datatype=type(data).__name__), 'invalid')
+            ]})
+        return validate_fields(data)
+
+    return validate
+
+
+def _compile_list(field: serializers.ListSerializer) -> Callable[[Any], Any]:
+    messages = field.error_messages
+    validate_child = _compile_field(field.child)
+    fallback = _compile_fallback(field)
+
+    def non_field_error(message: str, code: str):
+        return _Invalid({api_settings.NON_FIELD_ERRORS_KEY: [_error(message, code)]})
+
+    def validate(data):
+        if data is empty or data is None:
+            return fallback(data)
+        if not isinstance(data, list):
+            raise non_field_error(
+                messages['not_a_list'].format(input_type=type(data).__name__), 'not_a_list'
+            )
+        if not field.allow_empty and not data:
+            raise non_field_error(messages['empty'], 'empty')
+        if field.max_length is not None and len(data) > field.max_length:
+            raise non_field_error(
+                messages['max_length'].format(max_length=field.max_length), 'max_length'
+            )
+        if field.min_length is not None and len(data) < field.min_length:
+            raise non_field_error(
+                messages['min_length'].format(min_length=field.min_length), 'min_length'
+            )
+
+        ret = []
+        errors = []
+        for item in data:
+            try:
+                ret.append(validate_child(item))
+                errors.append({})
+            except _Invalid as exc:
+                errors.append(exc.detail)
+        if any(errors):
+            raise _Invalid(errors)
+        return ret
+
+    return validate
+
+
+def _builtin_validator_count(field: serializers.Field) -> int:
+    """Validators DRF adds itself; any extra ones came from the field's user."""
+    if isinstance(field, serializers.CharField):
+        # Length limits plus the null/surrogate character checks
+        return (field.max_length is not None) + (field.min_length is not None) + 2
+    return (field.max_value is not None) + (field.min_value is not None)
+
+
+def _compile_field(field: serializers.Field) -> Callable[[Any], Any]:
+    if field.source != field.field_name:
+        return _compile_fallback(field)
+
+    # Exact type checks: subclasses may change parsing or validation
+    field_type = type(field)
+    if field_type in (serializers.CharField, serializers.FloatField, serializers.IntegerField):
+        if len(field.validators) != _builtin_validator_count(field):
+            return _compile_fallback(field)
+    if field_type is serializers.CharField:
+        return _compile_char(field)
+    if field_type is serializers.FloatField:
+        return _compile_float(field)
+    if field_type is serializers.IntegerField:
+        return _compile_integer(field)
+    if isinstance(field, serializers.Serializer) and not _has_custom_validation(field):
+        return _compile_nested(field)
+    if (field_type is serializers.ListSerializer and not field.validators
+            and isinstance(field.child, serializers.Serializer)):
+        return _compile_list(field)
+    return _compile_fallback(field)
+
+
+def compile_serializer(
+    serializer_class: type
+) -> Callable[[Any], Tuple[Optional[Dict], Optional[Dict]]]:
+    """
+    Build a validator equivalent to `serializer_class(data=...).is_valid()`.
+
+    The returned function takes the parsed payload and returns
+    (validated_data, None) or (None, errors).
+    """
+    serializer = serializer_class()
+    if serializer.validators or any(hasattr(serializer, f'validate_{name}') for name in serializer.fields):
+        raise TypeError(f"{serializer_class.__name__} has custom validation hooks")
+    validate_fields = _compile_fields(serializer)
+    validate_object = serializer.validate
+
+    def validate(data):
+        if not isinstance(data, Mapping) or html.is_html_input(data):
+            # Rare shapes (form data, non-objects): let DRF answer
+            fallback = serializer_class(data=data)
+            if fallback.is_valid():
+                return fallback.validated_data, None
+            return None, fallback.errors
+        try:
+            return validate_object(validate_fields(data)), None
+        except _Invalid as exc:
+            return None, exc.detail
+        except ValidationError as exc:
+            return None, serializers.as_serializer_error(exc)
+
+    return validate
+
+
+validate_plan_trip = compile_serializer(PlanTripRequestSerializer)
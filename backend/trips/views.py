@@ -2,23 +2,305 @@
 Trip planning API views.
 """
 
+import json
+import logging
+from functools import partial
+from time import perf_counter
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.versioning import QueryParameterVersioning
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .serializers import PlanTripRequestSerializer
-from .services.hos_engine import calculate_trip
+from .serializers import (
+    PlanTripBatchRequestSerializer,
+    ReplanRequestSerializer,
+    SweepRequestSerializer,
+    DistanceMatrixRequestSerializer,
+)
+from .services.hos_engine import CheckpointError, HOSEngine, calculate_trip
+from .services import metrics, plan_cache, plan_store
+from .services.compact import encode_plan
+from .services.route_service import distance_matrix, leg_cache_stats
+from .validators import validate_plan_trip
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger('trips.timing')
+
+
+def _server_timing_header(timings) -> str:
+    """Format stage durations (seconds) as a Server-Timing header value."""
+    return ', '.join(
+        f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()
+    )
+
+
+def _server_error(endpoint, error) -> Response:
+    """Count and log an unexpected failure; call from its except block."""
+    metrics.record_error(endpoint, error)
+    logger.exception('%s failed', endpoint)
+    return Response(
+        {"error": str(error)},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR
+    )
+
+
+def _ndjson_line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class PlanVersioning(QueryParameterVersioning):
+    """
+    ?version=2 selects the compact plan encoding (services.compact);
+    version 1, the default, is the full one. Unknown versions get a 404.
+    """
+    default_version = '1'
+    allowed_versions = ('1', '2')
+
+
+def _encode_plan(request, plan):
+    """The plan in the response version the request asked for."""
+    return encode_plan(plan) if request.version == '2' else plan
+
+
+def _validate_batch_items(items):
+    """
+    Validate each batch item on its own.
+    
+    Returns (errors, valid_data): errors maps item index to serializer
+    errors; valid_data lists (index, validated_data) for the rest.
+    """
+    errors = {}
+    valid_data = []
+    for index, item in enumerate(items):
+        validated, item_errors = validate_plan_trip(item)
+        if item_errors is None:
+            valid_data.append((index, validated))
+        else:
+            errors[index] = item_errors
+    return errors, valid_data
+
+
+def _iter_batch_results(items):
+    """Yield one result entry per batch item, in input order."""
+    # Imported on first use: the process pool machinery is only needed by
+    # the batch endpoints, so single-plan workers start without it
+    from .services.batch_service import iter_plan_trips
+    
+    errors, valid_data = _validate_batch_items(items)
+    outcomes = iter_plan_trips([data for _, data in valid_data])
+    
+    for index in range(len(items)):
+        if index in errors:
+            yield {"index": index, "errors": errors[index]}
+        else:
+            yield {"index": index, **next(outcomes)}
 
 
 class PlanTripView(APIView):
     """
     POST /api/plan-trip
     
-    Calculate an HOS-compliant trip schedule.
+    Calculate an HOS-compliant trip schedule. ?version=2 returns the
+    compact encoding.
+    """
+    
+    versioning_class = PlanVersioning
+    timings = None
+    
+    def initial(self, request, *args, **kwargs):
+        self._started = perf_counter()
+        # Stage timings are only collected when PLAN_TIMING_ENABLED is set
+        if settings.PLAN_TIMING_ENABLED:
+            self.timings = {}
+        super().initial(request, *args, **kwargs)
+    
+    def post(self, request):
+        timings = self.timings
+        if timings is not None:
+            started = perf_counter()
+            request.data  # Parse up front so it is timed on its own
+            parsed = perf_counter()
+            timings['parse'] = parsed - started
+        
+        validated, errors = validate_plan_trip(request.data)
+        
+        if timings is not None:
+            timings['validation'] = perf_counter() - parsed
+        
+        if errors is not None:
+            return Response(
+                {"errors": errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            calculate = calculate_trip if timings is None else partial(calculate_trip, timings=timings)
+            # Cache first, then the plan store, then the engine
+            calculate = partial(plan_store.get_or_calculate, calculate=calculate)
+            result = plan_cache.get_or_calculate(validated, calculate)
+            
+            if timings is not None:
+                encoding_started = perf_counter()
+            result = _encode_plan(request, result)
+            if timings is not None:
+                timings['encode'] = perf_counter() - encoding_started
+            return Response(result, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            return _server_error('plan-trip', e)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = self.timings
+        if not hasattr(response, 'render') or (timings is None and not settings.METRICS_ENABLED):
+            return response
+        
+        started = perf_counter()
+        response.render()
+        finished = perf_counter()
+        # Initial() is skipped when the request fails before it runs
+        if hasattr(self, '_started'):
+            metrics.observe('planTripLatency', finished - self._started)
+        metrics.increment('requests', f"plan-trip:{response.status_code}")
+        if timings is None:
+            return response
+        
+        timings['render'] = finished - started
+        timings['total'] = finished - self._started
+        
+        response['Server-Timing'] = _server_timing_header(timings)
+        timing_logger.info(json.dumps({
+            'event': 'plan_trip_timing',
+            'status': response.status_code,
+            'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+        }))
+        return response
+
+
+class PlanTripBatchView(APIView):
+    """
+    POST /api/plan-trip/batch
+    
+    Calculate HOS-compliant schedules for many trips in one request.
+    Results are returned in input order; invalid or failing items are
+    reported individually without failing the batch.
+    """
+    
+    def post(self, request):
+        envelope = PlanTripBatchRequestSerializer(data=request.data)
+        
+        if not envelope.is_valid():
+            return Response(
+                {"errors": envelope.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = list(_iter_batch_results(envelope.validated_data['trips']))
+        
+        failed = sum(1 for r in results if "result" not in r)
+        return Response(
+            {
+                "results": results,
+                "succeeded": len(results) - failed,
+                "failed": failed,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class PlanTripStreamView(APIView):
+    """
+    POST /api/plan-trip/stream
+    
+    Same input as /api/plan-trip, streamed as NDJSON: one
+    {"type": "day", "data": {...}} line per day as soon as it is complete,
+    then a {"type": "summary", "data": {...}} line with totals and any
+    cycle warning.
+    """
+    
+    def post(self, request):
+        validated, errors = validate_plan_trip(request.data)
+        
+        if errors is not None:
+            return Response(
+                {"errors": errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return StreamingHttpResponse(
+            self._stream(validated),
+            content_type=NDJSON_CONTENT_TYPE
+        )
+    
+    def _stream(self, data):
+        try:
+            engine = HOSEngine(data['cycle_hours_used'])
+            for kind, item in engine.iter_trip(data):
+                yield _ndjson_line({"type": kind, "data": item})
+        except Exception as e:
+            metrics.record_error('plan-trip-stream', e)
+            logger.exception('plan-trip-stream failed')
+            # Headers are already sent; report the failure in-band
+            yield _ndjson_line({"type": "error", "error": str(e)})
+
+
+class PlanTripBatchStreamView(APIView):
+    """
+    POST /api/plan-trip/batch/stream
+    
+    Same input as /api/plan-trip/batch, streamed as NDJSON: one
+    {"type": "item", "index": ...} line per trip in input order, then a
+    {"type": "summary", "succeeded": ..., "failed": ...} line.
+    """
+    
+    def post(self, request):
+        envelope = PlanTripBatchRequestSerializer(data=request.data)
+        
+        if not envelope.is_valid():
+            return Response(
+                {"errors": envelope.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return StreamingHttpResponse(
+            self._stream(envelope.validated_data['trips']),
+            content_type=NDJSON_CONTENT_TYPE
+        )
+    
+    def _stream(self, items):
+        succeeded = 0
+        for entry in _iter_batch_results(items):
+            if "result" in entry:
+                succeeded += 1
+            yield _ndjson_line({"type": "item", **entry})
+        
+        yield _ndjson_line({
+            "type": "summary",
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+        })
+
+
+class PlanTripSweepView(APIView):
     """
+    POST /api/plan-trip/sweep
+    
+    Plan one trip for every combination of start_times and cycle_hours.
+    The route is calculated once; each variant is summarized (days,
+    arrival, cycle excess), with its full plan only when include_plans is
+    set. ?version=2 returns included plans in the compact encoding.
+    """
+    
+    versioning_class = PlanVersioning
     
     def post(self, request):
-        serializer = PlanTripRequestSerializer(data=request.data)
+        serializer = SweepRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
             return Response(
@@ -26,15 +308,177 @@ class PlanTripView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Imported on first use, like the batch service it builds on
+        from .services.sweep_service import sweep_trip
+        
+        data = serializer.validated_data
         try:
-            result = calculate_trip(serializer.validated_data)
-            return Response(result, status=status.HTTP_200_OK)
+            result = sweep_trip(data, data['start_times'], data['cycle_hours'], data['include_plans'])
+        except Exception as e:
+            return _server_error('plan-trip-sweep', e)
+        
+        for variant in result['variants']:
+            if 'plan' in variant:
+                variant['plan'] = _encode_plan(request, variant['plan'])
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class DistanceMatrixView(APIView):
+    """
+    POST /api/distance-matrix
+    
+    Road distances (miles) and driving times (hours) from every origin
+    to every destination.
+    """
+    
+    def post(self, request):
+        serializer = DistanceMatrixRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {"errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            matrix = distance_matrix(
+                serializer.validated_data['origins'],
+                serializer.validated_data['destinations'],
+            )
+        except ImportError:
+            # numpy is optional (requirements-numpy.txt)
+            return Response(
+                {"error": "The distance matrix is not available on this deployment."},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        return Response(
+            {
+                "distances": matrix['distances'].round(1).tolist(),
+                "durations": matrix['durations'].round(2).tolist(),
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ReplanTripView(APIView):
+    """
+    POST /api/replan
+    
+    Replan the rest of a trip from the driver's reported position,
+    resuming from the checkpoint of the previous (re)plan when given.
+    Returns the remaining days and a new checkpoint for the next report.
+    ?version=2 returns the compact encoding.
+    """
+    
+    versioning_class = PlanVersioning
+    
+    def post(self, request):
+        serializer = ReplanRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {"errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        try:
+            if 'checkpoint' in data:
+                engine = HOSEngine.from_checkpoint(data['checkpoint'])
+            else:
+                engine = HOSEngine(data['cycle_hours_used'])
+            result = engine.replan_trip(data, data['position'], data.get('next_stop'))
+            return Response(_encode_plan(request, result), status=status.HTTP_200_OK)
+        
+        except CheckpointError as e:
+            return Response(
+                {"errors": {"checkpoint": [str(e)]}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         except Exception as e:
+            return _server_error('replan', e)
+
+
+class PlanListView(APIView):
+    """
+    GET /api/plans?cursor=...&limit=...
+    
+    Stored plans, newest first, one page at a time. Pass the returned
+    nextCursor to get the following page.
+    """
+    
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.PLAN_LIST_MAX_LIMIT:
             return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"errors": {"limit": [f"Must be between 1 and {settings.PLAN_LIST_MAX_LIMIT}."]}},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        
+        try:
+            plans, next_cursor = plan_store.list_plans(request.query_params.get('cursor'), limit)
+        except ValueError as e:
+            return Response(
+                {"errors": {"cursor": [str(e)]}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(
+            {"plans": plans, "nextCursor": next_cursor},
+            status=status.HTTP_200_OK
+        )
+
+
+class PlanDetailView(APIView):
+    """
+    GET /api/plans/<id>
+    
+    A stored plan in full, by the id listed in /api/plans. ?version=2
+    returns the compact encoding.
+    """
+    
+    versioning_class = PlanVersioning
+    
+    def get(self, request, plan_id):
+        plan = plan_store.find_plan(plan_id)
+        if plan is None:
+            return Response(
+                {"error": "Plan not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(_encode_plan(request, plan), status=status.HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    """
+    GET /api/cache-stats
+    
+    Hit/miss counters for this worker's caches.
+    """
+    
+    def get(self, request):
+        return Response(
+            {"plans": plan_cache.stats(), "store": plan_store.stats(), "legs": leg_cache_stats()},
+            status=status.HTTP_200_OK
+        )
+
+
+class MetricsView(APIView):
+    """
+    GET /api/metrics?scope=worker
+    
+    Latency, engine-time and plan-size histograms with error and request
+    counters, summed over every worker that published recently
+    (scope=worker: only the worker answering).
+    """
+    
+    def get(self, request):
+        all_workers = request.query_params.get('scope') != 'worker'
+        return Response(metrics.collect(all_workers), status=status.HTTP_200_OK)
 
 
 class HealthCheckView(APIView):